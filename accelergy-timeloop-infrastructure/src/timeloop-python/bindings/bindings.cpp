@@ -50,6 +50,7 @@ PYBIND11_MODULE(bindings, m) {
   model_bindings::BindBufferClasses(model_submodule);
   model_bindings::BindAcceleratorPool(model_submodule);
   model_bindings::BindEngine(model_submodule);
+  model_bindings::BindLevelStats(model_submodule);
   model_bindings::BindEvaluationResult(model_submodule);
   model_bindings::BindLevel(model_submodule);
   model_bindings::BindSparseOptimizationInfo(model_submodule);
@@ -14,6 +14,13 @@ void BindDecoupledMapper(py::module& m) {
                std::pair<mapspace::MapSpace*, search::SearchAlgorithm*>>&,
            sparse::SparseOptimizationInfo&, const std::vector<std::string>&,
            uint64_t, unsigned, unsigned, bool>())
+      .def(py::init<
+           const model::Engine::Specs&, problem::Workload&,
+           std::vector<
+               std::pair<mapspace::MapSpace*, search::SearchAlgorithm*>>&,
+           sparse::SparseOptimizationInfo&, const std::vector<std::string>&,
+           uint64_t, unsigned, unsigned, bool,
+           pytimeloop::pysearch::EvalMemo::ShPtr>())
       .def("run", &CoupledMapper::Run);
 }
 
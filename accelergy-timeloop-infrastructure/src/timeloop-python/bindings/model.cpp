@@ -99,6 +99,103 @@ void BindEngine(py::module& m) {
       });
 }
 
+namespace {
+
+/**
+ * Returns a read-only NumPy view of `data` that keeps `owner` alive instead
+ * of copying the underlying buffer.
+ */
+template <typename T>
+py::array_t<T> ReadOnlyView(const std::vector<T>& data,
+                            std::vector<ssize_t> shape, py::handle owner) {
+  std::vector<ssize_t> strides(shape.size(), sizeof(T));
+  for (ssize_t i = ssize_t(shape.size()) - 2; i >= 0; --i) {
+    strides[i] = strides[i + 1] * shape[i + 1];
+  }
+  py::array_t<T> arr(shape, strides, data.data(), owner);
+  py::detail::array_proxy(arr.ptr())->flags &=
+      ~py::detail::npy_api::NPY_ARRAY_WRITEABLE_;
+  return arr;
+}
+
+}  // namespace
+
+void BindLevelStats(py::module& m) {
+  py::class_<LevelStats, std::shared_ptr<LevelStats>>(m, "LevelStats")
+      .def_readonly("num_levels", &LevelStats::num_levels)
+      .def_readonly("num_data_spaces", &LevelStats::num_data_spaces)
+      .def_readonly("level_names", &LevelStats::level_names)
+      .def_readonly("data_space_names", &LevelStats::data_space_names)
+      .def_property_readonly("accesses",
+                             [](py::object self) {
+                               auto& s = self.cast<LevelStats&>();
+                               return ReadOnlyView(
+                                   s.accesses,
+                                   {ssize_t(s.num_levels),
+                                    ssize_t(s.num_data_spaces)},
+                                   self);
+                             })
+      .def_property_readonly("fills",
+                             [](py::object self) {
+                               auto& s = self.cast<LevelStats&>();
+                               return ReadOnlyView(
+                                   s.fills,
+                                   {ssize_t(s.num_levels),
+                                    ssize_t(s.num_data_spaces)},
+                                   self);
+                             })
+      .def_property_readonly("utilized_capacity",
+                             [](py::object self) {
+                               auto& s = self.cast<LevelStats&>();
+                               return ReadOnlyView(
+                                   s.utilized_capacity,
+                                   {ssize_t(s.num_levels),
+                                    ssize_t(s.num_data_spaces)},
+                                   self);
+                             })
+      .def_property_readonly("energy",
+                             [](py::object self) {
+                               auto& s = self.cast<LevelStats&>();
+                               return ReadOnlyView(
+                                   s.energy,
+                                   {ssize_t(s.num_levels),
+                                    ssize_t(s.num_data_spaces)},
+                                   self);
+                             })
+      .def_property_readonly("utilization",
+                             [](py::object self) {
+                               auto& s = self.cast<LevelStats&>();
+                               return ReadOnlyView(
+                                   s.utilization,
+                                   {ssize_t(s.num_levels)}, self);
+                             })
+      .def(py::pickle(
+        [](const LevelStats& s) {
+          return py::make_tuple(s.num_levels,
+                                s.num_data_spaces,
+                                s.level_names,
+                                s.data_space_names,
+                                s.accesses,
+                                s.fills,
+                                s.utilized_capacity,
+                                s.energy,
+                                s.utilization);
+        },
+        [](py::tuple t) {
+          auto s = std::make_shared<LevelStats>(t[0].cast<size_t>(),
+                                                t[1].cast<size_t>());
+          s->level_names = t[2].cast<std::vector<std::string>>();
+          s->data_space_names = t[3].cast<std::vector<std::string>>();
+          s->accesses = t[4].cast<std::vector<uint64_t>>();
+          s->fills = t[5].cast<std::vector<uint64_t>>();
+          s->utilized_capacity = t[6].cast<std::vector<uint64_t>>();
+          s->energy = t[7].cast<std::vector<double>>();
+          s->utilization = t[8].cast<std::vector<double>>();
+          return s;
+        }
+      ));
+}
+
 void BindEvaluationResult(py::module& m) {
   py::class_<EvaluationResult>(m, "EvaluationResult")
       .def_readonly("id", &EvaluationResult::id)
@@ -113,6 +210,7 @@ void BindEvaluationResult(py::module& m) {
       .def_readonly("actual_computes", &EvaluationResult::actual_computes)
       .def_readonly("last_level_accesses",
                     &EvaluationResult::last_level_accesses)
+      .def_readonly("level_stats", &EvaluationResult::level_stats)
       .def(py::pickle(
         [](const EvaluationResult& e) {
           return py::make_tuple(e.id,
@@ -124,7 +222,8 @@ void BindEvaluationResult(py::module& m) {
                                 e.cycles,
                                 e.algorithmic_computes,
                                 e.actual_computes,
-                                e.last_level_accesses);
+                                e.last_level_accesses,
+                                e.level_stats);
         },
         [](py::tuple t) {
           return EvaluationResult{
@@ -138,7 +237,10 @@ void BindEvaluationResult(py::module& m) {
             .cycles = t[6].cast<uint64_t>(),
             .algorithmic_computes = t[7].cast<uint64_t>(),
             .actual_computes = t[8].cast<uint64_t>(),
-            .last_level_accesses = t[9].cast<uint64_t>()};
+            .last_level_accesses = t[9].cast<uint64_t>(),
+            .level_stats =
+              t.size() > 10 ? t[10].cast<std::shared_ptr<LevelStats>>()
+                            : nullptr};
         }
       ));
 }
@@ -1,14 +1,18 @@
 #include "pytimeloop/bindings/search.h"
 
 #include "pytimeloop/bindings/type_casters.h"
+#include "pytimeloop/search/eval-memo.h"
 
 // Timeloop headers
 #include "mapspaces/mapspace-base.hpp"
+#include "model/engine.hpp"
+#include "model/sparse-optimization-info.hpp"
 #include "search/hybrid.hpp"
 #include "search/linear-pruned.hpp"
 #include "search/random-pruned.hpp"
 #include "search/search-factory.hpp"
 #include "search/search.hpp"
+#include "workload/workload.hpp"
 
 namespace pytimeloop::search_bindings {
 
@@ -25,6 +29,8 @@ class PySearchAlgorithm : public search::SearchAlgorithm {
 
 void BindSearchClasses(py::module& m) {
   using namespace search;
+  using pytimeloop::pysearch::EvalMemo;
+  using pytimeloop::pysearch::MakeMappingKey;
 
   py::enum_<Status>(m, "SearchStatus")
       .value("Success", Status::Success)
@@ -66,6 +72,41 @@ void BindSearchClasses(py::module& m) {
              return id;
            })
       .def("report", &RandomPrunedSearch::Report);
+
+  py::class_<EvalMemo, EvalMemo::ShPtr>(m, "EvalMemo")
+      .def(py::init<size_t>(), py::arg("capacity") = 1 << 16)
+      .def(
+          "lookup",
+          [](EvalMemo& memo, const Mapping& mapping,
+             const model::Engine::Specs& arch_specs,
+             const problem::Workload& workload,
+             const sparse::SparseOptimizationInfo& sparse_opts) {
+            return memo.Lookup(
+                EvalMemo::Scope{&workload, &arch_specs, &sparse_opts},
+                MakeMappingKey(mapping), static_cast<uint64_t>(mapping.id));
+          },
+          py::arg("mapping"), py::arg("arch_specs"), py::arg("workload"),
+          py::arg("sparse_opts"))
+      .def(
+          "insert",
+          [](EvalMemo& memo, const Mapping& mapping,
+             const model::Engine::Specs& arch_specs,
+             const problem::Workload& workload,
+             const sparse::SparseOptimizationInfo& sparse_opts,
+             const EvalMemo::EvaluationResult& result) {
+            return memo.Insert(
+                EvalMemo::Scope{&workload, &arch_specs, &sparse_opts},
+                MakeMappingKey(mapping), result);
+          },
+          py::arg("mapping"), py::arg("arch_specs"), py::arg("workload"),
+          py::arg("sparse_opts"), py::arg("result"))
+      .def("clear", &EvalMemo::Clear)
+      .def_property_readonly("hits", &EvalMemo::Hits)
+      .def_property_readonly("misses", &EvalMemo::Misses)
+      .def_property_readonly("size", &EvalMemo::Size)
+      .def_property_readonly("capacity", &EvalMemo::Capacity);
+
+  m.def("mapping_fingerprint", &pytimeloop::pysearch::MappingFingerprint);
 }
 
 }  // namespace pytimeloop::search_bindings
@@ -0,0 +1,102 @@
+#pragma once
+
+#include <boost/test/unit_test.hpp>
+#include <thread>
+#include <vector>
+
+#include "pytimeloop/search/eval-memo.h"
+
+using namespace boost::unit_test;
+using pytimeloop::pysearch::EvalMemo;
+using pytimeloop::pysearch::MappingKey;
+
+namespace {
+
+MappingKey TestKey(uint64_t value, uint64_t hash) {
+  return MappingKey{.values = {value}, .hash = hash};
+}
+
+MappingKey TestKey(uint64_t value) { return TestKey(value, value); }
+
+// Scopes are compared by object identity
+int workload, arch, other_arch, sparse_opts;
+const EvalMemo::Scope kScope{&workload, &arch, &sparse_opts};
+
+}  // namespace
+
+BOOST_AUTO_TEST_CASE(test_eval_memo_hit_miss) {
+  EvalMemo memo(64);
+
+  auto result = EvalMemo::EvaluationResult::FailedEvaluation({}, 7);
+  BOOST_TEST_REQUIRE(!memo.Lookup(kScope, TestKey(42), 7).has_value());
+  memo.Insert(kScope, TestKey(42), result);
+
+  // Hits carry the id of the mapping they were looked up for
+  auto found = memo.Lookup(kScope, TestKey(42), 9);
+  BOOST_TEST_REQUIRE(found.has_value());
+  BOOST_TEST_REQUIRE(found->id == 9);
+  BOOST_TEST_REQUIRE(memo.Hits() == 1);
+  BOOST_TEST_REQUIRE(memo.Misses() == 1);
+}
+
+BOOST_AUTO_TEST_CASE(test_eval_memo_collision) {
+  EvalMemo memo(64);
+
+  auto result = EvalMemo::EvaluationResult::FailedEvaluation({}, 7);
+  memo.Insert(kScope, TestKey(1, 42), result);
+  // Same hash, different key
+  BOOST_TEST_REQUIRE(!memo.Lookup(kScope, TestKey(2, 42), 0).has_value());
+  memo.Insert(kScope, TestKey(2, 42), result);
+  BOOST_TEST_REQUIRE(memo.Size() == 2);
+  BOOST_TEST_REQUIRE(memo.Lookup(kScope, TestKey(1, 42), 0).has_value());
+}
+
+BOOST_AUTO_TEST_CASE(test_eval_memo_scope) {
+  EvalMemo memo(64);
+  const EvalMemo::Scope other_scope{&workload, &other_arch, &sparse_opts};
+
+  auto result = EvalMemo::EvaluationResult::FailedEvaluation({});
+  BOOST_TEST_REQUIRE(memo.Insert(kScope, TestKey(42), result));
+  BOOST_TEST_REQUIRE(!memo.Insert(other_scope, TestKey(43), result));
+  BOOST_TEST_REQUIRE(!memo.Lookup(other_scope, TestKey(42), 0).has_value());
+  BOOST_TEST_REQUIRE(memo.Size() == 1);
+
+  memo.Clear();
+  BOOST_TEST_REQUIRE(memo.Bind(other_scope));
+  BOOST_TEST_REQUIRE(!memo.Bind(kScope));
+}
+
+BOOST_AUTO_TEST_CASE(test_eval_memo_bounded) {
+  const size_t CAPACITY = 4 * EvalMemo::kNumShards;
+  EvalMemo memo(CAPACITY);
+
+  auto result = EvalMemo::EvaluationResult::FailedEvaluation({});
+  for (uint64_t i = 0; i < 100 * CAPACITY; ++i) {
+    memo.Insert(kScope, TestKey(i * 0x9e3779b97f4a7c15ULL), result);
+  }
+  BOOST_TEST_REQUIRE(memo.Size() <= CAPACITY);
+}
+
+BOOST_AUTO_TEST_CASE(test_eval_memo_concurrent) {
+  const int N = 1000;
+  const int N_THREADS = 4;
+  EvalMemo memo(N);
+
+  std::vector<std::thread> threads;
+  for (int t = 0; t < N_THREADS; ++t) {
+    threads.emplace_back([&memo]() {
+      auto result = EvalMemo::EvaluationResult::FailedEvaluation({});
+      for (uint64_t i = 0; i < N; ++i) {
+        if (!memo.Lookup(kScope, TestKey(i), i).has_value()) {
+          memo.Insert(kScope, TestKey(i), result);
+        }
+      }
+    });
+  }
+  for (auto& t : threads) {
+    t.join();
+  }
+
+  BOOST_TEST_REQUIRE(memo.Hits() + memo.Misses() == N * N_THREADS);
+  BOOST_TEST_REQUIRE(memo.Misses() >= N);
+}
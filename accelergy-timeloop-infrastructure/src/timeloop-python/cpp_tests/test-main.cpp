@@ -6,5 +6,6 @@
 // https://github.com/NVlabs/timeloop/issues/138
 // #include "test-accelerator.h"
 #include "test-concurrent-queue.h"
+#include "test-eval-memo.h"
 #include "test-mapper.h"
 #include "test-worker-pool.h"
@@ -1,6 +1,7 @@
 #pragma once
 
 #include "pybind11/iostream.h"
+#include "pybind11/numpy.h"
 #include "pybind11/pybind11.h"
 #include "pybind11/stl.h"       // Allows autocasting for some std objects.
 
@@ -12,6 +13,7 @@ void BindAccelerator(py::module& m);
 void BindAcceleratorPool(py::module& m);
 void BindEngine(py::module& m);
 void BindEvaluationResult(py::module& m);
+void BindLevelStats(py::module& m);
 void BindLevel(py::module& m);
 void BindSparseOptimizationInfo(py::module& m);
 void BindSparseOptimizationParser(py::module& m);
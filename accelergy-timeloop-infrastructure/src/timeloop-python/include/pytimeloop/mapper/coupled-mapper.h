@@ -10,6 +10,7 @@
 
 #include "pytimeloop/mapper/mapper-base.h"
 #include "pytimeloop/model/accelerator.h"
+#include "pytimeloop/search/eval-memo.h"
 #include "pytimeloop/utils/worker-pool.h"
 
 namespace pytimeloop::pymapper {
@@ -26,11 +27,16 @@ class CoupledMapper : public Mapper {
                 const std::vector<std::string>& metrics,
                 uint64_t search_size = 0, unsigned timeout = 500,
                 unsigned victory_condition = 500,
-                bool penalize_consecutive_bypass_fails = false);
+                bool penalize_consecutive_bypass_fails = false,
+                EvalMemo::ShPtr memo = nullptr);
 
   std::pair<Mapping, EvaluationResult> Run();
 
  private:
+  static EvalMemo::Scope MemoScope(const ArchSpecs& arch_spec,
+                                   const Workload& workload,
+                                   const SparseOptInfo& sparse_opts);
+
   struct SubMapSpaceResult {
     Mapping mapping;
     EvaluationResult eval_result;
@@ -49,6 +55,8 @@ class CoupledMapper : public Mapper {
     unsigned timeout;
     unsigned victory_condition;
     bool penalize_consecutive_bypass_fails;
+    EvalMemo::ShPtr memo;
+    EvalMemo::Scope memo_scope;
 
     uint128_t total_mappings = 0;
     uint128_t valid_mappings = 0;
@@ -64,7 +72,8 @@ class CoupledMapper : public Mapper {
                       const std::vector<std::string>& metrics,
                       uint128_t search_size, unsigned timeout,
                       unsigned victory_condition,
-                      bool penalize_consecutive_bypass_fails);
+                      bool penalize_consecutive_bypass_fails,
+                      EvalMemo::ShPtr memo);
 
     Result operator()(Task& task);
   };
@@ -80,6 +89,7 @@ class CoupledMapper : public Mapper {
   unsigned timeout_;
   unsigned victory_cond_;
   unsigned penalize_cons_bypass_fails_;
+  EvalMemo::ShPtr memo_;
 
   std::unique_ptr<WorkerPool<SubMapSpaceMapper>> submapper_pool_;
 };
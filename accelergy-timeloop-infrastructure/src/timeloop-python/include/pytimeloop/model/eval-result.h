@@ -1,7 +1,9 @@
 #pragma once
 
 #include <cstdint>
+#include <memory>
 #include <optional>
+#include <string>
 #include <vector>
 
 // Timeloop library
@@ -9,6 +11,38 @@
 
 namespace pytimeloop::pymodel {
 
+/**
+ * Per-storage-level, per-dataspace statistics of an evaluation.
+ *
+ * Two-dimensional statistics are stored contiguously in row-major order with
+ * shape (num_levels, num_data_spaces) so that they can be exposed to Python
+ * without copying.
+ */
+struct LevelStats {
+  size_t num_levels;
+  size_t num_data_spaces;
+  std::vector<std::string> level_names;
+  std::vector<std::string> data_space_names;
+
+  std::vector<uint64_t> accesses;
+  std::vector<uint64_t> fills;
+  std::vector<uint64_t> utilized_capacity;
+  std::vector<double> energy;
+  // One entry per storage level
+  std::vector<double> utilization;
+
+  LevelStats(size_t num_levels, size_t num_data_spaces)
+      : num_levels(num_levels),
+        num_data_spaces(num_data_spaces),
+        level_names(num_levels),
+        data_space_names(num_data_spaces),
+        accesses(num_levels * num_data_spaces, 0),
+        fills(num_levels * num_data_spaces, 0),
+        utilized_capacity(num_levels * num_data_spaces, 0),
+        energy(num_levels * num_data_spaces, 0),
+        utilization(num_levels, 0) {}
+};
+
 struct EvaluationResult {
   uint64_t id;
   std::vector<model::EvalStatus> pre_eval_status;
@@ -20,6 +54,8 @@ struct EvaluationResult {
   uint64_t algorithmic_computes;
   uint64_t actual_computes;
   uint64_t last_level_accesses;
+  // Shared so that copies of a result (and NumPy views) reuse the same arrays
+  std::shared_ptr<LevelStats> level_stats;
 
   static EvaluationResult FailedEvaluation(
       const std::vector<model::EvalStatus>& pre_eval_status, uint64_t id = 0) {
@@ -32,7 +68,8 @@ struct EvaluationResult {
                             .cycles = 0,
                             .algorithmic_computes = 0,
                             .actual_computes = 0,
-                            .last_level_accesses = 0};
+                            .last_level_accesses = 0,
+                            .level_stats = nullptr};
   }
 };
 
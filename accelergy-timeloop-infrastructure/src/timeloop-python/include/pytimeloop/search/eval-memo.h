@@ -0,0 +1,253 @@
+#pragma once
+
+#include <algorithm>
+#include <array>
+#include <atomic>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <optional>
+#include <unordered_map>
+#include <vector>
+
+// Timeloop library
+#include <mapping/mapping.hpp>
+
+#include "pytimeloop/model/eval-result.h"
+
+namespace pytimeloop::pysearch {
+
+namespace detail {
+
+inline void HashCombine(uint64_t& seed, uint64_t val) {
+  seed ^= std::hash<uint64_t>{}(val) + 0x9e3779b97f4a7c15ULL + (seed << 6) +
+          (seed >> 2);
+}
+
+}  // namespace detail
+
+/**
+ * Canonical key of a mapping.
+ *
+ * Loops that execute a single iteration do not change any access count, so
+ * they are dropped. This makes mappings that only differ in where (or
+ * whether) trivial loops are placed have the same key. All non-trivial loops
+ * are kept in order, per storage level, together with the bypass masks and
+ * the spatial fanout split.
+ *
+ * Permutations of non-trivial loops are NOT folded together, even those that
+ * do not change any access count: whether a permutation changes reuse
+ * depends on which dimensions are relevant to each dataspace at each level,
+ * which is the model's business. Such mappings are evaluated separately.
+ */
+struct MappingKey {
+  std::vector<uint64_t> values;
+  uint64_t hash = 0;
+
+  bool operator==(const MappingKey& other) const {
+    return hash == other.hash && values == other.values;
+  }
+};
+
+struct MappingKeyHash {
+  size_t operator()(const MappingKey& key) const { return key.hash; }
+};
+
+inline MappingKey MakeMappingKey(const Mapping& mapping) {
+  MappingKey key;
+  auto& values = key.values;
+  const auto& nest = mapping.loop_nest;
+
+  unsigned cur_boundary = 0;
+  for (unsigned i = 0; i < nest.loops.size(); ++i) {
+    const auto& loop = nest.loops[i];
+    bool is_trivial =
+        loop.stride == 0 || (loop.end - loop.start) <= loop.stride;
+    if (!is_trivial) {
+      values.push_back(loop.dimension);
+      values.push_back(static_cast<uint64_t>(loop.start));
+      values.push_back(static_cast<uint64_t>(loop.end));
+      values.push_back(static_cast<uint64_t>(loop.residual_end));
+      values.push_back(static_cast<uint64_t>(loop.stride));
+      values.push_back(static_cast<uint64_t>(loop.spacetime_dimension));
+    }
+    while (cur_boundary < nest.storage_tiling_boundaries.size() &&
+           nest.storage_tiling_boundaries[cur_boundary] == i) {
+      // Level separator so that moving a loop across a storage level changes
+      // the key.
+      values.push_back(0xffffffffULL - cur_boundary);
+      ++cur_boundary;
+    }
+  }
+
+  values.push_back(mapping.datatype_bypass_nest.size());
+  for (unsigned pv = 0; pv < mapping.datatype_bypass_nest.size(); ++pv) {
+    values.push_back(mapping.datatype_bypass_nest.at(pv).to_ullong());
+  }
+  values.push_back(mapping.fanoutX_map.size());
+  for (auto& [level, fanout] : mapping.fanoutX_map) {
+    values.push_back(level);
+    values.push_back(fanout);
+  }
+  values.push_back(mapping.fanoutY_map.size());
+  for (auto& [level, fanout] : mapping.fanoutY_map) {
+    values.push_back(level);
+    values.push_back(fanout);
+  }
+
+  for (auto v : values) {
+    detail::HashCombine(key.hash, v);
+  }
+  return key;
+}
+
+/** Hash of the canonical key of a mapping. See MakeMappingKey. */
+inline uint64_t MappingFingerprint(const Mapping& mapping) {
+  return MakeMappingKey(mapping).hash;
+}
+
+/**
+ * Bounded evaluation memo that can be shared by several search threads.
+ *
+ * Entries are keyed by the full canonical key of a mapping, so fingerprint
+ * collisions are never served as hits. Entries are spread over independently
+ * locked shards so concurrent lookups from different mapper threads rarely
+ * contend. When a shard is full, its oldest entry is evicted.
+ *
+ * Results also depend on the workload, the architecture and the sparse
+ * optimizations. A memo is bound to the first (workload, architecture,
+ * sparse optimizations) it is used with, by object identity, and lookups and
+ * inserts with any other are rejected until it is cleared. Clear a memo
+ * before the objects it is bound to are destroyed if it is reused.
+ */
+class EvalMemo {
+ public:
+  typedef std::shared_ptr<EvalMemo> ShPtr;
+  typedef pytimeloop::pymodel::EvaluationResult EvaluationResult;
+
+  struct Scope {
+    const void* workload = nullptr;
+    const void* arch_specs = nullptr;
+    const void* sparse_opts = nullptr;
+
+    bool operator==(const Scope& other) const {
+      return workload == other.workload && arch_specs == other.arch_specs &&
+             sparse_opts == other.sparse_opts;
+    }
+  };
+
+  static constexpr size_t kNumShards = 16;
+
+  explicit EvalMemo(size_t capacity = 1 << 16)
+      : capacity_(capacity), hits_(0), misses_(0) {
+    shard_capacity_ = std::max<size_t>(1, capacity_ / kNumShards);
+  }
+
+  /**
+   * Binds the memo to scope if it is not bound yet. Returns whether the memo
+   * is bound to scope.
+   */
+  bool Bind(const Scope& scope) {
+    std::lock_guard<std::mutex> lock(scope_m_);
+    if (!scope_) {
+      scope_ = scope;
+    }
+    return scope_.value() == scope;
+  }
+
+  /**
+   * Returns the memoized result of the mapping with key, with its id set to
+   * id, or nullopt.
+   */
+  std::optional<EvaluationResult> Lookup(const Scope& scope,
+                                         const MappingKey& key, uint64_t id) {
+    if (!Bind(scope)) {
+      return std::nullopt;
+    }
+    auto& shard = ShardOf(key);
+    std::lock_guard<std::mutex> lock(shard.m);
+    auto it = shard.entries.find(key);
+    if (it == shard.entries.end()) {
+      misses_.fetch_add(1, std::memory_order_relaxed);
+      return std::nullopt;
+    }
+    hits_.fetch_add(1, std::memory_order_relaxed);
+    auto result = it->second;
+    result.id = id;
+    return result;
+  }
+
+  /** Returns false if the memo is bound to another scope. */
+  bool Insert(const Scope& scope, const MappingKey& key,
+              const EvaluationResult& result) {
+    if (!Bind(scope)) {
+      return false;
+    }
+    if (capacity_ == 0) {
+      return true;
+    }
+    auto& shard = ShardOf(key);
+    std::lock_guard<std::mutex> lock(shard.m);
+    auto [it, inserted] = shard.entries.emplace(key, result);
+    if (!inserted) {
+      return true;
+    }
+    shard.order.push_back(key);
+    while (shard.entries.size() > shard_capacity_) {
+      shard.entries.erase(shard.order.front());
+      shard.order.pop_front();
+    }
+    return true;
+  }
+
+  /** Removes all entries and unbinds the memo. */
+  void Clear() {
+    for (auto& shard : shards_) {
+      std::lock_guard<std::mutex> lock(shard.m);
+      shard.entries.clear();
+      shard.order.clear();
+    }
+    {
+      std::lock_guard<std::mutex> lock(scope_m_);
+      scope_.reset();
+    }
+    hits_.store(0);
+    misses_.store(0);
+  }
+
+  uint64_t Hits() const { return hits_.load(); }
+  uint64_t Misses() const { return misses_.load(); }
+  size_t Capacity() const { return capacity_; }
+
+  size_t Size() {
+    size_t size = 0;
+    for (auto& shard : shards_) {
+      std::lock_guard<std::mutex> lock(shard.m);
+      size += shard.entries.size();
+    }
+    return size;
+  }
+
+ private:
+  struct Shard {
+    std::mutex m;
+    std::unordered_map<MappingKey, EvaluationResult, MappingKeyHash> entries;
+    std::deque<MappingKey> order;
+  };
+
+  Shard& ShardOf(const MappingKey& key) {
+    return shards_[(key.hash ^ (key.hash >> 32)) % kNumShards];
+  }
+
+  size_t capacity_;
+  size_t shard_capacity_;
+  std::array<Shard, kNumShards> shards_;
+  std::mutex scope_m_;
+  std::optional<Scope> scope_;
+  std::atomic<uint64_t> hits_;
+  std::atomic<uint64_t> misses_;
+};
+
+}  // namespace pytimeloop::pysearch
@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from functools import reduce
 from operator import mul
 
@@ -8,11 +8,95 @@ from pytimeloop.looptree.equivalent_ranks import EquivalentGroups
 from pytimeloop.looptree.des import LooptreeOutput
 
 
-def compile_mapping(mapping,
-                    workload,
-                    analyzer):
+# Node keys that compile_mapping reads. Anything else (e.g., tile and factor
+# constraints) only affects which tile shapes are explored, not the compiled
+# functions, so it is left out of the structural signature.
+STRUCTURAL_KEYS = (
+    'type', 'rank', 'tile_shape', 'spatial', 'target', 'dspace',
+    'exploits_reuse', 'einsum'
+)
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def mapping_signature(mapping) -> tuple:
+    """
+    Canonical structural signature of a mapping: loop order, ranks, fixed
+    tile shapes and storage placement. Mappings with the same signature (on
+    the same workload) compile to the same functions.
+    """
+    return tuple(
+        tuple((k, _freeze(node[k])) for k in STRUCTURAL_KEYS if k in node)
+        for node in mapping
+    )
+
+
+class CompiledMappingCache:
+    """
+    LRU cache of compile_mapping results keyed by the workload content that
+    compile_mapping reads and the structural signature of the mapping.
+    """
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self._entries.get(key, None)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self._entries),
+            hit_rate=self.hits / lookups if lookups else 0.0,
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+
+COMPILE_CACHE = CompiledMappingCache()
+
+
+def compile_cache_stats() -> dict:
+    """Hit/miss statistics of the default compile_mapping cache."""
+    return COMPILE_CACHE.stats()
+
+
+def clear_compile_cache():
+    COMPILE_CACHE.clear()
+
+
+def _einsum_context(mapping, workload, analyzer):
     einsum_name_to_id = workload.einsum_name_to_id()
-    rank_id_to_name = workload.dimension_id_to_name()
     rank_name_to_id = workload.dimension_name_to_id()
     tensor_name_to_id = workload.data_space_name_to_id()
 
@@ -40,7 +124,6 @@ def compile_mapping(mapping,
         tensor_id: workload.get_tensor_volume(tensor_id)
         for tensor_id in tensor_name_to_id.values()
     }
-    original_tensor_size = tensor_size.copy()
 
     tensor_to_relevant_ranks = {
         tensor_id: analyzer.einsum_dims_relevant_to_tensor(einsum_id,
@@ -54,6 +137,52 @@ def compile_mapping(mapping,
         for tensor_id, relevant_ranks in tensor_to_relevant_ranks.items()
     }
 
+    return dict(
+        einsum_id=einsum_id,
+        rank_name_to_id=rank_name_to_id,
+        tensor_name_to_id=tensor_name_to_id,
+        tensors=tensors,
+        rank_to_group_id=rank_groups.rank_to_group_id,
+        einsum_shape=einsum_shape,
+        tensor_size=tensor_size,
+        tensor_to_relevant_ranks=tensor_to_relevant_ranks,
+        ops=workload.get_operation_space_volume(einsum_id),
+    )
+
+
+def compile_mapping(mapping,
+                    workload,
+                    analyzer,
+                    cache: CompiledMappingCache = COMPILE_CACHE):
+    """
+    Compiles the mapping into functions of the unspecified tile shapes.
+    Returns (tile_shape_symbols, output). If cache is not None, mappings with
+    the same structure on the same workload reuse a previous compilation; the
+    returned objects are then shared and must not be mutated.
+    """
+    context = _einsum_context(mapping, workload, analyzer)
+    if cache is None:
+        return _compile_mapping(mapping, context)
+
+    key = (_freeze(context), mapping_signature(mapping))
+    result = cache.get(key)
+    if result is None:
+        result = _compile_mapping(mapping, context)
+        cache.put(key, result)
+    return result
+
+
+def _compile_mapping(mapping, context):
+    einsum_id = context['einsum_id']
+    rank_name_to_id = context['rank_name_to_id']
+    tensor_name_to_id = context['tensor_name_to_id']
+    tensors = context['tensors']
+    rank_to_group_id = context['rank_to_group_id']
+    einsum_shape = dict(context['einsum_shape'])
+    tensor_size = dict(context['tensor_size'])
+    original_tensor_size = context['tensor_size']
+    tensor_to_relevant_ranks = context['tensor_to_relevant_ranks']
+
     level_to_op_intensity = {}
 
     tile_shapes = []
@@ -73,7 +202,7 @@ def compile_mapping(mapping,
                 rank_id = rank_name
             else:
                 rank_id = rank_name_to_id[rank_name]
-            group_id = rank_groups.rank_to_group_id[rank_id]
+            group_id = rank_to_group_id[rank_id]
 
             if 'tile_shape' not in node:
                 tile_shape = sympy.symbols(f'tileshape{len(tile_shapes)}')
@@ -104,7 +233,7 @@ def compile_mapping(mapping,
                 rank_id = rank_name
             else:
                 rank_id = rank_name_to_id[rank_name]
-            group_id = rank_groups.rank_to_group_id[rank_id]
+            group_id = rank_to_group_id[rank_id]
 
             if 'tile_shape' not in node:
                 tile_shape = sympy.symbols(f'tileshape{len(tile_shapes)}')
@@ -224,7 +353,7 @@ def compile_mapping(mapping,
             }
 
     output.ops[einsum_id] = \
-        (None, workload.get_operation_space_volume(einsum_id))
+        (None, context['ops'])
     output.temporal_steps[einsum_id] = latency
     output.fanout = fanout
 
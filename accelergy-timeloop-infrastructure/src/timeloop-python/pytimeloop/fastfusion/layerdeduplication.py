@@ -1,11 +1,136 @@
 from collections import defaultdict
+import hashlib
 from itertools import permutations, product
+from typing import NamedTuple
 
 from pytimeloop.looptree.mapping_utilities import get_intermediate_tensors
 
 
-def group_similar_einsums(workload, analyzer):
+class CanonicalEinsum(NamedTuple):
+    """
+    key: Hashable form of the Einsum that does not depend on rank or tensor
+        ids. Two Einsums have the same key iff is_equivalent finds a renaming
+        between them.
+    ranks: The Einsum's ranks in canonical order.
+    tensors: The Einsum's tensors in canonical order.
+    """
+    key: tuple
+    ranks: tuple
+    tensors: tuple
+
+    @property
+    def digest(self) -> str:
+        """Hash of key that is stable across processes and runs."""
+        return hashlib.sha256(repr(self.key).encode()).hexdigest()
+
+
+def canonical_form(einsum_id, workload, analyzer, intermediate_tensors=None):
+    """
+    Ranks are labeled by their shape and tensors by their roles (input,
+    output, intermediate). Each is refined with the labels of what it is
+    relevant to, and both are sorted by label. Ties are broken by taking the
+    smallest rank-tensor relevance matrix over the orders of tied ranks and
+    tensors, which are small in practice.
+    """
+    if intermediate_tensors is None:
+        intermediate_tensors = get_intermediate_tensors(workload)
+
+    ranks = list(workload.einsum_ospace_dimensions(einsum_id))
+    input_tensors = workload.tensors_read_by_einsum(einsum_id)
+    output_tensors = workload.tensors_written_by_einsum(einsum_id)
+    if output_tensors is None:
+        output_tensors = set()
+    tensors = list(set(input_tensors) | set(output_tensors))
+
+    tensor_role = {}
+    for t in tensors:
+        role = []
+        if t in input_tensors:
+            role.append('input')
+        if t in output_tensors:
+            role.append('output')
+        if t in intermediate_tensors:
+            role.append('intermediate')
+        tensor_role[t] = tuple(role)
+    rank_shape = {r: tuple(workload.get_rank_shape(r)) for r in ranks}
+    relevant = {
+        (r, t): bool(analyzer.einsum_dim_is_directly_relevant_to_tensor(
+            einsum_id, r, t
+        ))
+        for r in ranks for t in tensors
+    }
+
+    rank_label = {
+        r: (rank_shape[r],
+            tuple(sorted(tensor_role[t] for t in tensors if relevant[(r, t)])))
+        for r in ranks
+    }
+    tensor_label = {
+        t: (tensor_role[t],
+            tuple(sorted(rank_shape[r] for r in ranks if relevant[(r, t)])))
+        for t in tensors
+    }
+
+    def tied_orders(items, label):
+        groups = defaultdict(list)
+        for item in items:
+            groups[label[item]].append(item)
+        labels = sorted(groups)
+        for order in product(*(permutations(groups[l]) for l in labels)):
+            yield tuple(item for group in order for item in group)
+
+    best = None
+    for rank_order in tied_orders(ranks, rank_label):
+        for tensor_order in tied_orders(tensors, tensor_label):
+            matrix = tuple(
+                tuple(relevant[(r, t)] for t in tensor_order)
+                for r in rank_order
+            )
+            if best is None or matrix < best[0]:
+                best = (matrix, rank_order, tensor_order)
+    matrix, rank_order, tensor_order = best
+
+    key = (
+        tuple(rank_label[r] for r in rank_order),
+        tuple(tensor_label[t] for t in tensor_order),
+        matrix,
+    )
+    return CanonicalEinsum(key, rank_order, tensor_order)
+
+
+def canonical_renaming(from_form: CanonicalEinsum, to_form: CanonicalEinsum):
+    """
+    Rank and tensor renamings from one Einsum to another with the same
+    canonical key, in the format of is_equivalent.
+    """
+    assert from_form.key == to_form.key
+    return (
+        dict(zip(from_form.ranks, to_form.ranks)),
+        dict(zip(from_form.tensors, to_form.tensors)),
+    )
+
+
+def group_similar_einsums(workload, analyzer, einsums=None):
+    """
+    Groups equivalent Einsums by their canonical form. Returns
+    {reference Einsum: {other Einsum: (rank_renaming, tensor_renaming)}},
+    where the reference is the first Einsum of its class in einsums.
+    """
+    if einsums is None:
+        einsums = workload.einsum_id_to_name()
+    intermediate_tensors = get_intermediate_tensors(workload)
+
+    key_to_ref = {}
     ref_to_others = {}
+    for einsum in einsums:
+        form = canonical_form(einsum, workload, analyzer, intermediate_tensors)
+        if form.key not in key_to_ref:
+            key_to_ref[form.key] = (einsum, form)
+            ref_to_others[einsum] = {}
+            continue
+        ref, ref_form = key_to_ref[form.key]
+        ref_to_others[ref][einsum] = canonical_renaming(ref_form, form)
+    return ref_to_others
 
 
 
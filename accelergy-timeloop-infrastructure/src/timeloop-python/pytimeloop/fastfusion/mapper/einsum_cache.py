@@ -0,0 +1,158 @@
+"""
+On-disk cache of per-Einsum mapper results, keyed by canonical Einsum form.
+
+Results are stored with canonical rank, tensor and Einsum names, so they can
+be reused by any structurally identical Einsum in this or another workload.
+The context string should identify everything else the results depend on
+(architecture, energy, mapper constraints).
+
+Changed inputs give a new key, so stale entries are never loaded. They are
+removed when the cache grows past its size limit, least recently used first.
+Entries written by other cache versions, and unreadable entries, are removed
+on sight.
+"""
+import glob
+import hashlib
+import json
+import os
+
+import joblib
+
+from pytimeloop.fastfusion.layerdeduplication import CanonicalEinsum
+
+CANONICAL_EINSUM = "__EINSUM"
+
+# Bump when the mapper returns different results for the same inputs (or
+# stores them differently) so that older entries are dropped.
+CACHE_VERSION = 1
+
+
+def canonical_rank(i: int) -> str:
+    return f"__RANK_{i}"
+
+
+def canonical_tensor(i: int) -> str:
+    return f"__TENSOR_{i}"
+
+
+def hash_context(*parts) -> str:
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def hash_tree(tree) -> str:
+    """Hash of a YAML-like tree of dicts and lists that ignores key order."""
+    return hashlib.sha256(
+        json.dumps(tree, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def architecture_subtree(arch) -> list[dict]:
+    """
+    The parts of an architecture the per-Einsum mapper depends on: each
+    node's name, spatial fanout and attributes (capacities, datawidths, ...).
+    """
+    return [
+        dict(
+            name=node["name"],
+            spatial=dict(node.get("spatial", None) or {}),
+            attributes=dict(node.get("attributes", None) or {}),
+        )
+        for node in arch["nodes"]
+    ]
+
+
+def canonical_names(
+    form: CanonicalEinsum, rank_names: dict, tensor_names: dict
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Rank and tensor renamings from the names used in mapper results for this
+    Einsum to canonical names. rank_names and tensor_names map the ids in
+    form to the names used in the results. Returns (None, None) if two ranks
+    share a name, which makes the renaming ambiguous.
+    """
+    ranks = {rank_names[r]: canonical_rank(i) for i, r in enumerate(form.ranks)}
+    tensors = {
+        tensor_names[t]: canonical_tensor(i) for i, t in enumerate(form.tensors)
+    }
+    if len(ranks) != len(form.ranks):
+        return None, None
+    return ranks, tensors
+
+
+class MappedEinsumCache:
+    """
+    max_bytes: If given, least recently used entries are removed after each
+        store until the cache takes at most max_bytes on disk.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        for path in glob.glob(os.path.join(directory, "*.joblib")):
+            if not os.path.basename(path).startswith(self._prefix()):
+                self._remove(path)
+
+    @staticmethod
+    def _prefix() -> str:
+        return f"v{CACHE_VERSION}_"
+
+    def path(self, digest: str, context: str) -> str:
+        return os.path.join(
+            self.directory, f"{self._prefix()}{digest}_{context}.joblib"
+        )
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+            self.evicted += 1
+        except FileNotFoundError:
+            pass
+
+    def load(self, digest: str, context: str):
+        path = self.path(digest, context)
+        try:
+            entry = joblib.load(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # Partially written or from an incompatible version
+            self._remove(path)
+            self.misses += 1
+            return None
+        if not isinstance(entry, dict) or entry.get("key") != (digest, context):
+            self._remove(path)
+            self.misses += 1
+            return None
+        os.utime(path)  # Mark as recently used
+        self.hits += 1
+        return entry["data"]
+
+    def store(self, digest: str, context: str, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(digest, context)
+        entry = dict(key=(digest, context), data=data)
+        joblib.dump(entry, path + ".tmp", compress=3)
+        os.replace(path + ".tmp", path)
+        self.prune()
+
+    def prune(self):
+        """Removes least recently used entries until under max_bytes."""
+        if self.max_bytes is None:
+            return
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.joblib")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
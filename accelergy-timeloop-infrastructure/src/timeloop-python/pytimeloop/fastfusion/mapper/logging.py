@@ -1,39 +1,239 @@
+"""
+Logging from mapper worker processes.
+
+make_queue_and_listener returns a WorkerLogConfig, which is passed to jobs
+as their log_queue argument, and a listener that forwards worker records to
+the handlers of the root logger.
+
+- Records below the configured level are dropped in the worker before they
+  are created, so disabled logging costs a level check.
+- Records are sent to the main process in batches of batch_size (and at the
+  end of each job, or right away at WARNING and above), not one at a time.
+- With log_dir, each worker process writes its records to its own file
+  instead, and the listener merges the files in time order when stopped.
+"""
+from dataclasses import dataclass, field
+import functools
+import glob
+import heapq
+import json
 import logging
 import logging.handlers
 from multiprocessing import Manager
+import os
+import threading
+from typing import Any, Optional
+import uuid
+
+
+@dataclass
+class WorkerLogConfig:
+    level: int = logging.DEBUG
+    queue: Any = None
+    log_dir: Optional[str] = None
+    batch_size: int = 64
+    # Identifies this run's handlers in workers and its files in log_dir
+    token: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+
+class BatchingQueueHandler(logging.handlers.QueueHandler):
+    """Puts lists of records on the queue instead of single records."""
+
+    def __init__(self, queue, batch_size: int):
+        super().__init__(queue)
+        self.batch_size = batch_size
+        self._batch = []
+
+    def enqueue(self, record: logging.LogRecord):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size or record.levelno >= logging.WARNING:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._batch:
+                batch, self._batch = self._batch, []
+                self.queue.put_nowait(batch)
+        finally:
+            self.release()
+
+
+class BatchQueueListener(logging.handlers.QueueListener):
+    """QueueListener that also accepts lists of records."""
+
+    def handle(self, record):
+        if isinstance(record, list):
+            for r in record:
+                super().handle(r)
+        else:
+            super().handle(record)
+
+
+class _JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(
+            dict(
+                created=record.created,
+                name=record.name,
+                levelno=record.levelno,
+                levelname=record.levelname,
+                msg=super().format(record),
+                process=record.process,
+                processName=record.processName,
+            )
+        )
+
+
+def _worker_log_path(config: WorkerLogConfig) -> str:
+    return os.path.join(config.log_dir, f"worker_{config.token}_{os.getpid()}.jsonl")
+
+
+# Handlers of this process by config token, so that jobs run by the same
+# worker share one handler (and one file).
+_worker_handlers: dict[tuple[str, int], logging.Handler] = {}
+_worker_handlers_lock = threading.Lock()
+
+
+def _worker_handler(config: WorkerLogConfig) -> logging.Handler:
+    with _worker_handlers_lock:
+        return _get_worker_handler(config)
+
+
+def _get_worker_handler(config: WorkerLogConfig) -> logging.Handler:
+    key = (config.token, os.getpid())
+    handler = _worker_handlers.get(key, None)
+    if handler is None:
+        # Workers outlive runs. Handlers of earlier runs are no longer used.
+        for old_key in [k for k in _worker_handlers if k[0] != config.token]:
+            _worker_handlers.pop(old_key).close()
+        if config.log_dir is not None:
+            os.makedirs(config.log_dir, exist_ok=True)
+            handler = logging.FileHandler(_worker_log_path(config), delay=True)
+            handler.setFormatter(_JsonLinesFormatter())
+        else:
+            handler = BatchingQueueHandler(config.queue, config.batch_size)
+        handler.setLevel(config.level)
+        _worker_handlers[key] = handler
+    return handler
 
 
 def log_worker(log_name):
     """
     Decorates a function that takes as an input an argument log_queue,
-    which has type Queue, and converts that argument to a logger that
-    posts to that queue.
+    which has type WorkerLogConfig (or Queue), and converts that argument to
+    a logger that posts to the main process.
 
     If log_queue is None, then the function is left unmodified.
     """
     def decorator(f: callable):
+        @functools.wraps(f)
         def wrapper(*args, **kwargs):
             if "log_queue" not in kwargs:
                 raise KeyError("Missing argument log_queue")
-            log_queue = kwargs["log_queue"]
-            if log_queue is None:
+            config = kwargs["log_queue"]
+            if config is None:
                 return f(*args, **kwargs)
+            if not isinstance(config, WorkerLogConfig):
+                config = WorkerLogConfig(queue=config, batch_size=1)
 
+            handler = _worker_handler(config)
             worker_logger = logging.getLogger(log_name)
-            queue_handler = logging.handlers.QueueHandler(log_queue)
-            worker_logger.addHandler(queue_handler)
-            worker_logger.setLevel("DEBUG")
+            worker_logger.setLevel(config.level)
+            # Records only go to the main process, not to this process's root
+            # handlers (which are the main process's with threads).
+            worker_logger.propagate = False
+            worker_logger.handlers = [handler]
             kwargs["log_queue"] = worker_logger
 
-            return f(*args, **kwargs)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                handler.flush()
         return wrapper
     return decorator
 
 
-def make_queue_and_listener():
+def merge_worker_logs(
+    log_dir: str,
+    handlers: list[logging.Handler],
+    token: str = None,
+    remove: bool = True,
+) -> int:
+    """
+    Sends the records in per-worker log files in log_dir (of the run with
+    this token, or all runs) to handlers in time order. Returns the number of
+    records.
+    """
+    pattern = f"worker_{token or '*'}_*.jsonl"
+    paths = sorted(glob.glob(os.path.join(log_dir, pattern)))
+
+    def read(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    n_records = 0
+    for entry in heapq.merge(*(read(p) for p in paths), key=lambda e: e["created"]):
+        record = logging.makeLogRecord(entry)
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        n_records += 1
+    if remove:
+        for path in paths:
+            os.remove(path)
+    return n_records
+
+
+class WorkerLogListener:
+    """Forwards worker records to handlers between start() and stop()."""
+
+    def __init__(self, config: WorkerLogConfig, handlers: list[logging.Handler]):
+        self.config = config
+        self.handlers = handlers
+        self._listener = None
+        self._started = False
+        if config.queue is not None:
+            self._listener = BatchQueueListener(
+                config.queue, *handlers, respect_handler_level=True
+            )
+
+    def start(self):
+        if self._listener is not None:
+            self._listener.start()
+        self._started = True
+
+    def stop(self):
+        # Close this process's handler, which serial and threaded jobs use
+        with _worker_handlers_lock:
+            handler = _worker_handlers.pop((self.config.token, os.getpid()), None)
+        if handler is not None:
+            handler.close()
+        if self._listener is not None and self._started:
+            self._listener.stop()
+        self._started = False
+        if self.config.log_dir is not None:
+            merge_worker_logs(self.config.log_dir, self.handlers, self.config.token)
+
+
+def make_queue_and_listener(
+    level: int = None,
+    log_dir: str = None,
+    batch_size: int = 64,
+) -> tuple[WorkerLogConfig, WorkerLogListener]:
+    """
+    level: Lowest level sent by workers. Defaults to the root logger's level.
+    log_dir: If given, workers write per-process files there, which are
+        merged when the listener is stopped, instead of using a queue.
+    """
     log = logging.getLogger()
-    manager = Manager()
-    log_queue = manager.Queue()
-    log_queue_listener = logging.handlers.QueueListener(log_queue,
-                                                        *log.handlers)
-    return log_queue, log_queue_listener
\ No newline at end of file
+    if level is None:
+        level = log.getEffectiveLevel()
+    elif isinstance(level, str):
+        level = logging.getLevelName(level)
+    config = WorkerLogConfig(level=level, log_dir=log_dir, batch_size=batch_size)
+    if log_dir is None:
+        config.queue = Manager().Queue()
+    return config, WorkerLogListener(config, log.handlers)
@@ -1,10 +1,10 @@
 from collections import defaultdict
-from copy import deepcopy
 import logging.handlers
 from pathlib import Path
 import logging
 
 from pytimeloop.fastfusion.util import parallel
+from pytimeloop.fastfusion.scheduler import get_default_scheduler
 logger = logging.getLogger(__name__)
 
 from ruamel.yaml import YAML
@@ -12,14 +12,25 @@ from joblib import delayed
 
 yaml = YAML(typ="safe")
 
-from bindings.looptree import LooptreeWorkload, LooptreeWorkloadDependencyAnalyzer
-
-from pytimeloop.looptree.equivalent_ranks import EquivalentGroups
-
 from pytimeloop.fastfusion.mapper.constraints import *
-from pytimeloop.fastfusion.layerdeduplication import is_equivalent
+from pytimeloop.fastfusion.layerdeduplication import canonical_form
 from pytimeloop.fastfusion.mapper.logging import make_queue_and_listener
-from pytimeloop.fastfusion.mapper.per_einsum_mapper import get_top_loop_jobs, mapper_place_fusion_level
+from pytimeloop.fastfusion.mapper.per_einsum_mapper import (
+    estimate_job_size,
+    get_top_loop_jobs,
+    mapper_place_fusion_level,
+    split_budget,
+)
+from pytimeloop.fastfusion.mapper.templates import ArchitectureTemplate, FourLevelTemplate
+from pytimeloop.fastfusion.mapper.shared_workload import register_workload, get_workload, release_workload
+from pytimeloop.fastfusion.mapper.einsum_cache import (
+    CANONICAL_EINSUM,
+    MappedEinsumCache,
+    architecture_subtree,
+    canonical_names,
+    hash_context,
+    hash_tree,
+)
 from pytimeloop.fastfusion.sim import Tiling, Loop, TensorStorage
 from pytimeloop.fastfusion.pareto import LOGSTRING, MAPPING, STATS, DICT_COLUMNS, TENSORS
 from pytimeloop.fastfusion.mapper.process_results import Metrics
@@ -38,15 +49,126 @@ def mapper(
     tmp_path,
     verbose_stream=None,
     metrics=Metrics.all_metrics(),
+    einsum_cache_dir=None,
+    einsum_cache_max_bytes=None,
+    worker_log_level=None,
+    worker_log_dir=None,
+    max_candidates_per_job=None,
+    max_candidates_per_einsum=None,
 ):
+    """
+    Maps every Einsum onto a four-level architecture (see
+    templates.FourLevelTemplate). Other arguments are as in template_mapper.
+    """
+    return template_mapper(
+        FourLevelTemplate(
+            pe_array_constraint,
+            mac_array_constraint,
+            explore_glb_uneven,
+            explore_pe_uneven,
+        ),
+        config,
+        spec,
+        tmp_path,
+        verbose_stream=verbose_stream,
+        metrics=metrics,
+        einsum_cache_dir=einsum_cache_dir,
+        einsum_cache_max_bytes=einsum_cache_max_bytes,
+        worker_log_level=worker_log_level,
+        worker_log_dir=worker_log_dir,
+        max_candidates_per_job=max_candidates_per_job,
+        max_candidates_per_einsum=max_candidates_per_einsum,
+    )
+
+
+def template_mapper(
+    template: ArchitectureTemplate,
+    config,
+    spec,
+    tmp_path,
+    verbose_stream=None,
+    metrics=Metrics.all_metrics(),
+    einsum_cache_dir=None,
+    einsum_cache_max_bytes=None,
+    worker_log_level=None,
+    worker_log_dir=None,
+    max_candidates_per_job=None,
+    max_candidates_per_einsum=None,
+):
+    """
+    Maps every Einsum with the mapspace of template (see templates.py).
+    Returns {Einsum name: {(compatibility, columns): [results]}}.
+
+    If einsum_cache_dir is given, results of each unique Einsum are cached
+    there by canonical Einsum form and reused by structurally identical
+    Einsums in later runs, including runs on other workloads. Entries are
+    keyed by everything else the results depend on (architecture nodes,
+    ERT and ART, and mapper constraints), so changing one Einsum only remaps
+    that Einsum. If einsum_cache_max_bytes is given, least recently used
+    entries are removed to keep the cache under that size.
+
+    If worker_log_level is given, records of mapper jobs at that level and
+    above are forwarded to the root logger's handlers, through per-worker
+    files in worker_log_dir if given. See logging.py. Worker logging is off
+    otherwise.
+
+    Before jobs are launched, the number of candidates (mappings and tile
+    shapes) of every job is estimated and printed, and jobs are balanced
+    across workers by their estimate. max_candidates_per_job and
+    max_candidates_per_einsum cap the candidates explored; an Einsum's
+    budget is split across its jobs, and a job's across its mappings, in
+    proportion to their estimates. Capped results come from a sample of each
+    mapping's tile shapes, so they may miss Pareto-optimal candidates; they
+    are not cached.
+    """
     logger.info(f"Calling mapper for {spec}")
 
-    # log_queue, log_queue_listener = make_queue_and_listener()
     log_queue, log_queue_listener = None, None
-
-    workload = LooptreeWorkload.parse_cfg(config.root["problem"])
-    analyzer = LooptreeWorkloadDependencyAnalyzer(workload)
-    equivalent_groups = EquivalentGroups.from_workload(workload, analyzer)
+    if worker_log_level is not None:
+        log_queue, log_queue_listener = make_queue_and_listener(
+            worker_log_level, worker_log_dir
+        )
+
+    # Parsed once and shared with every job
+    workload_key = register_workload(config)
+    try:
+        return _mapper(
+            template,
+            config,
+            spec,
+            tmp_path,
+            log_queue,
+            log_queue_listener,
+            workload_key,
+            verbose_stream=verbose_stream,
+            metrics=metrics,
+            einsum_cache_dir=einsum_cache_dir,
+            einsum_cache_max_bytes=einsum_cache_max_bytes,
+            max_candidates_per_job=max_candidates_per_job,
+            max_candidates_per_einsum=max_candidates_per_einsum,
+        )
+    finally:
+        release_workload(workload_key)
+
+
+def _mapper(
+    template: ArchitectureTemplate,
+    config,
+    spec,
+    tmp_path,
+    log_queue,
+    log_queue_listener,
+    workload_key,
+    verbose_stream=None,
+    metrics=Metrics.all_metrics(),
+    einsum_cache_dir=None,
+    einsum_cache_max_bytes=None,
+    max_candidates_per_job=None,
+    max_candidates_per_einsum=None,
+):
+    shared = get_workload(workload_key, config)
+    workload = shared.workload
+    equivalent_groups = shared.equivalent_groups
 
     einsum_name_to_id = workload.einsum_name_to_id()
 
@@ -57,29 +179,66 @@ def mapper(
     ert = Ert(ert_dict["ERT"])
     energy_dict = ert.to_dict()
 
+    template.prepare(shared, spec)
     grouped_similar_einsums = convert_rank_to_group_renaming(
-        detect_similar_einsums(workload, analyzer),
+        template.group_einsums(shared),
         equivalent_groups
     )
     logger.info(f"Found {len(grouped_similar_einsums)} unique Einsums\n"
                 + f"\tConverter: {grouped_similar_einsums}")
 
+    einsums_to_explore = list(grouped_similar_einsums.keys())
+    cached_data = {}
+    if einsum_cache_dir is not None:
+        cache = MappedEinsumCache(einsum_cache_dir, einsum_cache_max_bytes)
+        art_path = Path(tmp_path) / "ART.yaml"
+        area_dict = yaml.load(art_path) if art_path.exists() else None
+        cache_keys = _einsum_cache_keys(
+            einsums_to_explore,
+            shared,
+            template,
+            spec,
+            energy_dict,
+            area_dict,
+            metrics,
+        )
+        for einsum_id, (digest, context, to_canonical) in cache_keys.items():
+            cached = cache.load(digest, context)
+            if cached is None:
+                continue
+            from_canonical = tuple(
+                {v: k for k, v in renaming.items()} for renaming in to_canonical
+            )
+            cached_data[einsum_id] = generate_data(
+                CANONICAL_EINSUM,
+                shared.einsum_id_to_name[einsum_id],
+                cached,
+                *from_canonical,
+            )
+        einsums_to_explore = [e for e in einsums_to_explore if e not in cached_data]
+        logger.info(f"Loaded {cache.hits} of {len(cache_keys)} cacheable Einsums "
+                    + f"from {einsum_cache_dir}")
+
     args = get_top_loop_jobs(
-        einsums_to_explore=list(grouped_similar_einsums.keys()),
+        einsums_to_explore=einsums_to_explore,
         config=config,
-        pe_array_constraint=pe_array_constraint,
-        mac_array_constraint=mac_array_constraint,
-        explore_glb_uneven=explore_glb_uneven,
-        explore_pe_uneven=explore_pe_uneven,
+        template=template,
         spec=spec,
         energy_dict=energy_dict,
         log_queue=log_queue,
         verbose_stream=verbose_stream,
         metrics=metrics,
+        workload_key=workload_key,
     )
 
     print(f'Number of jobs: {len(args)}')
-    n_workers = 64
+    costs, is_capped = budget_jobs(
+        args,
+        shared.einsum_id_to_name,
+        max_candidates_per_job,
+        max_candidates_per_einsum,
+    )
+    n_workers = get_default_scheduler().effective_n_workers(len(args))
     logger.debug(f"Starting {n_workers} workers")
     if log_queue_listener is not None:
         log_queue_listener.start()
@@ -88,7 +247,7 @@ def mapper(
     #     mapper_place_fusion_level(**a)
     
     result = parallel(
-        delayed(mapper_place_fusion_level)(**a) for a in args
+        [delayed(mapper_place_fusion_level)(**a) for a in args], costs=costs
     )
     data = {einsum_id: defaultdict(list) for einsum_id in grouped_similar_einsums}
     total = 0
@@ -97,6 +256,18 @@ def mapper(
             data[einsum_id][k].extend(v)
         total += count
     print(f"Total number of mappings: {total}")
+    if einsum_cache_dir is not None:
+        for einsum_id in einsums_to_explore:
+            if einsum_id not in cache_keys or einsum_id in is_capped:
+                continue
+            digest, context, to_canonical = cache_keys[einsum_id]
+            cache.store(digest, context, generate_data(
+                shared.einsum_id_to_name[einsum_id],
+                CANONICAL_EINSUM,
+                data[einsum_id],
+                *to_canonical,
+            ))
+    data.update(cached_data)
     if log_queue_listener is not None:
         log_queue_listener.stop()
     logger.info(f"Mapper finished for {spec}")
@@ -136,6 +307,52 @@ def mapper(
     return data
 
 
+def budget_jobs(
+    args,
+    einsum_id_to_name,
+    max_candidates_per_job=None,
+    max_candidates_per_einsum=None,
+):
+    """
+    Estimates the candidates of each job, prints the estimates per Einsum and
+    sets max_candidates of jobs that exceed a budget. Returns the capped
+    estimate of each job, to balance jobs by, and the Einsums that were
+    capped.
+    """
+    sizes = [estimate_job_size(**a) for a in args]
+    einsum_to_jobs = defaultdict(list)
+    for i, a in enumerate(args):
+        einsum_to_jobs[a["einsum_id"]].append(i)
+
+    caps = list(sizes)
+    if max_candidates_per_job is not None:
+        caps = [min(c, max_candidates_per_job) for c in caps]
+    if max_candidates_per_einsum is not None:
+        for jobs in einsum_to_jobs.values():
+            split = split_budget(
+                [caps[i] for i in jobs], max_candidates_per_einsum
+            )
+            for i, c in zip(jobs, split):
+                caps[i] = c
+
+    is_capped = set()
+    for einsum_id, jobs in einsum_to_jobs.items():
+        size = sum(sizes[i] for i in jobs)
+        explored = sum(caps[i] for i in jobs)
+        message = (f"Einsum {einsum_id_to_name[einsum_id]}: {len(jobs)} jobs, "
+                   + f"estimated {size} candidates")
+        if explored < size:
+            is_capped.add(einsum_id)
+            message += f", budget {explored}"
+        print(message)
+    print(f"Estimated total candidates: {sum(sizes)}")
+
+    for a, size, cap in zip(args, sizes, caps):
+        if cap < size:
+            a["max_candidates"] = cap
+    return caps, is_capped
+
+
 def generate_data(from_einsum: int, to_einsum: int, data, rank_renaming, tensor_renaming):
     return {
         _convert_tiling(tiling, rank_renaming, tensor_renaming)
@@ -146,42 +363,76 @@ def generate_data(from_einsum: int, to_einsum: int, data, rank_renaming, tensor_
 
 
 def _convert_tiling(tiling: Tiling, rank_renaming, tensor_renaming):
+    # process_result keys results by (compatibility Tiling, columns)
+    if isinstance(tiling, tuple):
+        return (tiling[0].rename(rank_renaming, tensor_renaming), *tiling[1:])
     return tiling.rename(rank_renaming, tensor_renaming)
 
 
 def _convert_stats(from_einsum: int, to_einsum: int, stats, rank_renaming, tensor_renaming):
-    stats = deepcopy(stats)
+    # Only the containers that are renamed are copied. Everything else is
+    # shared with from_einsum's stats, which are never modified.
+    converted = []
     for s in stats:
+        s = dict(s)
         for d in DICT_COLUMNS:
             if d in s:
-                s[d][to_einsum] = s[d].pop(from_einsum)
+                s[d] = {
+                    (to_einsum if k == from_einsum else k): v
+                    for k, v in s[d].items()
+                }
         if MAPPING in s:
             s[MAPPING][to_einsum] = s[MAPPING][to_einsum].rename(rank_renaming, tensor_renaming)
         if TENSORS in s:
             s[TENSORS][to_einsum] = [t.rename(rank_renaming, tensor_renaming) for t in s[TENSORS][to_einsum]]
-    return stats
-
-
-def detect_similar_einsums(workload, analyzer, return_all_as_unique=False):
-    if return_all_as_unique:
-        return {ref: {} for ref in workload.einsum_id_to_name()}
-
-    ref_to_to_einsums = {}
-    for einsum in workload.einsum_id_to_name():
-        found = False
-        for from_einsum in ref_to_to_einsums:
-            rank_renaming, tensor_renaming = is_equivalent(from_einsum,
-                                                           einsum,
-                                                           workload,
-                                                           analyzer)
-            if rank_renaming is not None:
-                ref_to_to_einsums[from_einsum][einsum] = (rank_renaming,
-                                                            tensor_renaming)
-                found = True
-                break
-        if not found:
-            ref_to_to_einsums[einsum] = {}
-    return ref_to_to_einsums
+        converted.append(s)
+    return converted
+
+
+def _einsum_cache_keys(
+    einsums,
+    shared,
+    template,
+    spec,
+    energy_dict,
+    area_dict,
+    metrics,
+):
+    """
+    Returns {einsum: (canonical digest, context hash, (rank renaming, tensor
+    renaming) to canonical names)} for every Einsum whose results can be
+    cached.
+    """
+    workload = shared.workload
+    dimension_id_to_name = {v: k for k, v in shared.rank_name_to_id.items()}
+    tensor_id_to_name = {v: k for k, v in shared.tensor_name_to_id.items()}
+    # Tilings name ranks by their equivalence group
+    rank_names = {
+        r: dimension_id_to_name[g]
+        for r, g in shared.equivalent_groups.rank_to_group_id.items()
+    }
+    architecture = hash_tree(architecture_subtree(spec.architecture))
+    area = hash_tree(area_dict)
+
+    keys = {}
+    for einsum_id in einsums:
+        form = canonical_form(einsum_id, workload, shared.analyzer,
+                              shared.intermediate_tensors)
+        to_canonical = canonical_names(form, rank_names, tensor_id_to_name)
+        if to_canonical[0] is None:
+            continue
+        template_context = template.cache_context(shared, einsum_id, form)
+        if template_context is None:
+            continue
+        context = hash_context(
+            template_context,
+            metrics.value,
+            architecture,
+            sorted(energy_dict.items()),
+            area,
+        )
+        keys[einsum_id] = (form.digest, context, to_canonical)
+    return keys
 
 
 def convert_rank_to_group_renaming(ref_to_to_einsums, equiv_ranks):
@@ -1,285 +1,238 @@
 from collections import defaultdict
-from functools import reduce
-from operator import or_
+import logging
 
 from pytimeloop.fastfusion.fastmodel import compile_mapping
 from pytimeloop.fastfusion.mapper.constraints import *
 from pytimeloop.fastfusion.mapper.logging import log_worker
+from pytimeloop.fastfusion.mapper.shared_workload import get_workload
 from .per_einsum_subspaces.subspaces import (
-    LinearMapping,
-    make_temporal_fors,
-    make_spatial_fors,
-    make_storage,
-    explore_tile_shape
+    explore_tile_shape,
+    count_tile_shapes,
 )
 
 from pytimeloop.fastfusion.mapper.process_results import Metrics, process_result
+from pytimeloop.fastfusion.pareto import pareto_rows
 
-from pytimeloop.looptree.equivalent_ranks import EquivalentGroups
-from pytimeloop.looptree.mapping_utilities import get_intermediate_tensors
-
-from bindings.looptree import LooptreeWorkload, LooptreeWorkloadDependencyAnalyzer
 
 
 @log_worker(f"{__name__}:_mapper_place_fusion_level")
 def mapper_place_fusion_level(
     config,
-    pe_array_constraint: PeArrayConstraint,
-    mac_array_constraint: MacArrayConstraint,
+    template,
     spec,
-    explore_glb_uneven,
-    explore_pe_uneven,
     einsum_id,
     energy_dict,
     partial_mapping,
     log_queue=None,
     verbose_stream=None,
     metrics=Metrics.all_metrics(),
+    workload_key=None,
+    max_candidates=None,
 ):
-    # if log_queue is not None:
-    #     log_queue.info(f"[{einsum_id}] Exploring mapspace of Einsum {einsum_id}")
-    logfunc = lambda msg: None # log_queue.debug(f"[{einsum_id}] " + msg)
-
-    workload = LooptreeWorkload.parse_cfg(config.root["problem"])
-    analyzer = LooptreeWorkloadDependencyAnalyzer(workload)
-    equivalent_groups = EquivalentGroups.from_workload(workload, analyzer)
-
-    einsum_id_to_name = workload.einsum_id_to_name()
-    rank_name_to_id   = workload.dimension_name_to_id()
-    tensor_name_to_id = workload.data_space_name_to_id()
-
-    mac_parallel_shape = mac_array_constraint.array_shape_in_parallel_dimension
-    mac_reduced_shape = mac_array_constraint.array_shape_in_reduced_dimension
-
-    einsum_name_to_parallel_rank_name = mac_array_constraint.parallel_rank
-    einsum_name_to_reduced_rank_name = mac_array_constraint.reduced_rank
+    """
+    Explores the tile shapes of every mapping that template completes
+    partial_mapping into (see templates.py). If max_candidates is given, at
+    most that many tile shapes are explored, split across mappings in
+    proportion to their number of tile shapes (see split_budget) and sampled
+    across each mapping's tile shapes.
+    """
+    # Messages are only built if they will be logged
+    if log_queue is not None and log_queue.isEnabledFor(logging.DEBUG):
+        logfunc = lambda msg: log_queue.debug(f"[{einsum_id}] " + msg)
+    else:
+        logfunc = lambda msg: None
+
+    shared = get_workload(workload_key, config)
+    workload = shared.workload
+    analyzer = shared.analyzer
+    equivalent_groups = shared.equivalent_groups
+
+    einsum_id_to_name = shared.einsum_id_to_name
+    rank_id_to_name = {v: k for k, v in shared.rank_name_to_id.items()}
+    tensor_id_to_name = {v: k for k, v in shared.tensor_name_to_id.items()}
+    input_tensors = set(tensor_id_to_name[t] for t in workload.tensors_read_by_einsum(einsum_id))
+    output_tensors = set(tensor_id_to_name[t] for t in workload.tensors_written_by_einsum(einsum_id))
+    rank_name_to_shared_name = {
+        rank_id_to_name[k]: rank_id_to_name[v]
+        for k, v in equivalent_groups.rank_to_group_id.items()
+    }
 
     bindings, max_fanout, max_capacity = get_hardware_levels(spec.architecture)
 
+    mapspace = EinsumMapspace(shared, einsum_id)
     data = defaultdict(list)
-    tensors = workload.tensors_read_by_einsum(einsum_id) \
-            | workload.tensors_written_by_einsum(einsum_id)
-    intermediate_tensors = tensors & get_intermediate_tensors(workload)
-
-    einsum_name = einsum_id_to_name[einsum_id]
-    mac_parallel_rank_name = einsum_name_to_parallel_rank_name[einsum_name]
-    mac_parallel_rank_id = rank_name_to_id[mac_parallel_rank_name]
-    mac_reduced_rank_name = einsum_name_to_reduced_rank_name[einsum_name]
-    mac_reduced_rank_id = rank_name_to_id[mac_reduced_rank_name]
-
-    weight_tensor_name = mac_array_constraint.weight_tensor[einsum_name]
-    weight_tensor_id = tensor_name_to_id[weight_tensor_name]
-    weight_ranks = analyzer.einsum_dims_relevant_to_tensor(einsum_id, weight_tensor_id)
-    other_weight_ranks = weight_ranks - {mac_parallel_rank_id, mac_reduced_rank_id}
-    all_ranks = workload.einsum_ospace_dimensions(einsum_id)
-    non_weight_ranks = set(all_ranks) - weight_ranks
-
-    tensor_to_relevant_ranks = {
-        tensor: analyzer.einsum_dims_relevant_to_tensor(einsum_id, tensor)
-        for tensor in tensors
-    }
-
-    einsum_shape = {
-        rank_id: workload.get_rank_shape(rank_id)[1] + 1 for rank_id in all_ranks
-    }
+    tensors = mapspace.tensors
+    intermediate_tensors = mapspace.intermediate_tensors
+    einsum_shape = mapspace.einsum_shape
     count = 0
 
-    for partial_mapping in make_temporal_fors(  # PE temporal
-        partial_mapping, all_ranks
-    ):
-        # No bypassing at PE level. Can relax to explore more mappings
-        pe_must_retain = tensors
-        pe_can_retain = set()
-        for partial_mapping in make_storage(  # PE storage
+    mappings = template.mappings(shared, einsum_id, partial_mapping)
+    budgets = None
+    if max_candidates is not None:
+        mappings = list(mappings)
+        budgets = split_budget(
+            [mapspace.count_tile_shapes(m) for m in mappings], max_candidates
+        )
+    for i, partial_mapping in enumerate(mappings):
+        _, compiled_results = compile_mapping(
+            partial_mapping, workload, analyzer
+        )
+        # print(f'Einsum {einsum_id} partial mapping: {partial_mapping}')
+        tile_shape_explorer = explore_tile_shape(
             partial_mapping,
-            level=2,  # PE level
-            must_retain_tensors=pe_must_retain,
-            can_retain_tensors=pe_can_retain,
-            tensor_to_relevant_ranks=tensor_to_relevant_ranks,
-            explore_uneven=explore_pe_uneven,
-        ):
-            found_storages = set()
-            fail = False
-            for i, p in enumerate(partial_mapping):
-                if p["type"] == "storage":
-                    for t in set(p["dspace"]) - found_storages:
-                        for p2 in partial_mapping[:i]:
-                            if p2["type"] in ["temporal", "spatial"] and p2["rank"] not in tensor_to_relevant_ranks[t]:
-                                fail = True
-                                break
-                    found_storages |= set(p["dspace"])
-                if len(found_storages) < len(tensors) or i == 0:
-                    continue
-                prev = partial_mapping[i - 1]
-                for t in ["spatial"]: # "temporal", TEMPORAL DOESN"T WORK. WEIRD INTERACTIONS WITH LOOP RELEVANCE PRINCIPLE
-                    if p["type"] == t and prev["type"] == t and p["rank"] < prev["rank"]:
-                        fail = True
-                        # print(f'Skipping partial mapping: {partial_mapping}')
-            if fail:
-                continue
-            for partial_mapping in make_mac_level_loops(
-                partial_mapping,
+            einsum_shape,
+            compiled_results,
+            max_capacity,
+            max_fanout,
+            tensors=tensors,
+            vectorized=True,
+            max_shapes=None if budgets is None else budgets[i],
+        )
+        # HACKY: Pop out the subspace object as the first in the iterator
+        shape_subspace = next(tile_shape_explorer)
+
+        for shape, res in tile_shape_explorer:
+            count += 1
+            # print(f'Running partial mapping: {partial_mapping} with shape: {shape}')
+            is_pareto, results, fulltiling = process_result(
+                res,
+                shape,
+                data,
                 einsum_id,
-                mac_parallel_rank_id,
-                mac_parallel_shape,
-                mac_reduced_rank_id,
-                mac_reduced_shape,
-                non_weight_ranks,
-                other_weight_ranks,
-            ):
-                _, compiled_results = compile_mapping(
-                    partial_mapping, workload, analyzer
-                )
-                # print(f'Einsum {einsum_id} partial mapping: {partial_mapping}')
-                tile_shape_explorer = explore_tile_shape(
-                    partial_mapping,
-                    einsum_shape,
-                    compiled_results,
-                    max_capacity,
-                    max_fanout,
-                    tensors=tensors,
-                )
-                # HACKY: Pop out the subspace object as the first in the iterator
-                shape_subspace = next(tile_shape_explorer)
-
-                for shape, res in tile_shape_explorer:
-                    count += 1
-                    # print(f'Running partial mapping: {partial_mapping} with shape: {shape}')
-                    is_pareto, results, fulltiling = process_result(
-                        res,
-                        shape,
-                        data,
-                        einsum_id,
-                        intermediate_tensors,
-                        partial_mapping,
-                        bindings,
-                        workload,
-                        energy_dict,
-                        equivalent_groups,
-                        logfunc=logfunc,
-                        explore_fusion_uneven=explore_glb_uneven,
-                        einsum_shape=einsum_shape,
-                        metrics=metrics,
-                        einsum_id_to_name=einsum_id_to_name,
-                        rank_id_to_name={v: k for k, v in rank_name_to_id.items()},
-                        tensor_id_to_name={v: k for k, v in tensor_name_to_id.items()},
-                    )
-                    if count % 1e4 == 0:
-                        print(f"Einsum {einsum_id} #{count}, fulltiling: {fulltiling}")
-                    # shape_subspace.register_result(is_pareto, results)
-    # assert False
+                intermediate_tensors,
+                partial_mapping,
+                bindings,
+                workload,
+                energy_dict,
+                equivalent_groups,
+                logfunc=logfunc,
+                explore_fusion_uneven=template.explore_fusion_uneven,
+                einsum_shape=einsum_shape,
+                metrics=metrics,
+                einsum_id_to_name=einsum_id_to_name,
+                rank_id_to_name=rank_id_to_name,
+                tensor_id_to_name=tensor_id_to_name,
+                rank_name_to_shared_name=rank_name_to_shared_name,
+                input_tensors=input_tensors,
+                output_tensors=output_tensors,
+                **template.process_result_args(),
+            )
+            if count % 1e4 == 0:
+                print(f"Einsum {einsum_id} #{count}, fulltiling: {fulltiling}")
+            # shape_subspace.register_result(is_pareto, results)
+    # process_result only rejects rows dominated when they are added. Drop
+    # rows dominated later before sending results to the main process.
+    data = {k: pareto_rows(v) for k, v in data.items()}
     return einsum_id, data, count
 
 
 @log_worker(f"{__name__}:_get_top_loop_jobs")
 def get_top_loop_jobs(
     config,
-    pe_array_constraint: PeArrayConstraint,
-    mac_array_constraint: MacArrayConstraint,
+    template,
     spec,
-    explore_glb_uneven,
-    explore_pe_uneven,
     einsums_to_explore,
     energy_dict,
     log_queue=None,
     verbose_stream=None,
     metrics=Metrics.all_metrics(),
+    workload_key=None,
 ):
+    """Arguments of mapper_place_fusion_level for every job of the Einsums."""
     args = []
     for einsum_id in einsums_to_explore:
         if log_queue is not None:
             log_queue.info(f"[{einsum_id}] Exploring mapspace of Einsum {einsum_id}")
+        if log_queue is not None and log_queue.isEnabledFor(logging.DEBUG):
             logfunc = lambda msg: log_queue.debug(f"[{einsum_id}] " + msg)
         else:
             logfunc = lambda msg: None  # do nothing
 
-        workload = LooptreeWorkload.parse_cfg(config.root["problem"])
-        analyzer = LooptreeWorkloadDependencyAnalyzer(workload)
+        shared = get_workload(workload_key, config)
+        for partial_mapping in template.partial_mappings(shared, einsum_id, logfunc):
+            args.append(dict(
+                config=config,
+                template=template,
+                spec=spec,
+                einsum_id=einsum_id,
+                energy_dict=energy_dict,
+                partial_mapping=partial_mapping,
+                log_queue=log_queue,
+                verbose_stream=verbose_stream,
+                metrics=metrics,
+                workload_key=workload_key,
+            ))
+    return args
+
 
-        data = {}
-        data[einsum_id] = defaultdict(lambda: defaultdict(lambda: list()))
-        tensors = workload.tensors_read_by_einsum(einsum_id) \
-                | workload.tensors_written_by_einsum(einsum_id)
-        intermediate_tensors = tensors & get_intermediate_tensors(workload)
-        all_ranks = workload.einsum_ospace_dimensions(einsum_id)
+class EinsumMapspace:
+    """Ranks and tensors of an Einsum that its mapspace depends on."""
+    def __init__(self, shared, einsum_id):
+        workload = shared.workload
+        analyzer = shared.analyzer
+        self.einsum_id = einsum_id
 
+        self.tensors = workload.tensors_read_by_einsum(einsum_id) \
+                | workload.tensors_written_by_einsum(einsum_id)
+        self.intermediate_tensors = self.tensors & shared.intermediate_tensors
+        self.all_ranks = workload.einsum_ospace_dimensions(einsum_id)
 
-        tensor_to_relevant_ranks = {
+        self.tensor_to_relevant_ranks = {
             tensor: analyzer.einsum_dims_relevant_to_tensor(einsum_id, tensor)
-            for tensor in tensors
+            for tensor in self.tensors
+        }
+        self.einsum_shape = {
+            rank_id: workload.get_rank_shape(rank_id)[1] + 1
+            for rank_id in self.all_ranks
         }
 
-        top_level_ranks = reduce(
-            or_, (tensor_to_relevant_ranks[t] for t in intermediate_tensors), set()
-        )
-
-        mapping = LinearMapping()
-        logfunc(f"Allowed top-level loop ranks: {top_level_ranks}")
-
-        off_chip_must_retain = tensors - intermediate_tensors
-        off_chip_can_retain = intermediate_tensors
-        for partial_mapping in make_storage(  # Off-chip level
-            mapping,
-            level=0,
-            must_retain_tensors=off_chip_must_retain,
-            can_retain_tensors=off_chip_can_retain,
-            tensor_to_relevant_ranks=tensor_to_relevant_ranks,
-            explore_uneven=False,
-            add_split_at_tensors=intermediate_tensors,
-        ):
-            for partial_mapping in make_temporal_fors(  # GLB temporal
-                partial_mapping,
-                top_level_ranks,
-            ):
-                glb_must_retain = set(intermediate_tensors)
-                glb_can_retain = set()
-                for partial_mapping in make_storage(  # GLB level
-                    partial_mapping,
-                    level=1,
-                    must_retain_tensors=glb_must_retain,
-                    can_retain_tensors=glb_can_retain,
-                    must_fully_reuse_tensors=set(intermediate_tensors),
-                    tensor_to_relevant_ranks=tensor_to_relevant_ranks,
-                    explore_uneven=explore_glb_uneven,
-                    add_split_at_tensors=intermediate_tensors,
-                    must_have_terminal_storage=True,  # GLB only opt.
-                    logfunc=None
-                ):                   
-                    for partial_mapping in make_spatial_fors(  # PE spatial
-                        partial_mapping,
-                        all_ranks,
-                        max_factor=pe_array_constraint.array_shape
-                    ):
-                        # found_storages = set()
-                        # fail = False
-                        # for i, p in enumerate(partial_mapping):
-                        #     if p["type"] == "storage":
-                        #         found_storages |= set(p["dspace"])
-                        #     if len(found_storages) < len(tensors) or i == 0:
-                        #         continue
-                        #     prev = partial_mapping[i - 1]
-                        #     for t in ["temporal", "spatial"]:
-                        #         if p["type"] == t and prev["type"] == t and p["rank"] < prev["rank"]:
-                        #             fail = True
-                        #             print(f'Skipping partial mapping: {partial_mapping}')
-                        # if fail:
-                        #     continue
-                        print(f'Partial mapping: {partial_mapping}')
-                        args.append(dict(
-                            config=config,
-                            pe_array_constraint=pe_array_constraint,
-                            mac_array_constraint=mac_array_constraint,
-                            spec=spec,
-                            explore_glb_uneven=explore_glb_uneven,
-                            explore_pe_uneven=explore_pe_uneven,
-                            einsum_id=einsum_id,
-                            energy_dict=energy_dict,
-                            partial_mapping=partial_mapping,
-                            log_queue=log_queue,
-                            verbose_stream=verbose_stream,
-                            metrics=metrics,
-                        ))
-    return args
+    def count_tile_shapes(self, mapping) -> int:
+        return count_tile_shapes(mapping, self.einsum_shape, self.tensors)
+
+
+def split_budget(sizes: list[int], budget: int) -> list[int]:
+    """
+    Splits a budget of candidates across spaces of the given sizes in
+    proportion to their size. Every nonempty space gets at least one
+    candidate, so the total may exceed budget by up to len(sizes).
+    """
+    total = sum(sizes)
+    if total <= budget:
+        return list(sizes)
+    shares = [budget * s / total for s in sizes]
+    split = [min(s, max(1, int(x))) for s, x in zip(sizes, shares)]
+    # Hand out what rounding down left, largest remainders first
+    left = budget - sum(split)
+    for i in sorted(range(len(sizes)), key=lambda i: int(shares[i]) - shares[i]):
+        if left <= 0:
+            break
+        if split[i] < sizes[i]:
+            split[i] += 1
+            left -= 1
+    return split
+
+
+def estimate_job_size(
+    config,
+    template,
+    einsum_id,
+    partial_mapping,
+    workload_key=None,
+    **kwargs,
+) -> int:
+    """
+    Estimates the number of candidates (mapping and tile shape pairs)
+    mapper_place_fusion_level explores for a job (a dict of its arguments,
+    as returned by get_top_loop_jobs), before capacity and fanout checks.
+    Mappings are generated, but tile shapes are counted from rank
+    factorizations and nothing is compiled or evaluated.
+    """
+    shared = get_workload(workload_key, config)
+    mapspace = EinsumMapspace(shared, einsum_id)
+    return sum(
+        mapspace.count_tile_shapes(m)
+        for m in template.mappings(shared, einsum_id, partial_mapping)
+    )
 
 
 def make_mac_level_loops(
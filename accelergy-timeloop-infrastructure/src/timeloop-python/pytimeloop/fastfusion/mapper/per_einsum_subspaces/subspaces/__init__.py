@@ -1,4 +1,4 @@
-from .tile_shape import explore_tile_shape
+from .tile_shape import explore_tile_shape, count_tile_shapes
 from .linear_mapping import LinearMapping
 from .loops import *
 from .storage import make_storage
@@ -1 +1 @@
-from .tile_shape import explore_tile_shape
\ No newline at end of file
+from .tile_shape import explore_tile_shape, count_tile_shapes
\ No newline at end of file
@@ -1,4 +1,6 @@
+from functools import lru_cache
 import re
+from typing import Callable
 
 from combinatorics.integer import integer_factorizations_to_n_parts
 
@@ -24,13 +26,34 @@ def parse_constraint(constraint_str: str):
         raise RuntimeError(f'Unknown comparison operator {comparison}')
 
 
+def tile_shape_choices(shape, tile_constraints, factor_constraints):
+    """Tile shapes that a loop over a rank of this shape can take, smallest first."""
+    if shape == 1:
+        res = [(1, 1)]
+    else:
+        res = list(integer_factorizations_to_n_parts(shape, 2))[:-1]
+    res = [i for i in res if all(c(i[0]) for c in tile_constraints)]
+    res = [i for i in res if all(c(i[1]) for c in factor_constraints)]
+    res = [i[0] for i in res]
+    return res
+
+
 class ShapeSubspace:
     def __init__(self,
                  rank_shapes: dict[int, int],
                  ranks: list[int],
                  tile_constraints: list[list[str]]=None,
                  factor_constraints: list[list[str]]=None,
-                 n_fusion_relevant_loops: int=None):
+                 n_fusion_relevant_loops: int=None,
+                 capacity_bounds: list[tuple[Callable, float, int]]=None):
+        """
+        capacity_bounds: (occupancy, limit, n_positions) for each memory
+            level. occupancy is a function of the full shape that is
+            nondecreasing in every tile shape and only depends on the first
+            n_positions of them. Partial shapes are checked against the
+            bound as soon as it is set, so infeasible subtrees are never
+            entered.
+        """
         self.rank_shapes = rank_shapes
         self.ranks = ranks
         if tile_constraints is None:
@@ -50,6 +73,7 @@ class ShapeSubspace:
 
         self.position_to_last = {}
         self.n_fusion_relevant_loops = n_fusion_relevant_loops
+        self.capacity_bounds = capacity_bounds or []
         self.fill_position_to_next()
         # print(f'Made shape subspace with tile constraints {self.tile_constraints} and factor constraints {self.factor_constraints}')
 
@@ -65,6 +89,33 @@ class ShapeSubspace:
     def __iter__(self) -> 'ShapeSubspaceIterator':
         return ShapeSubspaceIterator(self)
 
+    def count(self) -> int:
+        """
+        Number of tile shapes in the subspace without capacity bounds or
+        skipping, i.e., an upper bound on the number of shapes iterated.
+        Counted from the rank factorizations without enumerating shapes.
+        """
+        position_to_next = {
+            last: i for i, last in self.position_to_last.items() if last is not None
+        }
+
+        # Number of choices of position i and the later positions of its rank
+        @lru_cache(maxsize=None)
+        def n_choices(i, shape):
+            choices = tile_shape_choices(
+                shape, self.tile_constraints[i], self.factor_constraints[i]
+            )
+            if i not in position_to_next:
+                return len(choices)
+            return sum(n_choices(position_to_next[i], c) for c in choices)
+
+        # Ranks are chosen independently of each other
+        total = 1
+        for i, last in self.position_to_last.items():
+            if last is None:
+                total *= n_choices(i, self.rank_shapes[self.ranks[i]])
+        return total
+
 def check_add_to_pareto(a, pareto):
     for b in pareto:
         if all(b[k] <= a[k] for k in a):
@@ -82,6 +133,12 @@ class ShapeSubspaceIterator:
         self.n_fusion_relevant_loops = shape_subspace.n_fusion_relevant_loops
         if self.n_fusion_relevant_loops is None:
             self.n_fusion_relevant_loops = len(self.choice_generators)
+        # A bound only changes while positions it depends on are set
+        self.position_to_bounds = [
+            [(f, limit) for f, limit, n in shape_subspace.capacity_bounds if i < n]
+            for i in range(len(self.ranks))
+        ]
+        self.n_pruned = 0
 
         self.is_started = False
         self.is_done = False
@@ -130,8 +187,8 @@ class ShapeSubspaceIterator:
                     pass
             if len(self.choice_iterators) == 0:
                 idx = 0
-            for j in range(idx+1, len(self.choice_iterators)):
-                self.restart_iterator(j)
+            if not self.is_done:
+                self._restart_from(idx+1)
         else:
             self.just_skipped = False
 
@@ -168,9 +225,9 @@ class ShapeSubspaceIterator:
                 self.prev_idx = idx
                 break
             except StopIteration as e:
-                self.restart_iterator(idx)
-        for j in range(idx+1, len(self.choice_iterators)):
-            self.restart_iterator(j)
+                pass
+        if not self.is_done:
+            self._restart_from(idx+1)
 
         self.just_skipped = True
 
@@ -179,21 +236,7 @@ class ShapeSubspaceIterator:
             self._add_pareto_point(-1, result)
 
     def make_choice_generators(self, shape_subspace: ShapeSubspace):
-        choice_generators = []
-
-        def gen(shape, tile_constraints, factor_constraints):
-            if shape == 1:
-                res = [(1, 1)]
-            else:
-                res = list(integer_factorizations_to_n_parts(shape, 2))[:-1]
-            res = [i for i in res if all(c(i[0]) for c in tile_constraints)]
-            res = [i for i in res if all(c(i[1]) for c in factor_constraints)]
-            res = [i[0] for i in res]
-            return res
-
-        for _ in shape_subspace.ranks:
-            choice_generators.append(gen)
-        return choice_generators
+        return [tile_shape_choices for _ in shape_subspace.ranks]
 
     def initialize_choice_iterators(self):
         self.choice_iterators = [None]*len(self.choice_generators)
@@ -202,15 +245,45 @@ class ShapeSubspaceIterator:
         self.paretos = [None]*len(self.choice_generators)
         self.prev_paretos = [None]*len(self.choice_generators)
         self.would_have_skipped = [False]*len(self.choice_generators)
-        for i in range(len(self.choice_generators)):
+        self._restart_from(0)
+        self.prev_idx = len(self.choice_iterators) - 1
+
+    def _fits(self, idx):
+        """
+        Whether the shape chosen up to position idx can fit. Later positions
+        are taken to be 1, which bounds occupancy from below.
+        """
+        bounds = self.position_to_bounds[idx]
+        if not bounds:
+            return True
+        shape = self.choice[:idx+1] + [1]*(len(self.choice) - idx - 1)
+        return all(f(*shape) <= limit for f, limit in bounds)
+
+    def _restart_from(self, idx):
+        """
+        Restarts positions idx onwards. If a position has no feasible choice
+        under the current prefix, the prefix is advanced instead. Sets is_done
+        if no feasible shapes remain.
+        """
+        j = idx
+        while j < len(self.choice_iterators):
             try:
-                self.restart_iterator(i)
-            except StopIteration as e:
+                self.restart_iterator(j)
+                j += 1
+                continue
+            except StopIteration:
+                pass
+            j -= 1
+            while j >= 0:
+                try:
+                    self.move_iterator(j)
+                    break
+                except StopIteration:
+                    j -= 1
+            if j < 0:
                 self.is_done = True
                 return
-
-            self.is_first_choice[i] = True
-        self.prev_idx = len(self.choice_iterators) - 1
+            j += 1
 
     def restart_iterator(self, idx):
         last = self.pos_to_last[idx]
@@ -227,6 +300,11 @@ class ShapeSubspaceIterator:
         self.paretos[idx] = []
         self.prev_paretos[idx] = None
         self.would_have_skipped[idx] = False
+        # Later choices are larger, so if the smallest does not fit, no
+        # choice at this position fits under the current prefix
+        if not self._fits(idx):
+            self.n_pruned += 1
+            raise StopIteration()
 
     def move_iterator(self, idx):
         val = next(self.choice_iterators[idx])
@@ -244,6 +322,11 @@ class ShapeSubspaceIterator:
                 # self.would_have_skipped[idx] = True
                 raise StopIteration()
         self.choice[idx] = val
+        # Choices are increasing, so once one does not fit, none of the
+        # remaining ones do
+        if not self._fits(idx):
+            self.n_pruned += 1
+            raise StopIteration()
         self.is_first_choice[idx] = False
         self.is_done = False
         self.prev_paretos[idx] = self.paretos[idx]
@@ -1,12 +1,33 @@
 from collections import defaultdict
 from functools import reduce
+from itertools import islice
 from operator import mul
+import random
+
+import numpy as np
 
 from .shape_subspace import ShapeSubspace
 
+from pytimeloop.fastfusion.skyline import pareto_mask
 from pytimeloop.looptree.des import LooptreeOutput
 
 
+# Number of tile shapes evaluated together in vectorized mode
+VECTOR_BLOCK_SIZE = 4096
+
+OUTPUT_FIELDS = [
+    "ops",
+    "temporal_steps",
+    "fanout",
+    "occupancy",
+    "fills",
+    "reads_to_parent",
+    "op_intensity",
+]
+# Fanout only decides validity. It does not enter any metric.
+PARETO_FIELDS = [f for f in OUTPUT_FIELDS if f != "fanout"]
+
+
 def explore_tile_shape(
     mapping,
     rank_shapes,
@@ -14,44 +35,53 @@ def explore_tile_shape(
     max_capacity,
     max_fanout,
     tensors,
-    only_count=False
+    only_count=False,
+    vectorized=False,
+    block_size=VECTOR_BLOCK_SIZE,
+    max_shapes=None,
+    sample_seed=0,
 ):
-    ranks = []
-    tile_constraints = []
-    factor_constraints = []
-    tensors_not_found = set(tensors)
-    n_fusion_relevant_loops = None
-    for node in mapping:
-        if node["type"] in ["temporal", "spatial"] and "tile_shape" not in node:
-            ranks.append(node["rank"])
-            tile_constraint = []
-            factor_constraint = []
-            if "tile_constraint" in node:
-                tile_constraint.append(node["tile_constraint"])
-            if "factor_constraint" in node:
-                factor_constraint.append(node["factor_constraint"])
-            # if node["type"] == "temporal" and "factor_constraint" not in node and "tile_constraint" not in node:
-            #     factor_constraint.append(">1")
+    """
+    Generator that first yields the ShapeSubspaceIterator and then every
+    valid (shape, result) pair. Returns the number of tile shapes explored
+    and the number of valid tile shapes.
 
-            tile_constraints.append(tile_constraint)
-            factor_constraints.append(factor_constraint)
-        elif node["type"] == "storage" and tensors_not_found:
-            tensors_not_found -= set(node["dspace"])
-            if not tensors_not_found:
-                n_fusion_relevant_loops = len(ranks)
+    If max_shapes is given, at most that many tile shapes are explored,
+    sampled across the whole subspace (see sample_shapes) with sample_seed.
 
-    num_tile_shapes = 0
-    num_valid_tile_shapes = 0
+    If vectorized, tile shapes are evaluated in blocks of block_size with
+    NumPy. Capacity and fanout checks run on the whole block, and shapes
+    that are dominated by another shape in the block with the same
+    fusion-relevant loops are dropped before they are yielded.
 
-    shape_subspace = iter(ShapeSubspace(
-            rank_shapes,
-            ranks,
-            tile_constraints=tile_constraints,
-            factor_constraints=factor_constraints,
-            n_fusion_relevant_loops=n_fusion_relevant_loops
-    ))
+    Subtrees of the shape subspace whose partial tile shapes already exceed
+    a level's capacity are not explored.
+    """
+    capacity_bounds = None
+    if not only_count:
+        capacity_bounds = (compiled_result, max_capacity)
+    subspace, n_fusion_relevant_loops = make_shape_subspace(
+        mapping, rank_shapes, tensors, capacity_bounds
+    )
+    shape_subspace = iter(subspace)
     yield shape_subspace
-    for shape in shape_subspace:
+
+    shapes = shape_subspace
+    if max_shapes is not None:
+        shapes = sample_shapes(shape_subspace, subspace.count(), max_shapes, sample_seed)
+    if vectorized and not only_count:
+        return (yield from _explore_vectorized(
+            shapes,
+            compiled_result,
+            max_capacity,
+            max_fanout,
+            n_fusion_relevant_loops,
+            block_size,
+        ))
+
+    num_tile_shapes = 0
+    num_valid_tile_shapes = 0
+    for shape in shapes:
         num_tile_shapes += 1
         if only_count:
             continue
@@ -93,9 +123,285 @@ def explore_tile_shape(
     return num_tile_shapes, num_valid_tile_shapes
 
 
+def sample_shapes(shapes, n_shapes, max_shapes, seed=0):
+    """
+    Yields at most max_shapes of shapes, spread over all of them: the first
+    n_shapes positions are split into max_shapes equal strata and one
+    position is drawn from each with a Random(seed). A prefix would only
+    cover one corner of the subspace, which depends on the loop order.
+
+    n_shapes may overestimate the number of shapes (e.g., ShapeSubspace.count
+    ignores capacity pruning). Then fewer shapes are yielded, still spread
+    over all of them.
+    """
+    if max_shapes >= n_shapes:
+        yield from shapes
+        return
+    rng = random.Random(seed)
+    stride = n_shapes / max_shapes
+
+    def position(stratum):
+        return int((stratum + rng.random()) * stride)
+
+    stratum = 0
+    next_position = position(stratum)
+    for i, shape in enumerate(shapes):
+        if i < next_position:
+            continue
+        yield shape
+        stratum += 1
+        if stratum == max_shapes:
+            return
+        next_position = position(stratum)
+
+
+def make_shape_subspace(
+    mapping,
+    rank_shapes,
+    tensors,
+    capacity_bounds=None,
+):
+    """
+    Returns the ShapeSubspace of the loops of mapping without a tile shape
+    and the number of fusion-relevant loops. capacity_bounds is
+    (compiled_result, max_capacity), if capacity bounds should be checked.
+    See explore_tile_shape.
+    """
+    ranks = []
+    tile_constraints = []
+    factor_constraints = []
+    tensors_not_found = set(tensors)
+    n_fusion_relevant_loops = None
+    # Occupancy of a level only depends on the loops above its storage nodes
+    level_to_n_positions = {}
+    for node in mapping:
+        if node["type"] in ["storage", "compute"]:
+            level = node["target"]
+            level_to_n_positions[level] = max(
+                level_to_n_positions.get(level, 0), len(ranks)
+            )
+        if node["type"] in ["temporal", "spatial"] and "tile_shape" not in node:
+            ranks.append(node["rank"])
+            tile_constraint = []
+            factor_constraint = []
+            if "tile_constraint" in node:
+                tile_constraint.append(node["tile_constraint"])
+            if "factor_constraint" in node:
+                factor_constraint.append(node["factor_constraint"])
+            # if node["type"] == "temporal" and "factor_constraint" not in node and "tile_constraint" not in node:
+            #     factor_constraint.append(">1")
+
+            tile_constraints.append(tile_constraint)
+            factor_constraints.append(factor_constraint)
+        elif node["type"] == "storage" and tensors_not_found:
+            tensors_not_found -= set(node["dspace"])
+            if not tensors_not_found:
+                n_fusion_relevant_loops = len(ranks)
+
+    if capacity_bounds is not None:
+        capacity_bounds = make_capacity_bounds(*capacity_bounds, level_to_n_positions)
+
+    subspace = ShapeSubspace(
+            rank_shapes,
+            ranks,
+            tile_constraints=tile_constraints,
+            factor_constraints=factor_constraints,
+            n_fusion_relevant_loops=n_fusion_relevant_loops,
+            capacity_bounds=capacity_bounds,
+    )
+    return subspace, n_fusion_relevant_loops
+
+
+def count_tile_shapes(mapping, rank_shapes, tensors) -> int:
+    """
+    Number of tile shapes of mapping before capacity and fanout checks, an
+    upper bound on the shapes explore_tile_shape explores. Cheap: nothing is
+    compiled or enumerated.
+    """
+    subspace, _ = make_shape_subspace(mapping, rank_shapes, tensors)
+    return subspace.count()
+
+
+def make_capacity_bounds(compiled_result, max_capacity, level_to_n_positions):
+    """
+    One (occupancy, limit, n_positions) bound for every level with a
+    capacity limit. See ShapeSubspace.
+    """
+    level_to_occupancy = defaultdict(list)
+    for (level, _), f in compiled_result.occupancy.items():
+        if level in max_capacity:
+            level_to_occupancy[level].append(f)
+
+    def total(fs):
+        return lambda *shape: sum(f(*shape) for f in fs)
+
+    return [
+        (total(fs), max_capacity[level], level_to_n_positions.get(level, 0))
+        for level, fs in level_to_occupancy.items()
+    ]
+
+
 def call_with_arg(f, arg):
     if isinstance(next(iter(f.values())), tuple):
         return {k: (v[0], v[1](*arg)) for k, v in f.items()}
     else:
         return {k: v(*arg) for k, v in f.items()}
 
+
+def _explore_vectorized(
+    shape_subspace,
+    compiled_result,
+    max_capacity,
+    max_fanout,
+    n_fusion_relevant_loops,
+    block_size,
+):
+    num_tile_shapes = 0
+    num_valid_tile_shapes = 0
+    is_done = False
+    while not is_done:
+        block = list(islice(shape_subspace, block_size))
+        # The subspace iterator must not be advanced once it is exhausted
+        is_done = len(block) < block_size
+        if not block:
+            break
+        num_tile_shapes += len(block)
+        shapes = np.array(block, dtype=np.int64).reshape(len(block), -1)
+        results = call_with_block(compiled_result, shapes)
+
+        valid = capacity_mask(results, max_capacity, len(block))
+        valid &= fanout_mask(results, max_fanout, len(block))
+        if n_fusion_relevant_loops is None:
+            n_fusion_relevant_loops = shapes.shape[1]
+        valid[valid] = block_pareto_mask(
+            shapes[valid, :n_fusion_relevant_loops],
+            {k: v[valid] for k, v in objective_columns(results).items()},
+        )
+
+        rows = np.flatnonzero(valid)
+        num_valid_tile_shapes += len(rows)
+        yield from zip((block[i] for i in rows), split_block(results, rows))
+    return num_tile_shapes, num_valid_tile_shapes
+
+
+def call_with_block(compiled_result, shapes: np.ndarray) -> dict:
+    """
+    Evaluates every compiled output for each row of shapes. Returns
+    {field: {key: array}} with one array entry per row. Fanouts map to a list
+    of arrays (one per spatial dimension) and tuple-valued outputs keep their
+    first element.
+    """
+    n = len(shapes)
+    args = [shapes[:, i] for i in range(shapes.shape[1])]
+
+    def broadcast(v):
+        return np.broadcast_to(np.asarray(v, dtype=np.float64), (n,))
+
+    results = {}
+    for field in OUTPUT_FIELDS:
+        out = {}
+        for k, f in getattr(compiled_result, field).items():
+            if isinstance(f, tuple):
+                out[k] = (f[0], broadcast(f[1](*args)))
+                continue
+            v = f(*args)
+            if isinstance(v, list):
+                out[k] = [broadcast(x) for x in v]
+            else:
+                out[k] = broadcast(v)
+        results[field] = out
+    return results
+
+
+def capacity_mask(results: dict, max_capacity: dict, n: int) -> np.ndarray:
+    total_capacity = {}
+    for (level, _), capacity in results["occupancy"].items():
+        total_capacity[level] = total_capacity.get(level, 0) + capacity
+    mask = np.ones(n, dtype=bool)
+    for level, capacity in total_capacity.items():
+        if level in max_capacity:
+            mask &= capacity <= max_capacity[level]
+    return mask
+
+
+def fanout_mask(results: dict, max_fanout: dict, n: int) -> np.ndarray:
+    mask = np.ones(n, dtype=bool)
+    for level, fanout in results["fanout"].items():
+        if level in max_fanout:
+            mask &= (
+                reduce(mul, fanout, np.ones(n))
+                <= reduce(mul, max_fanout[level], 1)
+            )
+    return mask
+
+
+def objective_columns(results: dict) -> dict:
+    """
+    Every model output that metrics are computed from as a column. The
+    metrics are nondecreasing in all of them, so a shape that is no better in
+    any column can not be better in any metric.
+    """
+    columns = {}
+    for field in PARETO_FIELDS:
+        for k, v in results[field].items():
+            if isinstance(v, tuple):
+                v = v[1]
+            if isinstance(v, list):
+                for i, x in enumerate(v):
+                    columns[(field, k, i)] = x
+            else:
+                columns[(field, k)] = v
+    return columns
+
+
+def block_pareto_mask(groups: np.ndarray, columns: dict) -> np.ndarray:
+    """
+    Pareto filters rows among those with the same fusion-relevant tile
+    shapes (rows of groups). Those loops decide compatibility with other
+    Einsums, so shapes that differ in them are never compared.
+    """
+    n = len(groups)
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    costs = (
+        np.stack(list(columns.values()), axis=1) if columns
+        else np.zeros((n, 0))
+    )
+    if groups.shape[1] == 0:
+        return pareto_mask(costs, distinct=False)
+    _, inverse = np.unique(groups, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+    for rows in np.split(order, bounds):
+        mask[rows] = pareto_mask(costs[rows], distinct=False)
+    return mask
+
+
+def split_block(results: dict, rows: np.ndarray):
+    """Yields a LooptreeOutput with Python floats for each of rows."""
+    columns = {}
+    for field in OUTPUT_FIELDS:
+        for k, v in results[field].items():
+            if isinstance(v, tuple):
+                columns[(field, k)] = (v[0], v[1][rows].tolist())
+            elif isinstance(v, list):
+                columns[(field, k)] = [x[rows].tolist() for x in v]
+            else:
+                columns[(field, k)] = v[rows].tolist()
+
+    for i in range(len(rows)):
+        result = LooptreeOutput()
+        for field in OUTPUT_FIELDS:
+            out = {}
+            for k in results[field]:
+                v = columns[(field, k)]
+                if isinstance(v, tuple):
+                    out[k] = (v[0], v[1][i])
+                elif isinstance(v, list) and isinstance(results[field][k], list):
+                    out[k] = [x[i] for x in v]
+                else:
+                    out[k] = v[i]
+            setattr(result, field, out)
+        yield result
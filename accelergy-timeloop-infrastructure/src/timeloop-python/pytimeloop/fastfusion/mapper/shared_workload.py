@@ -0,0 +1,56 @@
+"""
+Workload objects shared by all per-Einsum mapper jobs in a process.
+
+mapper() registers the parsed workload before dispatching jobs, and jobs only
+carry the registry key. Forked workers inherit the registry. Spawned workers
+(e.g., loky) parse the workload the first time they see a key and reuse it for
+every later job, so the workload is parsed once per worker instead of once per
+job. Everything here is read-only once built.
+"""
+import uuid
+
+from bindings.looptree import LooptreeWorkload, LooptreeWorkloadDependencyAnalyzer
+
+from pytimeloop.looptree.equivalent_ranks import EquivalentGroups
+from pytimeloop.looptree.mapping_utilities import get_intermediate_tensors
+
+
+class SharedWorkload:
+    def __init__(self, config):
+        self.workload = LooptreeWorkload.parse_cfg(config.root["problem"])
+        self.analyzer = LooptreeWorkloadDependencyAnalyzer(self.workload)
+        self.equivalent_groups = EquivalentGroups.from_workload(
+            self.workload, self.analyzer
+        )
+        self.einsum_id_to_name = self.workload.einsum_id_to_name()
+        self.rank_name_to_id = self.workload.dimension_name_to_id()
+        self.tensor_name_to_id = self.workload.data_space_name_to_id()
+        self.intermediate_tensors = get_intermediate_tensors(self.workload)
+
+
+_registry: dict[str, SharedWorkload] = {}
+
+
+def register_workload(config) -> str:
+    """Parses the workload in config and returns the key to share it by."""
+    key = uuid.uuid4().hex
+    _registry[key] = SharedWorkload(config)
+    return key
+
+
+def get_workload(key, config) -> SharedWorkload:
+    """
+    Returns the workload registered under key, parsing it from config if this
+    process has not seen the key. If key is None, the workload is parsed and
+    not kept.
+    """
+    if key is None:
+        return SharedWorkload(config)
+    shared = _registry.get(key, None)
+    if shared is None:
+        shared = _registry[key] = SharedWorkload(config)
+    return shared
+
+
+def release_workload(key):
+    _registry.pop(key, None)
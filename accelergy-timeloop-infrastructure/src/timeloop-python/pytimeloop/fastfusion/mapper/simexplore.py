@@ -1,14 +1,22 @@
 from collections import defaultdict
 from collections.abc import Mapping
 import copy
+import dataclasses
+import glob
+import hashlib
 import itertools
+import os
 import time
+from typing import Union
 
+import joblib
 import pandas as pd
 from joblib import delayed
 
-from pytimeloop.fastfusion.sim import SIM
-from pytimeloop.fastfusion.pareto import Pareto
+from pytimeloop.fastfusion.sim import SIM, INTERNED_TILINGS
+from pytimeloop.fastfusion.pareto import Pareto, DICT_COLUMNS
+from pytimeloop.fastfusion.spill import spilling
+from pytimeloop.fastfusion.trace import Tracer, TRACE_FORMATS
 from pytimeloop.fastfusion.util import parallel, debugger_active
 
 
@@ -16,9 +24,29 @@ def explore_fusion(
     einsum_to_result: Mapping,
     resource2capacity: dict = None,
     return_nmappings_nbuckets: bool = False,
+    checkpoint_dir: str = None,
+    resume: bool = False,
+    lookahead: int = None,
+    memory_budget: int = None,
+    spill_dir: str = None,
+    trace_path: str = None,
+    trace_format: str = "json",
+    prepare_ahead: bool = True,
+    epsilon: Union[float, dict[str, float]] = None,
 ):
     return fuse_sims(
-        mapping2sims(einsum_to_result), resource2capacity, return_nmappings_nbuckets
+        mapping2sims(einsum_to_result),
+        resource2capacity,
+        return_nmappings_nbuckets,
+        checkpoint_dir=checkpoint_dir,
+        resume=resume,
+        lookahead=lookahead,
+        memory_budget=memory_budget,
+        spill_dir=spill_dir,
+        trace_path=trace_path,
+        trace_format=trace_format,
+        prepare_ahead=prepare_ahead,
+        epsilon=epsilon,
     )
 
 
@@ -56,6 +84,128 @@ def print_total_time():
     print(f"============================\n")
 
 
+def lookahead_filter(
+    sims: list[tuple[str, list[SIM]]],
+    depth: int = None,
+) -> list[tuple[str, list[SIM]]]:
+    """
+    Drops SIMs that can't be fused with any SIM of another Einsum up to depth
+    Einsums away (all Einsums if depth is None). Two SIMs can only ever be
+    fused if they agree on the storages of the tensors they share and on the
+    loops above them; see Tiling.lookahead_key. Pairs of Einsums are checked in
+    both directions. Returns the filtered sims and prints how many SIMs each
+    depth pruned.
+    """
+    sims = [(einsum_id, list(s)) for einsum_id, s in sims]
+    pruned = defaultdict(int)
+    depth = len(sims) - 1 if depth is None else depth
+
+    def prune(i: int, j: int):
+        (_, a), (_, b) = sims[i], sims[j]
+        if not a or not b:
+            return
+        shared = a[0].tensor_names & b[0].tensor_names
+        if not shared:
+            return
+        keys = {s.tiling.lookahead_key(shared) for s in b}
+        kept = [s for s in a if s.tiling.lookahead_key(shared) in keys]
+        if not kept:
+            print(
+                f"Lookahead: No SIMs of Einsum {sims[i][0]} are compatible with "
+                f"Einsum {sims[j][0]}. Not pruning."
+            )
+            return
+        pruned[abs(j - i)] += len(a) - len(kept)
+        sims[i] = (sims[i][0], kept)
+
+    for d in range(1, depth + 1):
+        for i in range(len(sims) - d):
+            prune(i, i + d)
+        for i in reversed(range(d, len(sims))):
+            prune(i, i - d)
+
+    for d, n in sorted(pruned.items()):
+        print(f"Lookahead depth {d} pruned {n} SIMs")
+    return sims
+
+
+def _canonical(x):
+    """
+    Form of x whose repr does not depend on the process: sets are sorted,
+    dict items are sorted and dataclasses (e.g., Tiling and TensorStorage) are
+    replaced by their fields. The iteration order of sets and frozensets, and
+    so their repr, changes with PYTHONHASHSEED.
+    """
+    if isinstance(x, Mapping):
+        items = ((_canonical(k), _canonical(v)) for k, v in x.items())
+        return ("dict", tuple(sorted(items, key=repr)))
+    if isinstance(x, (set, frozenset)):
+        return ("set", tuple(sorted((_canonical(v) for v in x), key=repr)))
+    if isinstance(x, (list, tuple)):
+        return tuple(_canonical(v) for v in x)
+    if dataclasses.is_dataclass(x) and not isinstance(x, type):
+        return (type(x).__name__,) + tuple(
+            _canonical(getattr(x, f.name)) for f in dataclasses.fields(x)
+        )
+    return x
+
+
+def _hash_inputs(
+    sims: list[tuple[str, list[SIM]]],
+    resource2capacity: dict,
+    options: dict = None,
+) -> str:
+    # Hashes the reprs of canonical forms, which are the same in every process.
+    # options are the fuse_sims arguments that change the state of later steps.
+    h = hashlib.sha256()
+    h.update(repr(_canonical(resource2capacity or {})).encode())
+    h.update(repr(_canonical(options or {})).encode())
+    for einsum_id, s in sims:
+        h.update(repr(einsum_id).encode())
+        for sim in s:
+            data = sim.mapping.data
+            h.update(repr(_canonical(sim.tiling)).encode())
+            h.update(repr(list(data.columns)).encode())
+            numeric = [c for c in data.columns if c not in DICT_COLUMNS]
+            h.update(pd.util.hash_pandas_object(data[numeric], index=False).values.tobytes())
+            for c in data.columns:
+                if c in DICT_COLUMNS:
+                    h.update(repr(_canonical(data[c].tolist())).encode())
+    return h.hexdigest()[:16]
+
+
+def _checkpoint_path(checkpoint_dir: str, input_hash: str, step: str) -> str:
+    return os.path.join(checkpoint_dir, f"fuse_sims_{input_hash}_{step}.joblib")
+
+
+def save_checkpoint(checkpoint_dir: str, input_hash: str, step: int, state: dict):
+    """
+    Saves the state after a fuse_sims step as a compressed joblib file and
+    removes the checkpoint of the previous step. The file is written under a
+    temporary name first so that a crash mid-write leaves the previous
+    checkpoint intact.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    path = _checkpoint_path(checkpoint_dir, input_hash, f"{step:04d}")
+    joblib.dump(state, path + ".tmp", compress=3)
+    os.replace(path + ".tmp", path)
+    for old in glob.glob(_checkpoint_path(checkpoint_dir, input_hash, "*")):
+        if old != path:
+            os.remove(old)
+
+
+def load_checkpoint(checkpoint_dir: str, input_hash: str) -> tuple[int, dict]:
+    """
+    Returns (step, state) of the latest checkpoint saved for these inputs, or
+    (0, None) if there is none.
+    """
+    paths = sorted(glob.glob(_checkpoint_path(checkpoint_dir, input_hash, "*")))
+    if not paths:
+        return 0, None
+    step = int(paths[-1].rsplit("_", 1)[-1].split(".")[0])
+    return step, joblib.load(paths[-1])
+
+
 def consolidate(
     x,
     left: bool,
@@ -88,143 +238,409 @@ def fuse_sims(
     sims: dict[str, list[SIM]],
     resource2capacity: dict = None,
     return_nmappings_nbuckets: bool = False,
+    checkpoint_dir: str = None,
+    resume: bool = False,
+    lookahead: int = None,
+    memory_budget: int = None,
+    spill_dir: str = None,
+    trace_path: str = None,
+    trace_format: str = "json",
+    prepare_ahead: bool = True,
+    epsilon: Union[float, dict[str, float]] = None,
 ):
-    nmappings = []
-    nbuckets = []
-    
-    sims = list(sims.items())
-    
-    for einsum_id, s in sims:
-        print(f'SIM {einsum_id} tensors: {s[0].tensor_names}')
-
-    # TODO: Lookahead by one SIM. If we're going to create a tiling that has loops
-    # that are not in the ranks of the next SIM, we should drop that tiling.
-    # if pre_filter:
-    #     for i in range(len(sims) - 1):
-    #         left, right = sims[i], sims[i + 1]
-    #         left_live = set.union(set(), *[s[0].tensor_names for s in sims[:i + 1]])
-    #         right_live = set.union(set(), *[s[0].tensor_names for s in sims[i + 1:]])
-    #         left2, right2 = SIM.get_possibly_compatible(left, right, left_live, right_live)
-    #         if not left2 or not right2:
-    #             left2, right2 = SIM.get_possibly_compatible(left, right, left_live, right_live)
-    #         sims[i], sims[i + 1] = left2, right2
-    #         print(f'Filtered {len(left)} -> {len(left2)} SIMs from Einsum {i}')
-    #         print(f'Filtered {len(right)} -> {len(right2)} SIMs from Einsum {i + 1}')
-
-    init_print_time()
-    if len(sims) == 1:
-        left = copy.deepcopy(sims[0][1])
-        sims = []
-        left = consolidate(
-            x=left,
-            left=True,
-            live_tensors=set(),
-            resource2capacity=resource2capacity,
-            shared_tensors=set(),
+    """
+    Before fusing, SIMs that can't be fused with any SIM of an Einsum up to
+    lookahead Einsums away are dropped (all Einsums if None, off if 0).
+
+    If checkpoint_dir is given, the surviving SIMs are saved there after each
+    Einsum. With resume, fuse_sims continues from the latest checkpoint saved
+    for the same sims, resource2capacity, lookahead, prepare_ahead and
+    epsilon.
+
+    If memory_budget (bytes) is given, SIM mappings beyond the budget are
+    spilled to spill_dir (a temporary directory by default) and loaded back
+    when needed. See spill.py.
+
+    If trace_path is given, the time, peak memory, and number of SIMs and
+    rows before and after each stage of each Einsum step are written there.
+    trace_format is "json" or "chrome" (chrome://tracing). See trace.py.
+
+    With prepare_ahead, the right side of every step, which only depends on
+    tensor liveness, is consolidated up front in one parallel batch across
+    all Einsums. Results are the same either way.
+
+    If epsilon is given, epsilon-Pareto fronts are kept instead of exact ones
+    (see Pareto). epsilon is a relative tolerance for all objectives other
+    than resource usage, or a dict of per-column tolerances. The returned
+    front's error bound is saved in data.attrs["error_bound"]: every mapping
+    of the exact front is within a factor (1 + error_bound) on each objective
+    of some returned mapping.
+    """
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(
+            f"Unknown trace format {trace_format}. Options are {TRACE_FORMATS}"
         )
-
-    n_iterations = 0
-    total_iterations = len(sims)
-    left_einsum, left = sims.pop(0)
-    while sims:
-        n_iterations += 1
-        nbuckets.append(len(left))
-        nmappings.append(sum(len(s.mapping.data) for s in left))
-
-        right_einsum, right = sims.pop(0)
-        print(f'\nEinsum {right_einsum} ({n_iterations}/{total_iterations})')
-        
-        live_tensors = set.union(set(), *[s[0].tensor_names for _, s in sims if s])
-        shared_tensors = set(left[0].tensor_names) & set(right[0].tensor_names)
-
+    tracer = Tracer()
+    try:
+        with spilling(memory_budget, spill_dir) as store:
+            if store is not None:
+                for s in sims.values():
+                    for sim in s:
+                        store.track(sim.mapping)
+            if epsilon is not None:
+                for s in sims.values():
+                    for sim in s:
+                        sim.mapping.epsilon = epsilon
+                        sim.mapping.make_pareto()
+            return _fuse_sims(
+                sims,
+                resource2capacity,
+                return_nmappings_nbuckets,
+                checkpoint_dir,
+                resume,
+                lookahead,
+                tracer,
+                prepare_ahead,
+                epsilon,
+            )
+    finally:
+        if trace_path is not None:
+            tracer.save(trace_path, trace_format)
+
+
+def _counts(sims, suffix: str) -> dict:
+    if isinstance(sims, dict):
+        sims = [s for v in sims.values() for s in v]
+    return {
+        f"sims_{suffix}": len(sims),
+        f"rows_{suffix}": sum(s.mapping.num_rows() for s in sims),
+    }
+
+
+def step_tensors(sims: list[tuple[str, list[SIM]]]) -> list[tuple[set, set, set]]:
+    """
+    For each step of fuse_sims, which fuses sims[i] onto the fused
+    sims[:i], returns the live tensors (used by sims[i + 1:]), the tensors
+    shared by both sides, and the tensors of the left side. These depend only
+    on which Einsums use which tensors, not on the SIMs chosen.
+    """
+    names = [set(s[0].tensor_names) for _, s in sims]
+    steps = []
+    left_tensors = names[0]
+    for i in range(1, len(names)):
+        live_tensors = set().union(*names[i + 1:])
+        steps.append((live_tensors, left_tensors & names[i], left_tensors))
+        # Merged SIMs keep the live tensors of both sides
+        left_tensors = (left_tensors | names[i]) & live_tensors
+    return steps
+
+
+def _prepare_right(
+    sims: list[tuple[str, list[SIM]]],
+    steps: list[tuple[set, set, set]],
+    resource2capacity: dict,
+    tracer: Tracer,
+) -> list[tuple[str, list[SIM], set[str]]]:
+    """
+    Consolidates and combines the right side of the given fuse_sims steps.
+    This only depends on tensor liveness, so the right sides of all steps
+    are consolidated together in one parallel batch instead of one step at a
+    time. Returns (einsum_id, sims, tensors) of each right side.
+    """
+    jobs, costs, owners = [], [], []
+    for i, ((_, right), (live_tensors, shared_tensors, _)) in enumerate(zip(sims, steps)):
+        for r in sorted(right, key=lambda x: x.mapping.num_rows(), reverse=True):
+            jobs.append(delayed(lambda r, l, s: r.consolidate(l, resource2capacity, s))(
+                r, live_tensors, shared_tensors
+            ))
+            costs.append(r.mapping.num_rows())
+            owners.append(i)
+
+    with tracer.stage("Preparing", **_counts([r for _, s in sims for r in s], "in")) as event:
+        consolidated = [[] for _ in sims]
+        for i, r in zip(owners, parallel(jobs, pbar="Consolidating", costs=costs)):
+            consolidated[i].append(r)
+
+        prepared = []
+        for (einsum_id, right), c, (live_tensors, _, left_tensors) in zip(sims, consolidated, steps):
+            tensors = set(right[0].tensor_names)
+            prepared.append((einsum_id, SIM.combine_combineable(c, live_tensors | left_tensors), tensors))
+        event.update(_counts([r for _, s, _ in prepared for r in s], "out"))
+    print_time("Preparing")
+    return prepared
+
+
+def _fuse_step(
+    left: list[SIM],
+    left_einsum: str,
+    right: list[SIM],
+    right_einsum: str,
+    live_tensors: set[str],
+    resource2capacity: dict,
+    tracer: Tracer,
+    right_tensors: set[str] = None,
+) -> list[SIM]:
+    """
+    Fuses the SIMs in right onto the SIMs in left. live_tensors are the
+    tensors used by Einsums that have not been fused yet.
+
+    If right_tensors (the tensors of the right Einsum) is given, right has
+    already been consolidated and combined by _prepare_right.
+    """
+    prepared = right_tensors is not None
+    if not prepared:
         right_tensors = right[0].tensor_names
-        left_tensors = left[0].tensor_names
-        
-        args = dict(
-            left=False,
-            live_tensors=live_tensors,
-            resource2capacity=resource2capacity,
-            shared_tensors=shared_tensors,
-        )
+    shared_tensors = set(left[0].tensor_names) & set(right_tensors)
+
+    left_tensors = left[0].tensor_names
+    
+    args = dict(
+        left=False,
+        live_tensors=live_tensors,
+        resource2capacity=resource2capacity,
+        shared_tensors=shared_tensors,
+    )
 
-        left = sorted(left, key=lambda x: len(x.mapping.data), reverse=True)
-        right = sorted(right, key=lambda x: len(x.mapping.data), reverse=True)
+    left = sorted(left, key=lambda x: x.mapping.num_rows(), reverse=True)
+    to_consolidate = [] if prepared else sorted(right, key=lambda x: x.mapping.num_rows(), reverse=True)
+    with tracer.stage("Consolidating", right_einsum, **_counts(left + to_consolidate, "in")) as event:
         lr = parallel(
             [delayed(lambda l: l.left_consolidate(live_tensors, resource2capacity, shared_tensors))(l) for l in left] + 
-            [delayed(lambda l: l.consolidate(live_tensors, resource2capacity, shared_tensors))(l) for l in right],
+            [delayed(lambda l: l.consolidate(live_tensors, resource2capacity, shared_tensors))(l) for l in to_consolidate],
             pbar=f"Consolidating {left_einsum} <--> {right_einsum}",
+            costs=[s.mapping.num_rows() for s in left + to_consolidate],
         )
-        left, right = lr[:len(left)], lr[len(left):]
-        print_time(f"Consolidating")
+        event.update(_counts(lr, "out"))
+    left = lr[:len(left)]
+    if not prepared:
+        right = lr[len(left):]
+    print_time(f"Consolidating")
 
+    with tracer.stage("Combining", right_einsum, **_counts(left + right, "in")) as event:
         left = SIM.combine_combineable(left, live_tensors | right_tensors)
-        right = SIM.combine_combineable(right, live_tensors | left_tensors)
-        print_time(f"Combining")
+        if not prepared:
+            right = SIM.combine_combineable(right, live_tensors | left_tensors)
+        event.update(_counts(left + right, "out"))
+    print_time(f"Combining")
 
-        # left = parallel([delayed(lambda l: l.left_consolidate(live_tensors, resource2capacity, shared_tensors))(l) for l in left], pbar="Left consolidate")
-        # right = parallel([delayed(lambda l: l.consolidate(live_tensors, resource2capacity, shared_tensors))(l) for l in right], pbar="Right consolidate")
+    # left = parallel([delayed(lambda l: l.left_consolidate(live_tensors, resource2capacity, shared_tensors))(l) for l in left], pbar="Left consolidate")
+    # right = parallel([delayed(lambda l: l.consolidate(live_tensors, resource2capacity, shared_tensors))(l) for l in right], pbar="Right consolidate")
 
-        # Group left and right into buckets
+    # Group left and right into buckets
+    with tracer.stage("Grouping", right_einsum, **_counts(left + right, "in")) as event:
         right = SIM.group_right(right, left_tensors)
         left = SIM.group_left(left, right_tensors)
-        print_time("Grouping")
-
-        for v in list(left.values()) + list(right.values()):
-            for s in v:
-                for t in list(s.tensors):
-                    if t not in live_tensors:
-                        del s.tensors[t]
-
-        DO_PRINT = False
-        DELAY_MERGE = not debugger_active()
-
-        combined: list[SIM] = []
+        event.update(buckets_left=len(left), buckets_right=len(right))
+    print_time("Grouping")
+
+    for v in list(left.values()) + list(right.values()):
+        for s in v:
+            for t in list(s.tensors):
+                if t not in live_tensors:
+                    del s.tensors[t]
+
+    DO_PRINT = False
+    DELAY_MERGE = not debugger_active()
+
+    # Minimum reservations of each SIM. Pairs whose merge exceeds a capacity
+    # no matter which rows are combined are skipped.
+    reservations = {}
+    if resource2capacity:
+        for k in left:
+            if k in right:
+                for s in left[k] + right[k]:
+                    if id(s) not in reservations:
+                        reservations[id(s)] = s.mapping.min_reservations()
+
+    combined: list[SIM] = []
+    n_pruned = 0
+    counts_in = {**_counts(left, "in_left"), **_counts(right, "in_right")}
+    with tracer.stage("Bucket merging", right_einsum, **counts_in) as event:
         for k in left:
             if k in right:
                 for a, b in itertools.product(left[k], right[k]):
                     a: SIM
                     b: SIM
+                    if reservations and a.merge_exceeds_capacity(
+                        b, resource2capacity, (reservations[id(a)], reservations[id(b)])
+                    ):
+                        n_pruned += 1
+                        continue
                     combined.append(a.merge_next(b, live_tensors, delay=DELAY_MERGE))
-                    combined[-1]._predicted_mappings = len(a.mapping.data) * len(b.mapping.data)
+                    combined[-1]._predicted_mappings = a.mapping.num_rows() * b.mapping.num_rows()
                     if DO_PRINT:
                         s = f"\t{a.tiling} <--> {b.tiling}"
                         s += f" --> {combined[-1].tiling}"
-                        s += f"({len(a.mapping.data)})x({len(b.mapping.data)})"
+                        s += f"({a.mapping.num_rows()})x({b.mapping.num_rows()})"
                         print(s)
             elif DO_PRINT:
                 for a in left[k]:
                     print(f"\tNo match for {a.tiling}")
+        # With delayed merging, the rows are the upper bound before Pareto
+        # filtering
+        event.update(
+            sims_out=len(combined),
+            rows_out=sum(c._predicted_mappings for c in combined),
+            pairs_over_capacity=n_pruned,
+        )
 
-        if not combined:
-            print(f'No valid combinations found.')
-
-        print_time("Bucket merging")
-        
-        if DELAY_MERGE:
-            combined = sorted(combined, key=lambda x: x._predicted_mappings, reverse=True)
+    if not combined:
+        print(f'No valid combinations found.')
+        # Nothing can be fused onto an empty left side
+        message = f"No valid combinations of {left_einsum} and {right_einsum}"
+        if n_pruned:
+            message += f": all {n_pruned} compatible pairs exceed capacity"
+        raise ValueError(message)
+
+    if n_pruned:
+        print(f"\tSkipped {n_pruned} pairs that exceed capacity")
+    print_time("Bucket merging")
+    
+    if DELAY_MERGE:
+        combined = sorted(combined, key=lambda x: x._predicted_mappings, reverse=True)
+        rows_in = sum(c._predicted_mappings for c in combined)
+        with tracer.stage("Mapping merging", right_einsum, sims_in=len(combined), rows_in=rows_in) as event:
             for c, mapping in zip(combined, parallel([c.mapping for c in combined], pbar=f'Merging mappings {left_einsum} <--> {right_einsum}')):
                 c.mapping = mapping
+            event.update(_counts(combined, "out"))
+
+    print_time("Mapping merging")
+
+    print(f"\tCombining {sum(len(s) for s in left)}({len(left)}) x {sum(len(s) for s in right)}({len(right)}) -> {len(combined)}")
+    # if DO_PRINT:
+    #     for k in right:
+    #         if k not in left:
+    #             for b in right[k]:
+    #                 print(f"\tREVERSE: No match for {b.tiling}")
+
+    print(f"\tNumber of buckets for Einsum {right_einsum}: {len(combined)}")
+    n_mappings = sum(s.mapping.num_rows() for s in combined)
+    print(f"\tNumber of mappings for Einsum {right_einsum}: {n_mappings}")
+    print(f"\tMappings per bucket for Einsum {right_einsum}: {n_mappings / len(combined)}")
+    return combined
+
+
+def _fuse_sims(
+    sims: dict[str, list[SIM]],
+    resource2capacity: dict,
+    return_nmappings_nbuckets: bool,
+    checkpoint_dir: str,
+    resume: bool,
+    lookahead: int,
+    tracer: Tracer,
+    prepare_ahead: bool,
+    epsilon: Union[float, dict[str, float]],
+):
+    nmappings = []
+    nbuckets = []
+    INTERNED_TILINGS.clear()
+    
+    sims = list(sims.items())
+
+    input_hash = None
+    if checkpoint_dir is not None:
+        input_hash = _hash_inputs(
+            sims,
+            resource2capacity,
+            dict(
+                lookahead=lookahead,
+                prepare_ahead=prepare_ahead,
+                epsilon=sorted(epsilon.items()) if isinstance(epsilon, dict) else epsilon,
+            ),
+        )
+    
+    for einsum_id, s in sims:
+        print(f'SIM {einsum_id} tensors: {s[0].tensor_names}')
+
+    if lookahead != 0:
+        all_sims = [x for _, s in sims for x in s]
+        with tracer.stage("Lookahead", **_counts(all_sims, "in")) as event:
+            sims = lookahead_filter(sims, lookahead)
+            event.update(_counts([x for _, s in sims for x in s], "out"))
+
+    init_print_time()
+    if len(sims) == 1:
+        left = copy.deepcopy(sims[0][1])
+        with tracer.stage("Consolidating", sims[0][0], **_counts(left, "in")) as event:
+            left = consolidate(
+                x=left,
+                left=True,
+                live_tensors=set(),
+                resource2capacity=resource2capacity,
+                shared_tensors=set(),
+            )
+            event.update(_counts(left, "out"))
+        sims = []
+
+    n_iterations = 0
+    total_iterations = len(sims)
+    steps = step_tensors(sims) if sims else []
+    left_einsum, left = sims.pop(0)
+
+    if resume and checkpoint_dir is not None:
+        step, state = load_checkpoint(checkpoint_dir, input_hash)
+        if state is not None:
+            print(f"Resuming from checkpoint after Einsum {state['left_einsum']}")
+            n_iterations = step
+            sims = sims[step:]
+            left_einsum, left = state["left_einsum"], state["left"]
+            nmappings, nbuckets = state["nmappings"], state["nbuckets"]
+
+    steps = steps[len(steps) - len(sims):]
+    if prepare_ahead and sims:
+        sims = _prepare_right(sims, steps, resource2capacity, tracer)
+    else:
+        sims = [(einsum_id, s, None) for einsum_id, s in sims]
 
-        print_time("Mapping merging")
+    while sims:
+        n_iterations += 1
+        nbuckets.append(len(left))
+        nmappings.append(sum(s.mapping.num_rows() for s in left))
 
-        print(f"\tCombining {sum(len(s) for s in left)}({len(left)}) x {sum(len(s) for s in right)}({len(right)}) -> {len(combined)}")
-        # if DO_PRINT:
-        #     for k in right:
-        #         if k not in left:
-        #             for b in right[k]:
-        #                 print(f"\tREVERSE: No match for {b.tiling}")
+        right_einsum, right, right_tensors = sims.pop(0)
+        live_tensors, _, _ = steps.pop(0)
+        print(f'\nEinsum {right_einsum} ({n_iterations}/{total_iterations})')
 
-        left = combined
+        left = _fuse_step(
+            left,
+            left_einsum,
+            right,
+            right_einsum,
+            live_tensors,
+            resource2capacity,
+            tracer,
+            right_tensors,
+        )
         left_einsum = right_einsum
-        print(f"\tNumber of buckets for Einsum {left_einsum}: {len(left)}")
-        n_mappings = sum(len(s.mapping.data) for s in left)
-        print(f"\tNumber of mappings for Einsum {left_einsum}: {n_mappings}")
-        print(f"\tMappings per bucket for Einsum {left_einsum}: {n_mappings / len(left)}")
-
-    for s in left:
-        s.left_consolidate(None, resource2capacity)
-    s_final = SIM.combine_combineable(left, set())[0]
+
+        if checkpoint_dir is not None:
+            with tracer.stage("Checkpointing", right_einsum):
+                save_checkpoint(
+                    checkpoint_dir,
+                    input_hash,
+                    n_iterations,
+                    dict(
+                        left_einsum=left_einsum,
+                        left=left,
+                        nmappings=nmappings,
+                        nbuckets=nbuckets,
+                    ),
+                )
+            print_time("Checkpointing")
+
+    with tracer.stage("Final consolidating", **_counts(left, "in")) as event:
+        for s in left:
+            s.left_consolidate(None, resource2capacity)
+        s_final = SIM.combine_combineable(left, set())[0]
+        event.update(_counts([s_final], "out"))
+        event["error_bound"] = s_final.mapping.error_bound
     data = s_final.mapping.data
+    data.attrs["error_bound"] = s_final.mapping.error_bound
+    if s_final.mapping.epsilon is not None:
+        print(
+            f"Final front: {len(data)} mappings, "
+            f"error bound {s_final.mapping.error_bound:.2%}"
+        )
     # check_correctness(data, set())
 
     print_total_time()
@@ -0,0 +1,347 @@
+"""
+Architecture templates for the per-Einsum mapper.
+
+A template decides how the mapspace of an Einsum is generated for a kind of
+architecture: how it is split into jobs (partial mappings) and how a job's
+partial mapping is completed into mappings down to compute. Everything else
+is shared by all templates (see mapper.template_mapper): the workload is
+parsed once, compile_mapping results are cached, results are cached per
+Einsum, jobs are estimated, budgeted and balanced across the scheduler's
+workers, and tile shapes are explored and turned into results by
+per_einsum_mapper.mapper_place_fusion_level.
+
+Templates are passed to every job, so they must be picklable and should
+only hold constraints. Anything that depends on the workload is built from
+the SharedWorkload the pipeline passes in.
+"""
+from functools import reduce
+from operator import or_
+from typing import Iterator, Optional
+
+from combinatorics.dependent_product import dependent_product
+from combinatorics.splitter import split_dependent_product
+
+from pytimeloop.fastfusion.layerdeduplication import group_similar_einsums
+from pytimeloop.fastfusion.mapper.constraints import *
+from pytimeloop.fastfusion.mapper.per_einsum_mapper import (
+    EinsumMapspace,
+    make_mac_level_loops,
+)
+from pytimeloop.fastfusion.mapper.per_einsum_subspaces.snowcat import make_subspaces
+from pytimeloop.fastfusion.mapper.per_einsum_subspaces.snowcat_ffmt import make_ffmt_subspaces
+from pytimeloop.fastfusion.mapper.per_einsum_subspaces.subspaces import (
+    LinearMapping,
+    make_spatial_fors,
+    make_storage,
+    make_temporal_fors,
+)
+from pytimeloop.fastfusion.scheduler import CHUNKS_PER_WORKER, get_default_scheduler
+
+
+class ArchitectureTemplate:
+    # Passed to process_result as explore_fusion_uneven
+    explore_fusion_uneven: bool = False
+
+    def prepare(self, shared, spec):
+        """Called once in the main process before any other method."""
+
+    def group_einsums(self, shared) -> dict:
+        """
+        Returns {reference Einsum: {other Einsum: (rank renaming, tensor
+        renaming)}}. Only reference Einsums are mapped.
+        """
+        return group_similar_einsums(shared.workload, shared.analyzer)
+
+    def partial_mappings(self, shared, einsum_id, logfunc=None) -> list:
+        """One partial mapping per job. Runs in the main process."""
+        raise NotImplementedError
+
+    def mappings(self, shared, einsum_id, partial_mapping) -> Iterator:
+        """
+        Yields the mappings (down to compute) of a job. Their tile shapes
+        are explored by the pipeline.
+        """
+        raise NotImplementedError
+
+    def process_result_args(self) -> dict:
+        """Extra keyword arguments of process_result."""
+        return {}
+
+    def cache_context(self, shared, einsum_id, form) -> Optional[tuple]:
+        """
+        Everything about this template that the results of an Einsum depend
+        on, with ranks and tensors named by their index in the canonical
+        form. None if the results can not be cached.
+        """
+        return None
+
+
+class FourLevelTemplate(ArchitectureTemplate):
+    """
+    Off-chip memory, global buffer, PE array and MAC array. Jobs are the
+    off-chip storage, GLB loops and storage, and PE spatial loops; a job
+    explores PE temporal loops and storage below its partial mapping.
+    """
+    def __init__(
+        self,
+        pe_array_constraint: PeArrayConstraint,
+        mac_array_constraint: MacArrayConstraint,
+        explore_glb_uneven,
+        explore_pe_uneven,
+    ):
+        self.pe_array_constraint = pe_array_constraint
+        self.mac_array_constraint = mac_array_constraint
+        self.explore_fusion_uneven = explore_glb_uneven
+        self.explore_pe_uneven = explore_pe_uneven
+
+    def partial_mappings(self, shared, einsum_id, logfunc=None):
+        if logfunc is None:
+            logfunc = lambda msg: None  # do nothing
+        mapspace = EinsumMapspace(shared, einsum_id)
+        tensors = mapspace.tensors
+        intermediate_tensors = mapspace.intermediate_tensors
+        tensor_to_relevant_ranks = mapspace.tensor_to_relevant_ranks
+
+        top_level_ranks = reduce(
+            or_, (tensor_to_relevant_ranks[t] for t in intermediate_tensors), set()
+        )
+
+        mapping = LinearMapping()
+        logfunc(f"Allowed top-level loop ranks: {top_level_ranks}")
+
+        partial_mappings = []
+        off_chip_must_retain = tensors - intermediate_tensors
+        off_chip_can_retain = intermediate_tensors
+        for partial_mapping in make_storage(  # Off-chip level
+            mapping,
+            level=0,
+            must_retain_tensors=off_chip_must_retain,
+            can_retain_tensors=off_chip_can_retain,
+            tensor_to_relevant_ranks=tensor_to_relevant_ranks,
+            explore_uneven=False,
+            add_split_at_tensors=intermediate_tensors,
+        ):
+            for partial_mapping in make_temporal_fors(  # GLB temporal
+                partial_mapping,
+                top_level_ranks,
+            ):
+                glb_must_retain = set(intermediate_tensors)
+                glb_can_retain = set()
+                for partial_mapping in make_storage(  # GLB level
+                    partial_mapping,
+                    level=1,
+                    must_retain_tensors=glb_must_retain,
+                    can_retain_tensors=glb_can_retain,
+                    must_fully_reuse_tensors=set(intermediate_tensors),
+                    tensor_to_relevant_ranks=tensor_to_relevant_ranks,
+                    explore_uneven=self.explore_fusion_uneven,
+                    add_split_at_tensors=intermediate_tensors,
+                    must_have_terminal_storage=True,  # GLB only opt.
+                    logfunc=None
+                ):
+                    for partial_mapping in make_spatial_fors(  # PE spatial
+                        partial_mapping,
+                        mapspace.all_ranks,
+                        max_factor=self.pe_array_constraint.array_shape
+                    ):
+                        partial_mappings.append(partial_mapping)
+        return partial_mappings
+
+    def mappings(self, shared, einsum_id, partial_mapping):
+        mapspace = EinsumMapspace(shared, einsum_id)
+        tensors = mapspace.tensors
+        tensor_to_relevant_ranks = mapspace.tensor_to_relevant_ranks
+
+        mac_array_constraint = self.mac_array_constraint
+        einsum_name = shared.einsum_id_to_name[einsum_id]
+        rank_name_to_id = shared.rank_name_to_id
+        mac_parallel_rank_id = rank_name_to_id[mac_array_constraint.parallel_rank[einsum_name]]
+        mac_reduced_rank_id = rank_name_to_id[mac_array_constraint.reduced_rank[einsum_name]]
+        weight_tensor_name = mac_array_constraint.weight_tensor[einsum_name]
+        weight_tensor_id = shared.tensor_name_to_id[weight_tensor_name]
+        weight_ranks = tensor_to_relevant_ranks[weight_tensor_id]
+        other_weight_ranks = weight_ranks - {mac_parallel_rank_id, mac_reduced_rank_id}
+        non_weight_ranks = set(mapspace.all_ranks) - weight_ranks
+
+        for partial_mapping in make_temporal_fors(  # PE temporal
+            partial_mapping, mapspace.all_ranks
+        ):
+            # No bypassing at PE level. Can relax to explore more mappings
+            pe_must_retain = tensors
+            pe_can_retain = set()
+            for partial_mapping in make_storage(  # PE storage
+                partial_mapping,
+                level=2,  # PE level
+                must_retain_tensors=pe_must_retain,
+                can_retain_tensors=pe_can_retain,
+                tensor_to_relevant_ranks=tensor_to_relevant_ranks,
+                explore_uneven=self.explore_pe_uneven,
+            ):
+                found_storages = set()
+                fail = False
+                for i, p in enumerate(partial_mapping):
+                    if p["type"] == "storage":
+                        for t in set(p["dspace"]) - found_storages:
+                            for p2 in partial_mapping[:i]:
+                                if p2["type"] in ["temporal", "spatial"] and p2["rank"] not in tensor_to_relevant_ranks[t]:
+                                    fail = True
+                                    break
+                        found_storages |= set(p["dspace"])
+                    if len(found_storages) < len(tensors) or i == 0:
+                        continue
+                    prev = partial_mapping[i - 1]
+                    for t in ["spatial"]: # "temporal", TEMPORAL DOESN"T WORK. WEIRD INTERACTIONS WITH LOOP RELEVANCE PRINCIPLE
+                        if p["type"] == t and prev["type"] == t and p["rank"] < prev["rank"]:
+                            fail = True
+                            # print(f'Skipping partial mapping: {partial_mapping}')
+                if fail:
+                    continue
+                yield from make_mac_level_loops(
+                    partial_mapping,
+                    einsum_id,
+                    mac_parallel_rank_id,
+                    mac_array_constraint.array_shape_in_parallel_dimension,
+                    mac_reduced_rank_id,
+                    mac_array_constraint.array_shape_in_reduced_dimension,
+                    non_weight_ranks,
+                    other_weight_ranks,
+                )
+
+    def cache_context(self, shared, einsum_id, form):
+        # The MAC array constraints name this Einsum's tensors and ranks
+        einsum_name = shared.einsum_id_to_name[einsum_id]
+        mac_array_constraint = self.mac_array_constraint
+        weight = shared.tensor_name_to_id[mac_array_constraint.weight_tensor[einsum_name]]
+        parallel_rank = shared.rank_name_to_id[mac_array_constraint.parallel_rank[einsum_name]]
+        reduced_rank = shared.rank_name_to_id[mac_array_constraint.reduced_rank[einsum_name]]
+        return (
+            type(self).__name__,
+            form.tensors.index(weight),
+            form.ranks.index(parallel_rank),
+            form.ranks.index(reduced_rank),
+            mac_array_constraint.array_shape_in_parallel_dimension,
+            mac_array_constraint.array_shape_in_reduced_dimension,
+            self.pe_array_constraint.array_shape,
+            self.explore_fusion_uneven,
+            self.explore_pe_uneven,
+        )
+
+
+class SnowcatTemplate(ArchitectureTemplate):
+    """
+    Off-chip memory and a global buffer above the MACs. The mapspace is the
+    dependent product of the Snowcat (or FFMT) subspaces, split into at
+    least n_split_min jobs. n_split_min defaults to CHUNKS_PER_WORKER jobs
+    for every worker of the default scheduler.
+    """
+    def __init__(
+        self,
+        explore_glb_uneven,
+        ffmt: bool=False,
+        ffmt_refetch_weights: bool=True,
+        tag_with: tuple[callable] = (),
+        n_split_min: int=None,
+    ):
+        self.explore_fusion_uneven = explore_glb_uneven
+        self.ffmt = ffmt
+        self.ffmt_refetch_weights = ffmt_refetch_weights
+        self.tag_with = tag_with
+        self.n_split_min = n_split_min
+        self.dataflow_constraint = None
+
+    def prepare(self, shared, spec):
+        if "mapping_constraints" in spec:
+            self.dataflow_constraint = DataflowConstraint.parse(
+                spec["mapping_constraints"],
+                shared.workload
+            )
+        else:
+            self.dataflow_constraint = DataflowConstraint.default(shared.workload)
+        if self.n_split_min is None:
+            self.n_split_min = get_default_scheduler().effective_n_workers() * CHUNKS_PER_WORKER
+
+    def group_einsums(self, shared):
+        if self.tag_with:
+            return {einsum: {} for einsum in shared.einsum_id_to_name}
+        separated_einsums = None
+        if self.ffmt:
+            separated_einsums = get_ffmt_separated_einsums(shared.workload)
+        return detect_similar_einsums(shared.workload, shared.analyzer, separated_einsums)
+
+    def _split_subspaces(self, shared, einsum_id):
+        mapspace = EinsumMapspace(shared, einsum_id)
+        if not self.ffmt:
+            subspaces = make_subspaces(mapspace.tensors,
+                                       mapspace.intermediate_tensors,
+                                       mapspace.tensor_to_relevant_ranks,
+                                       einsum_id,
+                                       shared.workload,
+                                       self.dataflow_constraint[einsum_id])
+        else:
+            subspaces = make_ffmt_subspaces(mapspace.tensors,
+                                            mapspace.intermediate_tensors,
+                                            mapspace.tensor_to_relevant_ranks,
+                                            einsum_id,
+                                            shared.workload,
+                                            refetch_weights=self.ffmt_refetch_weights)
+        return split_dependent_product(n_split_min=self.n_split_min, spaces=subspaces)
+
+    def partial_mappings(self, shared, einsum_id, logfunc=None):
+        parallelized_spaces, _ = self._split_subspaces(shared, einsum_id)
+        partial_mappings = list(dependent_product(parallelized_spaces))
+        return [x if isinstance(x, tuple) else (x,) for x in partial_mappings]
+
+    def mappings(self, shared, einsum_id, partial_mapping):
+        # The split is deterministic, so every job sees the same task spaces
+        _, task_spaces = self._split_subspaces(shared, einsum_id)
+        task_spaces = list(task_spaces)
+        first_space = task_spaces[0]
+        task_spaces[0] = lambda: first_space(*partial_mapping)
+        yield from dependent_product(task_spaces)
+
+    def process_result_args(self):
+        return dict(tag_with=self.tag_with)
+
+    def cache_context(self, shared, einsum_id, form):
+        # Tags are arbitrary functions and FFMT subspaces depend on where the
+        # Einsum is in the workload
+        if self.tag_with or self.ffmt:
+            return None
+        dataflow_constraint = [
+            form.ranks.index(c) if isinstance(c, int) else c
+            for c in self.dataflow_constraint[einsum_id]
+        ]
+        return (type(self).__name__, dataflow_constraint, self.explore_fusion_uneven)
+
+
+def detect_similar_einsums(workload, analyzer, separated_einsums=None):
+    if separated_einsums is None:
+        separated_einsums = [{i for i in workload.einsum_id_to_name()}]
+
+    total_ref_to_einsums = {}
+    for einsum_group in separated_einsums:
+        total_ref_to_einsums.update(
+            group_similar_einsums(workload, analyzer, einsum_group)
+        )
+    return total_ref_to_einsums
+
+
+def get_ffmt_separated_einsums(workload):
+    einsum_id_to_name = workload.einsum_id_to_name()
+    if len(einsum_id_to_name) == 1:
+        return [{0}]
+    elif len(einsum_id_to_name) == 2:
+        return [{0}, {1}]
+    elif len(einsum_id_to_name) == 3:
+        return [{0}, {1}, {2}]
+
+    first_einsum = {0}
+    second_einsum = {1}
+    last_einsum = {max(workload.einsum_id_to_name().keys())}
+    other_einsums = (
+        set(workload.einsum_id_to_name().keys())
+        - first_einsum
+        - second_einsum
+        - last_einsum
+    )
+    return [first_einsum, second_einsum, other_einsums, last_einsum]
@@ -1,21 +1,22 @@
 from collections import defaultdict
+from collections.abc import MutableMapping
 import copy
 import itertools
 import re
 
-# Disable numba. We need user_has_package("numba") to be False
-import sys
 from typing import Optional, Tuple, Union
 
 from joblib import delayed
 
+from pytimeloop.fastfusion.skyline import (
+    pareto_indices,
+    pareto_mask,
+    epsilon_pareto_mask,
+)
+from pytimeloop.fastfusion.spill import estimate_nbytes, get_spill_store
 from pytimeloop.fastfusion.util import fzs
 
-sys.modules["numba"] = None
-
-
-from paretoset import paretoset
-
+import numpy as np
 import pandas as pd
 import functools
 
@@ -27,9 +28,21 @@ TENSORS = "__TENSORS"
 IN_PROGRESS_STATS = "__IN_PROGRESS_STATS"
 MAPPING_HASH = "__MAPPING_HASH"
 TAGS = "__TAGS"
+LEFT_ROW = "__LEFT_ROW"
+RIGHT_ROW = "__RIGHT_ROW"
 
 RESERVED_COLUMNS = set(
-    [LOGSTRING, MAPPING, STATS, TENSORS, IN_PROGRESS_STATS, MAPPING_HASH, TAGS]
+    [
+        LOGSTRING,
+        MAPPING,
+        STATS,
+        TENSORS,
+        IN_PROGRESS_STATS,
+        MAPPING_HASH,
+        TAGS,
+        LEFT_ROW,
+        RIGHT_ROW,
+    ]
 )
 DICT_COLUMNS = set(
     [LOGSTRING, MAPPING, STATS, TENSORS, IN_PROGRESS_STATS, MAPPING_HASH, TAGS]
@@ -38,6 +51,63 @@ DICT_COLUMNS = set(
 _resource_name_nloops_reg = re.compile(r"RESOURCE_(.+?)(?:_LEFT)?_LEVEL_(-?\d+)")
 
 
+class MergedDict(MutableMapping):
+    """
+    Union of two dicts where the right one's entries take precedence, like
+    {**left, **right}. Merged Pareto rows hold a pair of parent references
+    instead of a copy of both parents' entries, so merging costs the same no
+    matter how large the mappings are. The union is built on first access,
+    after which the parents are released. Pickles hold the union, so that
+    long merge chains don't recurse when rows are sent to workers.
+    """
+
+    __slots__ = ("_parents", "_dict")
+
+    def __init__(self, left: MutableMapping, right: MutableMapping):
+        self._parents = (left, right)
+        self._dict = None
+
+    def materialize(self) -> dict:
+        if self._dict is not None:
+            return self._dict
+        # Walk the tree of unmaterialized parents left to right and apply the
+        # leaves in order. Iterative so that long merge chains don't recurse.
+        d = {}
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, MergedDict) and node._dict is None:
+                stack.extend(reversed(node._parents))
+            else:
+                d.update(node)
+        self._dict, self._parents = d, None
+        return d
+
+    def __getstate__(self):
+        return self.materialize()
+
+    def __setstate__(self, state: dict):
+        self._parents, self._dict = None, state
+
+    def __getitem__(self, key):
+        return self.materialize()[key]
+
+    def __setitem__(self, key, value):
+        self.materialize()[key] = value
+
+    def __delitem__(self, key):
+        del self.materialize()[key]
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+
 def dict_cached(func):
     cache = {}
 
@@ -74,6 +144,11 @@ def is_left_col(x):
 
 MERGE_SUFFIXES = ["_LEFT_MERGE", "_RIGHT_MERGE"]
 
+# Cross products with more rows than this are merged tile by tile, keeping a
+# running Pareto front, so that peak memory is bounded by the front plus one
+# tile.
+MERGE_BLOCK_ROWS = 1 << 18
+
 
 def is_merge_col(c):
     return any(c.endswith(s) for s in MERGE_SUFFIXES)
@@ -81,16 +156,16 @@ def is_merge_col(c):
 
 def add_to_col(df, target, source):
     if target in df:
-        df.loc[:, target] = df[target] + df[source]
+        df[target] = df[target].to_numpy() + df[source].to_numpy()
     else:
-        df.loc[:, target] = df[source]
+        df[target] = df[source].to_numpy()
 
 
 def max_to_col(df, target, source):
     if target in df:
-        df.loc[:, target] = df[[target, source]].max(axis=1)
+        df[target] = np.maximum(df[target].to_numpy(), df[source].to_numpy())
     else:
-        df.loc[:, target] = df[source]
+        df[target] = df[source].to_numpy()
 
 
 # Above index 0: Freed when Einsum fully terminates
@@ -103,33 +178,139 @@ def max_to_col(df, target, source):
 # Shared index 0: Sum 0 resources, max everyone below
 
 
+def merged_min_reservations(
+    left: dict[str, float], right: dict[str, float], shared_loop_index: int
+) -> dict[tuple[str, int], float]:
+    """
+    Lower bound on each (resource, level) reservation of every row of
+    merge_cross(left, right, shared_loop_index), given the Pareto.min_reservations
+    of each side. Reservations at or above the shared loop are summed and ones
+    below are maxed. Later allocation and freeing only add to reservations, so
+    every row of the merge eventually has its bound checked against capacity.
+    """
+    bounds = {}
+    for mins in (left, right):
+        for c, v in mins.items():
+            if is_left_col(c):
+                continue
+            key = col2nameloop(c)
+            if key[1] <= shared_loop_index:
+                bounds[key] = bounds.get(key, 0) + v
+            else:
+                bounds[key] = max(bounds.get(key, 0), v)
+    return bounds
+
+
+def exceeds_capacity(
+    reservations: dict[tuple[str, int], float],
+    resource2capacity: Optional[dict[str, Optional[int]]],
+) -> bool:
+    if resource2capacity is None:
+        return False
+    for (name, _), v in reservations.items():
+        capacity = resource2capacity.get(name, None)
+        if capacity is not None and v > capacity:
+            return True
+    return False
+
+
+def _epsilons(columns: list[str], epsilon: Union[float, dict[str, float]]) -> np.ndarray:
+    # A single epsilon applies to all non-resource objectives. Resource
+    # columns are kept exact by default so that capacity checks stay exact.
+    if isinstance(epsilon, dict):
+        return np.array([epsilon.get(c, 0) for c in columns], dtype=np.float64)
+    return np.array(
+        [epsilon if col2nameloop(c) is None else 0 for c in columns],
+        dtype=np.float64,
+    )
+
+
 def makepareto(
     data: pd.DataFrame,
     reverse_free: bool = True,
-) -> pd.DataFrame:
-    # Drop any columns that are all zeros or all equal
-    columns = [c for c in data.columns if c not in RESERVED_COLUMNS and not is_merge_col(c)]
-    for c in list(columns):
-        if not data[c].any():
-            data = data.drop(columns=[c])
-            columns.remove(c)
-        elif data[c].nunique() == 1:
-            columns.remove(c)
+    epsilon: Union[float, dict[str, float]] = None,
+    return_error: bool = False,
+) -> Union[pd.DataFrame, Tuple[pd.DataFrame, float]]:
+    """
+    If epsilon is given, keeps an epsilon-Pareto front (see
+    skyline.epsilon_pareto_mask) instead of the exact front. epsilon is a
+    relative tolerance for all non-resource objectives, or a dict of
+    per-column tolerances. With return_error, also returns the relative error
+    this adds: 0 if the exact front was kept, else the largest tolerance.
+    """
+    columns, dropcols = _objectives(data)
+    if dropcols:
+        data = data.drop(columns=dropcols)
 
     if len(data) == 1:
-        return data
+        return (data, 0.0) if return_error else data
 
     if reverse_free:
-        df2 = _reverse_free(data[columns].copy())
-        return data[paretoset(df2)].reset_index(drop=True)
-
-    return data[paretoset(data[columns])].reset_index(drop=True)
+        columns = _reverse_free(columns)
+    costs = _costs(columns, len(data))
 
-def _reverse_free(data: pd.DataFrame) -> pd.DataFrame:
+    error = 0.0
+    if epsilon is None:
+        keep = pareto_indices(costs)
+    else:
+        exact = pareto_mask(costs)
+        epsilons = _epsilons(list(columns), epsilon)
+        keep = np.flatnonzero(epsilon_pareto_mask(costs, epsilons, exact))
+        if len(keep) < np.count_nonzero(exact):
+            error = float(epsilons.max())
+    data = data.iloc[keep].reset_index(drop=True)
+    return (data, error) if return_error else data
+
+def _objectives(data: pd.DataFrame) -> Tuple[dict[str, np.ndarray], list[str]]:
+    """
+    Pulls the objectives out as NumPy columns. Returns them and the columns
+    that are all zeros, which can be dropped. Columns that are all equal are
+    ignored.
+    """
+    columns = {}
+    dropcols = []
+    for c in data.columns:
+        if c in RESERVED_COLUMNS or is_merge_col(c):
+            continue
+        values = data[c].to_numpy()
+        if not values.any():
+            dropcols.append(c)
+        elif not (values == values[0]).all():
+            columns[c] = values
+    return columns, dropcols
+
+
+def _costs(columns: dict[str, np.ndarray], n_rows: int) -> np.ndarray:
+    if columns:
+        return np.column_stack(list(columns.values()))
+    return np.zeros((n_rows, 0))
+
+
+def pareto_rows(rows: list[dict], reverse_free: bool = True) -> list[dict]:
+    """
+    The rows (dicts with the same keys, e.g., results of process_result) on
+    the Pareto front, as makepareto would keep them. Rows are not copied.
+    """
+    if len(rows) <= 1:
+        return rows
+    columns, _ = _objectives(pd.DataFrame(rows))
+    if reverse_free:
+        columns = _reverse_free(columns)
+    return [rows[i] for i in pareto_indices(_costs(columns, len(rows)))]
+
+
+def _reverse_free(columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    Converts per-level resource usage into cumulative usage (each level
+    includes everything stored above it) for Pareto comparison. Takes and
+    returns a dict of column name to values and does not modify the input
+    arrays.
+    """
+    columns = dict(columns)
     resource_name_to_max_level = defaultdict(int)
     resource_name_to_min_level = defaultdict(int)
-    keep_columns = [c for c in data.columns if col2nameloop(c) is None and c not in RESERVED_COLUMNS]
-    for c in data.columns:
+    keep_columns = [c for c in columns if col2nameloop(c) is None and c not in RESERVED_COLUMNS]
+    for c in columns:
         if (name_nloops := col2nameloop(c)) is not None:
             if is_left_col(c):
                 keep_columns.append(c)
@@ -148,22 +329,24 @@ def _reverse_free(data: pd.DataFrame) -> pd.DataFrame:
             target = nameloop2col(name, i)
             next_target = nameloop2col(name, i + 1)
             next_target_left = nameloop2col(name, i + 1, left=True)
-                
-            if next_target_left in data:
-                add_to_col(data, next_target_left, target)
 
-            if next_target in data:
-                add_to_col(data, next_target, target)
+            if next_target_left in columns:
+                columns[next_target_left] = columns[next_target_left] + columns[target]
+
+            if next_target in columns:
+                columns[next_target] = columns[next_target] + columns[target]
                 keep_columns.append(target)
             else:
-                data.rename(columns={target: next_target}, inplace=True)
+                columns[next_target] = columns.pop(target)
+
+            if next_target_left in columns:
+                columns[next_target_left] = np.maximum(
+                    columns[next_target_left], columns[next_target]
+                )
 
-            if next_target_left in data:
-                max_to_col(data, next_target_left, next_target)
-                
         keep_columns.append(nameloop2col(name, max_level))
 
-    return data[keep_columns]
+    return {c: columns[c] for c in keep_columns}
 
 
 def squish_left_right(data: pd.DataFrame, shared_loop_index: int = None, return_changed: bool = False) -> Union[pd.DataFrame, Tuple[pd.DataFrame, bool]]:
@@ -237,7 +420,7 @@ def _free_to_loop_index(
 
 
 def paretofy_by(data: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
-    return data[paretoset(data[columns])].reset_index(drop=True)
+    return data.iloc[pareto_indices(data[columns].to_numpy())].reset_index(drop=True)
 
 def draw_looptree(row: pd.DataFrame, live_tensors: set[int]):
     from pytimeloop.fastfusion.plot.looptree import tilings2looptree
@@ -294,12 +477,10 @@ def check_correctness(data: pd.DataFrame, live_tensors: set[int]):
                     f"Mismatched {k}: {v} != {r[col]}. Expected {reservations}. Got: {got}"
                 )
 
-def merge_cross(
+def _merge_cross_columns(
     left: pd.DataFrame,
     right: pd.DataFrame,
     shared_loop_index: int,
-    live_tensors: set[int],
-    as_pareto: bool = False,
 ) -> pd.DataFrame:
     for c in left.columns:
         if (name_nloops := col2nameloop(c)) is not None:
@@ -370,20 +551,142 @@ def merge_cross(
     #         if capacity is not None:
     #             df = df[df[colname] <= capacity]
     #         del df[colname]
-    CHECK_CORRECTNESS = 0
-    
     df.drop(columns=dropcols, inplace=True)
-    if not CHECK_CORRECTNESS:
-        cols = [c for c in df.columns if c in RESERVED_COLUMNS or not is_merge_col(c)]
-        df = makepareto(df)
+    return df
+
+
+def _objective_costs(datas: list[pd.DataFrame]) -> list[np.ndarray]:
+    """
+    Pareto objectives of each DataFrame, as in makepareto, over a common set
+    of columns. Columns missing from a DataFrame are treated as zero.
+    """
+    columns = []
+    for data in datas:
+        for c in data.columns:
+            if c not in RESERVED_COLUMNS and not is_merge_col(c) and c not in columns:
+                columns.append(c)
+    costs = []
+    for data in datas:
+        values = {
+            c: data[c].to_numpy() if c in data else np.zeros(len(data))
+            for c in columns
+        }
+        values = _reverse_free(values)
+        costs.append(np.column_stack(list(values.values())) if values else np.zeros((len(data), 0)))
+    return costs
+
+
+def _merge_cross_blocked(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    shared_loop_index: int,
+) -> pd.DataFrame:
+    """
+    Equivalent to makepareto(_merge_cross_columns(left, right, ...)), but walks
+    the cross product in tiles of at most MERGE_BLOCK_ROWS rows while keeping a
+    running Pareto front. Dict columns are carried as row references and only
+    looked up for the rows on the final front. A tile is skipped if some row
+    of the front strictly dominates the best case of every objective in the
+    tile, which is found by merging the per-column minimums of both sides.
+    Merging only sums and maxes columns, so this best case is a lower bound.
+    """
+    for c in left.columns:
+        if col2nameloop(c) is not None and c not in right.columns:
+            right[c] = 0
+
+    dict_columns = [k for k in DICT_COLUMNS if k in left.columns or k in right.columns]
+    l = left.drop(columns=[k for k in dict_columns if k in left.columns])
+    r = right.drop(columns=[k for k in dict_columns if k in right.columns])
+    l[LEFT_ROW] = np.arange(len(l))
+    r[RIGHT_ROW] = np.arange(len(r))
+    # Visit the cheapest rows first so that the front fills with good rows
+    # early and more tiles can be skipped.
+    l, r = (
+        d.iloc[np.argsort(_objective_costs([d])[0].sum(axis=1), kind="stable")]
+        for d in (l, r)
+    )
+
+    right_block = min(len(r), MERGE_BLOCK_ROWS)
+    left_block = max(1, MERGE_BLOCK_ROWS // right_block)
+
+    def minimums(data: pd.DataFrame) -> pd.DataFrame:
+        return data.min().to_frame().T.infer_objects()
+
+    front, columns, dtypes = None, None, None
+    for ls in range(0, len(l), left_block):
+        lt = l.iloc[ls : ls + left_block]
+        lt_min = minimums(lt)
+        for rs in range(0, len(r), right_block):
+            rt = r.iloc[rs : rs + right_block]
+            if front is not None and len(front) > 0:
+                bound = _merge_cross_columns(lt_min, minimums(rt), shared_loop_index)
+                front_costs, bound_costs = _objective_costs([front, bound])
+                bound_costs = bound_costs[0]
+                if (
+                    (front_costs <= bound_costs).all(axis=1)
+                    & (front_costs < bound_costs).any(axis=1)
+                ).any():
+                    continue
+
+            tile = _merge_cross_columns(lt, rt, shared_loop_index)
+            if columns is None:
+                columns, dtypes = list(tile.columns), tile.dtypes
+            if front is not None:
+                tile = pd.concat([front, tile]).fillna(0)
+            # Keep rows in cross-product order so that makepareto keeps the
+            # same one of several equal rows as the unblocked merge.
+            front = makepareto(tile.sort_values([LEFT_ROW, RIGHT_ROW]))
+
+    front = front[[c for c in columns if c in front.columns]]
+    front = front.astype({c: dtypes[c] for c in front.columns})
+    left_rows, right_rows = front[LEFT_ROW].to_numpy(), front[RIGHT_ROW].to_numpy()
+    for k in dict_columns:
+        if k in left.columns and k in right.columns:
+            front[k + MERGE_SUFFIXES[0]] = left[k].to_numpy()[left_rows]
+            front[k + MERGE_SUFFIXES[1]] = right[k].to_numpy()[right_rows]
+        elif k in left.columns:
+            front[k] = left[k].to_numpy()[left_rows]
+        else:
+            front[k] = right[k].to_numpy()[right_rows]
+    return front.drop(columns=[LEFT_ROW, RIGHT_ROW]).reset_index(drop=True)
+
+
+def merge_cross(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    shared_loop_index: int,
+    live_tensors: set[int],
+    as_pareto: bool = False,
+    epsilon: Union[float, dict[str, float]] = None,
+    error_bound: float = 0.0,
+) -> pd.DataFrame:
+    """
+    With epsilon, the merged front is an epsilon-Pareto front (see
+    makepareto). error_bound is the larger error bound of the two inputs;
+    merged objectives are sums and maxes, so the inputs' errors carry over
+    unchanged and only the filtering here adds to them.
+    """
+    CHECK_CORRECTNESS = 0
+
+    step_error = 0.0
+    if CHECK_CORRECTNESS:
+        df = _merge_cross_columns(left, right, shared_loop_index)
+    elif len(left) * len(right) > MERGE_BLOCK_ROWS:
+        df = _merge_cross_blocked(left, right, shared_loop_index)
+        if epsilon is not None:
+            df, step_error = makepareto(df, epsilon=epsilon, return_error=True)
+    else:
+        df, step_error = makepareto(
+            _merge_cross_columns(left, right, shared_loop_index),
+            epsilon=epsilon,
+            return_error=True,
+        )
 
     for k in DICT_COLUMNS:
         if k not in left.columns:
             continue
         c0, c1 = k + MERGE_SUFFIXES[0], k + MERGE_SUFFIXES[1]
-        df[k] = (
-            df.apply(lambda row: {**row[c0], **row[c1]}, axis=1) if len(df) > 0 else []
-        )
+        df[k] = [MergedDict(a, b) for a, b in zip(df[c0].to_numpy(), df[c1].to_numpy())]
     df = df[[c for c in df.columns if not is_merge_col(c)]]
 
     cols = [c for c in df.columns if c not in DICT_COLUMNS]
@@ -392,8 +695,11 @@ def merge_cross(
         first_row = df.iloc[0]
         einsums = list(first_row[IN_PROGRESS_STATS].keys())
         last = einsums[-1]
-        for i, r in df[cols].iterrows():
-            df.at[i, IN_PROGRESS_STATS][last] = r.to_dict()
+        # Layered on top so that the rows' stats stay unmaterialized
+        df[IN_PROGRESS_STATS] = [
+            MergedDict(stats, {last: r})
+            for stats, r in zip(df[IN_PROGRESS_STATS], df[cols].to_dict("records"))
+        ]
 
     if CHECK_CORRECTNESS:
         check_correctness(df, live_tensors)
@@ -402,12 +708,95 @@ def merge_cross(
     # Assert no NaNs
     assert not df.isnull().values.any()
 
-    return Pareto(df, skip_pareto=True) if as_pareto else df
+    if not as_pareto:
+        return df
+    return Pareto(
+        df,
+        skip_pareto=True,
+        epsilon=epsilon,
+        error_bound=compose_error(error_bound, step_error),
+    )
+
+
+def compose_error(*errors: float) -> float:
+    """Relative error of applying several relative errors in sequence."""
+    return float(np.prod([1 + e for e in errors]) - 1)
 
 
 class Pareto:
-    def __init__(self, data: pd.DataFrame, skip_pareto: bool = False):
-        self.data: pd.DataFrame = data if skip_pareto else makepareto(data)
+    """
+    epsilon: If given, this Pareto and all Paretos derived from it keep
+        epsilon-Pareto fronts (see makepareto) instead of exact fronts.
+    error_bound: Relative error bound of the front: every point of the exact
+        front is within a factor (1 + error_bound) on each objective of some
+        point of this front.
+    """
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        skip_pareto: bool = False,
+        epsilon: Union[float, dict[str, float]] = None,
+        error_bound: float = 0.0,
+    ):
+        self._data = None
+        self._path = None
+        self._path_finalizer = None
+        self._store = None
+        self._n_rows = 0
+        self.epsilon = epsilon
+        self.error_bound = error_bound
+        self.data = data
+        if not skip_pareto:
+            self.make_pareto()
+
+    # If a SpillStore is active (see spill.py), the data may live on disk and
+    # is loaded on access.
+    @property
+    def data(self) -> pd.DataFrame:
+        if self._store is not None:
+            if self._path is not None:
+                self._data = self._store.load(self)
+            self._store.touch(self)
+        return self._data
+
+    @data.setter
+    def data(self, data: pd.DataFrame):
+        if self._path is not None:
+            self._store.discard(self)
+        self._data = data
+        self._store = get_spill_store()
+        if self._store is not None:
+            self._store.touch(self, estimate_nbytes(data))
+
+    def num_rows(self) -> int:
+        """Number of rows, without loading spilled data."""
+        return self._n_rows if self._path is not None else len(self._data)
+
+    def __getstate__(self):
+        return {
+            "_data": self.data,
+            "epsilon": self.epsilon,
+            "error_bound": self.error_bound,
+        }
+
+    def __setstate__(self, state):
+        # Results returned from workers join the active store, if any
+        self._data = None
+        self._path = None
+        self._path_finalizer = None
+        self._store = None
+        self._n_rows = 0
+        self.epsilon = state.get("epsilon", None)
+        self.error_bound = state.get("error_bound", 0.0)
+        self.data = state["_data"]
+
+    def min_reservations(self) -> dict[str, float]:
+        """Minimum of each resource column over all rows."""
+        data = self.data
+        if len(data) == 0:
+            return {}
+        return {c: data[c].min() for c in data.columns if col2nameloop(c) is not None}
 
     def einsum_ids(self):
         return fzs(self.data[LOGSTRING].iloc[0].keys())
@@ -417,6 +806,8 @@ class Pareto:
         return Pareto(
             pd.concat([p.data for p in paretos]).fillna(0),
             skip_pareto=len(paretos) == 1 or skip_pareto,
+            epsilon=paretos[0].epsilon,
+            error_bound=max(p.error_bound for p in paretos),
         )
 
     def merge_next(
@@ -432,6 +823,8 @@ class Pareto:
             shared_loop_index,
             live_tensors=live_tensors,
             as_pareto=True,
+            epsilon=self.epsilon,
+            error_bound=max(self.error_bound, other.error_bound),
         )
         return d if delay else d[0](*d[1], **d[2])
 
@@ -447,7 +840,8 @@ class Pareto:
     ) -> bool:
         self.data, changed = _free_to_loop_index(self.data, n, return_changed=True)
         if resource2capacity is not None:
-            changed = changed or self.limit_capacity(n, resource2capacity)
+            # Always check capacity, even if freeing already changed the data
+            changed = self.limit_capacity(n, resource2capacity) or changed
         return changed
 
     def alloc(self, resource_name: str, size: int, above_loop_index: int, resource2capacity: dict[str, Optional[int]]):
@@ -469,7 +863,7 @@ class Pareto:
                 t[last_einsum].append(tensor)
 
     def copy(self) -> "Pareto":
-        return Pareto(self.data.copy())
+        return Pareto(self.data.copy(), epsilon=self.epsilon, error_bound=self.error_bound)
 
     def limit_capacity(self, n: int, resource2capacity: dict[str, Optional[int]]) -> bool:
         changed = False
@@ -501,7 +895,11 @@ class Pareto:
         return self
 
     def make_pareto(self):
-        self.data = makepareto(self.data)
+        if self.epsilon is None:
+            self.data = makepareto(self.data)
+            return
+        self.data, error = makepareto(self.data, epsilon=self.epsilon, return_error=True)
+        self.error_bound = compose_error(self.error_bound, error)
 
 
 import unittest
@@ -628,6 +1026,77 @@ class ParetoTest(unittest.TestCase):
         self.assertEqual(d[occ_key_1].tolist(), [7, 7])
         self.assertEqual(d[occ_key_2].tolist(), [14, 14])
 
+    def test_merge_blocked(self):
+        global MERGE_BLOCK_ROWS
+        occ_key_1 = nameloop2col("GLB", 0)
+        occ_key_2 = nameloop2col("GLB", 1)
+        data1 = pd.DataFrame(
+            {
+                "A": [1, 3, 3, 2, 5],
+                "B": [3, 1, 3, 2, 1],
+                LOGSTRING: [{"A": i} for i in range(5)],
+                occ_key_1: [3, 1, 2, 2, 1],
+                occ_key_2: [8, 9, 7, 8, 6],
+            }
+        )
+        data2 = pd.DataFrame(
+            {
+                "A": [3, 1, 3, 2],
+                "B": [3, 3, 1, 2],
+                LOGSTRING: [{"B": i} for i in range(4)],
+                occ_key_1: [4, 5, 4, 3],
+                occ_key_2: [6, 2, 4, 3],
+            }
+        )
+        for shared_loop_index in [-1, 0, 1]:
+            unblocked = merge_cross(data1.copy(), data2.copy(), shared_loop_index, set())
+            block_rows, MERGE_BLOCK_ROWS = MERGE_BLOCK_ROWS, 3
+            try:
+                blocked = merge_cross(data1.copy(), data2.copy(), shared_loop_index, set())
+            finally:
+                MERGE_BLOCK_ROWS = block_rows
+            pd.testing.assert_frame_equal(blocked, unblocked)
+
+    def test_epsilon(self):
+        occ_key = nameloop2col("GLB", 0)
+        n = 200
+        data = pd.DataFrame(
+            {
+                "A": np.linspace(100, 200, n),
+                "B": np.linspace(200, 100, n),
+                occ_key: [3] * n,
+                LOGSTRING: [{"A": i} for i in range(n)],
+            }
+        )
+        exact = Pareto(data.copy())
+        approx = Pareto(data.copy(), epsilon=0.1)
+        self.assertLess(len(approx.data), len(exact.data))
+        self.assertAlmostEqual(approx.error_bound, 0.1)
+        # Every exact point is within 10% of some kept point
+        kept = approx.data[["A", "B"]].to_numpy()
+        for p in exact.data[["A", "B"]].to_numpy():
+            self.assertTrue((kept <= p * 1.1).all(axis=1).any())
+
+        other = Pareto(data.copy(), epsilon=0.1)
+        merged = approx.merge_next(other, 0, set())
+        self.assertEqual(merged.epsilon, 0.1)
+        self.assertAlmostEqual(merged.error_bound, 1.1 * 1.1 - 1)
+
+    def test_merged_dict(self):
+        a, b, c = {"A": 1, "B": 2}, {"B": 3, "C": 4}, {"D": 5}
+        merged = MergedDict(MergedDict(a, b), c)
+        self.assertEqual(merged, {**a, **b, **c})
+        self.assertEqual(list(merged.keys()), ["A", "B", "C", "D"])
+        merged["E"] = 6
+        self.assertEqual(len(merged), 5)
+        self.assertNotIn("E", a)
+
+    def test_merge_dict_columns(self):
+        data1 = pd.DataFrame({"A": [1, 3], "B": [3, 1], LOGSTRING: [{"A": 0}, {"A": 1}]})
+        data2 = pd.DataFrame({"A": [3], "B": [3], LOGSTRING: [{"B": 0}]})
+        d = merge_cross(data1, data2, 0, set())
+        self.assertEqual(d[LOGSTRING].tolist(), [{"A": 0, "B": 0}, {"A": 1, "B": 0}])
+
     def test_free_to_loop_index(self):
         # 0 --> Untiled fused
         occ_key_1 = nameloop2col("GLB", 0)
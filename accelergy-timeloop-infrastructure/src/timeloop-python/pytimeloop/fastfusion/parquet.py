@@ -0,0 +1,315 @@
+"""
+Parquet export and import of fusion results, so that they can be analyzed
+and plotted in later sessions without rerunning the mapper.
+
+save_pareto writes a DataFrame of mappings (e.g., the result of fuse_sims)
+and save_sims writes per-Einsum SIM sets, one row group per SIM.
+
+Dict columns (__Mappings, __LOOPNEST, ...) hold one entry per Einsum. Each is
+split into one column per Einsum. Values repeat across rows (many rows share
+an Einsum's mapping), so these columns are dictionary-encoded: strings are
+stored as-is, other values are pickled once per distinct value.
+
+Reads go through pyarrow. Only the requested columns are read, and filters
+(pyarrow expressions or lists of (column, op, value) tuples) skip row groups
+whose statistics can't match. ParetoFile only reads metadata until data is
+asked for, and can iterate over a file in batches.
+
+pyarrow is only needed when this module is used.
+"""
+import json
+import pickle
+from typing import Any, Iterator, Optional, Union
+
+import pandas as pd
+
+from pytimeloop.fastfusion.pareto import DICT_COLUMNS, Pareto
+from pytimeloop.fastfusion.sim import SIM
+
+METADATA_KEY = b"fastfusion"
+EINSUM = "__EINSUM"
+SIM_INDEX = "__SIM"
+TILING = "__TILING"
+SIM_COLUMNS = [EINSUM, SIM_INDEX, TILING]
+
+# Encodings of object columns
+STR = "str"
+PICKLE = "pickle"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Parquet export and import need pyarrow. Install it with "
+            "`pip install pyarrow`."
+        ) from e
+    return pyarrow
+
+
+def _encode_values(values: list[Any]):
+    """Dictionary-encodes values, which may include None."""
+    pa = _pyarrow()
+    if all(v is None or isinstance(v, str) for v in values):
+        return pa.array(values, type=pa.string()).dictionary_encode(), STR
+    # Rows share value objects, so pickle each object once
+    pickled = {}
+    encoded = []
+    for v in values:
+        if v is None:
+            encoded.append(None)
+            continue
+        if id(v) not in pickled:
+            pickled[id(v)] = (pickle.dumps(v), v)
+        encoded.append(pickled[id(v)][0])
+    return pa.array(encoded, type=pa.binary()).dictionary_encode(), PICKLE
+
+
+def _decode_values(column, encoding: str) -> list[Any]:
+    """Inverse of _encode_values. Each distinct value is decoded once."""
+    pa = _pyarrow()
+    values = []
+    for chunk in column.chunks:
+        if not pa.types.is_dictionary(chunk.type):
+            chunk = chunk.dictionary_encode()
+        dictionary = chunk.dictionary.to_pylist()
+        if encoding == PICKLE:
+            dictionary = [pickle.loads(v) for v in dictionary]
+        values.extend(
+            None if i is None else dictionary[i] for i in chunk.indices.to_pylist()
+        )
+    return values
+
+
+def to_arrow(data: pd.DataFrame):
+    """Converts a DataFrame of mappings to an Arrow table. See module docs."""
+    pa = _pyarrow()
+    arrays, names = [], []
+    meta = dict(columns=list(data.columns), dict_columns={}, object_columns={}, dtypes={})
+    for c in data.columns:
+        values = data[c]
+        if c in DICT_COLUMNS:
+            einsums = list(dict.fromkeys(k for d in values for k in d))
+            parts = meta["dict_columns"][c] = []
+            for e in einsums:
+                array, encoding = _encode_values([d.get(e, None) for d in values])
+                name = f"{c}/{e}"
+                arrays.append(array)
+                names.append(name)
+                parts.append((e, name, encoding))
+        elif values.dtype == object:
+            array, encoding = _encode_values(values.tolist())
+            arrays.append(array)
+            names.append(c)
+            meta["object_columns"][c] = encoding
+        else:
+            arrays.append(pa.array(values.to_numpy()))
+            names.append(c)
+            meta["dtypes"][c] = str(values.dtype)
+    meta["attrs"] = data.attrs
+    table = pa.table(arrays, names=names)
+    return table.replace_schema_metadata(
+        {METADATA_KEY: json.dumps(meta, default=str).encode()}
+    )
+
+
+def _metadata(schema) -> dict:
+    metadata = schema.metadata or {}
+    if METADATA_KEY not in metadata:
+        raise ValueError("Not a table written by pytimeloop.fastfusion.parquet")
+    return json.loads(metadata[METADATA_KEY])
+
+
+def from_arrow(table, meta: dict = None) -> pd.DataFrame:
+    """Inverse of to_arrow. table may hold a subset of the columns."""
+    if meta is None:
+        meta = _metadata(table.schema)
+    present = set(table.column_names)
+    columns = {}
+    for c in meta["columns"]:
+        if c in meta["dict_columns"]:
+            parts = [p for p in meta["dict_columns"][c] if p[1] in present]
+            if not parts:
+                continue
+            decoded = [
+                (e, _decode_values(table.column(name), encoding))
+                for e, name, encoding in parts
+            ]
+            columns[c] = [
+                {e: v[i] for e, v in decoded if v[i] is not None}
+                for i in range(table.num_rows)
+            ]
+        elif c in present:
+            if c in meta["object_columns"]:
+                columns[c] = _decode_values(table.column(c), meta["object_columns"][c])
+            else:
+                columns[c] = table.column(c).to_numpy()
+    data = pd.DataFrame(columns, index=pd.RangeIndex(table.num_rows))
+    data.attrs.update(meta.get("attrs", {}))
+    return data
+
+
+def _expand_columns(columns: Optional[list[str]], meta: dict) -> Optional[list[str]]:
+    """Parquet column names for columns, which may name dict columns."""
+    if columns is None:
+        return None
+    expanded = []
+    for c in columns:
+        if c in meta["dict_columns"]:
+            expanded.extend(name for _, name, _ in meta["dict_columns"][c])
+        else:
+            expanded.append(c)
+    return expanded
+
+
+def save_pareto(
+    data: Union[pd.DataFrame, Pareto],
+    path: str,
+    row_group_size: int = 1 << 16,
+    compression: str = "zstd",
+):
+    """Writes a DataFrame or Pareto of mappings to a Parquet file."""
+    pa = _pyarrow()
+    if isinstance(data, Pareto):
+        data = data.data
+    pa.parquet.write_table(
+        to_arrow(data), path, row_group_size=row_group_size, compression=compression
+    )
+
+
+def load_pareto(
+    path: str,
+    columns: Optional[list[str]] = None,
+    filters=None,
+) -> pd.DataFrame:
+    """
+    Reads a file written by save_pareto. columns may include dict columns
+    (e.g., __Mappings) and filters are passed to pyarrow, which skips row
+    groups that can't match. E.g., filters=[("Energy", "<", 1e9)].
+    """
+    return ParetoFile(path).read(columns=columns, filters=filters)
+
+
+class ParetoFile:
+    """
+    A Parquet file written by save_pareto or save_sims. Only metadata is read
+    until read() or iter_batches() is called.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = _pyarrow().parquet.ParquetFile(path)
+        self._meta = _metadata(self._file.schema_arrow)
+
+    @property
+    def num_rows(self) -> int:
+        return self._file.metadata.num_rows
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._meta["columns"])
+
+    @property
+    def attrs(self) -> dict:
+        return dict(self._meta.get("attrs", {}))
+
+    def read(self, columns: Optional[list[str]] = None, filters=None) -> pd.DataFrame:
+        pa = _pyarrow()
+        table = pa.parquet.read_table(
+            self.path, columns=_expand_columns(columns, self._meta), filters=filters
+        )
+        return from_arrow(table, self._meta)
+
+    def iter_batches(
+        self, batch_size: int = 1 << 16, columns: Optional[list[str]] = None
+    ) -> Iterator[pd.DataFrame]:
+        pa = _pyarrow()
+        for batch in self._file.iter_batches(
+            batch_size=batch_size, columns=_expand_columns(columns, self._meta)
+        ):
+            yield from_arrow(pa.Table.from_batches([batch]), self._meta)
+
+
+def save_sims(
+    sims: dict[str, list[SIM]],
+    path: str,
+    compression: str = "zstd",
+):
+    """
+    Writes per-Einsum SIM sets, e.g., the input of fuse_sims, to a Parquet
+    file with one row group per SIM. Columns a SIM doesn't have are null.
+    """
+    pa = _pyarrow()
+    tables = []
+    for einsum_id, einsum_sims in sims.items():
+        for i, s in enumerate(einsum_sims):
+            data = s.mapping.data.copy()
+            data[EINSUM] = einsum_id
+            data[SIM_INDEX] = i
+            data[TILING] = [s.tiling] * len(data)
+            data = data[SIM_COLUMNS + [c for c in data.columns if c not in SIM_COLUMNS]]
+            tables.append(to_arrow(data))
+    if not tables:
+        raise ValueError("No SIMs to save")
+
+    # Columns and dict column parts of all SIMs, in order of appearance
+    meta = dict(columns=[], dict_columns={}, object_columns={}, dtypes={}, attrs={})
+    for t in tables:
+        m = _metadata(t.schema)
+        meta["columns"].extend(c for c in m["columns"] if c not in meta["columns"])
+        meta["object_columns"].update(m["object_columns"])
+        meta["dtypes"].update(m["dtypes"])
+        for c, parts in m["dict_columns"].items():
+            known = meta["dict_columns"].setdefault(c, [])
+            known.extend(p for p in parts if p not in known)
+
+    tables = [t.replace_schema_metadata(None) for t in tables]
+    table = pa.concat_tables(tables, promote_options="permissive").unify_dictionaries()
+    table = table.replace_schema_metadata(
+        {METADATA_KEY: json.dumps(meta, default=str).encode()}
+    )
+    with pa.parquet.ParquetWriter(path, table.schema, compression=compression) as writer:
+        offset = 0
+        for t in tables:
+            writer.write_table(table.slice(offset, t.num_rows))
+            offset += t.num_rows
+
+
+def load_sims(
+    path: str,
+    einsums: Optional[list[str]] = None,
+    filters=None,
+) -> dict[str, list[SIM]]:
+    """
+    Reads a file written by save_sims. If einsums is given, only SIMs of
+    those Einsums are read. filters are passed to pyarrow as in load_pareto;
+    SIMs with no rows left are dropped.
+    """
+    pa = _pyarrow()
+    if einsums is not None:
+        expression = pa.compute.field(EINSUM).isin(list(einsums))
+        if filters is not None:
+            if not isinstance(filters, pa.compute.Expression):
+                filters = pa.parquet.filters_to_expression(filters)
+            expression = expression & filters
+        filters = expression
+    file = ParetoFile(path)
+    data = file.read(filters=filters)
+    dtypes = file._meta["dtypes"]
+
+    sims = {}
+    for (einsum_id, _), rows in data.groupby([EINSUM, SIM_INDEX], sort=False):
+        tiling = rows[TILING].iloc[0]
+        # Columns the SIM didn't have are null. Others may have been made
+        # nullable when SIMs were concatenated.
+        rows = rows.drop(columns=SIM_COLUMNS).dropna(axis=1, how="all")
+        rows = rows.reset_index(drop=True)
+        rows = rows.astype({c: dtypes[c] for c in rows.columns if c in dtypes})
+        for c in DICT_COLUMNS & set(rows.columns):
+            if not any(rows[c].iloc[0]):
+                del rows[c]
+        sims.setdefault(einsum_id, []).append(SIM(tiling, Pareto(rows, skip_pareto=True)))
+    return sims
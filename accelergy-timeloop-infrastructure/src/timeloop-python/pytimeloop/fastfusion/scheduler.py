@@ -0,0 +1,213 @@
+import math
+import os
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from joblib import Parallel
+from tqdm import tqdm
+
+# Environment overrides so that CI runners and clusters can be configured
+# without code changes.
+N_WORKERS_ENV = "FASTFUSION_N_WORKERS"
+BACKEND_ENV = "FASTFUSION_BACKEND"
+MEMORY_PER_WORKER_ENV = "FASTFUSION_MEMORY_PER_WORKER"
+
+BACKENDS = {
+    "loky": "loky",
+    "processes": "loky",
+    "threads": "threading",
+    "threading": "threading",
+    "serial": None,
+}
+
+# Target number of chunks per worker when chunking by cost. More chunks give
+# better load balance, fewer chunks give less dispatch overhead.
+CHUNKS_PER_WORKER = 4
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    # cgroup v2
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process may use, honoring affinity and cgroups."""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:
+        n = os.cpu_count() or 1
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        n = min(n, max(1, math.floor(quota)))
+    return max(1, n)
+
+
+def available_memory() -> Optional[int]:
+    """Available memory in bytes, or None if it cannot be determined."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().available
+
+
+def _run_chunk(jobs: list[tuple[Callable, tuple, dict]]) -> list[Any]:
+    return [f(*args, **kwargs) for f, args, kwargs in jobs]
+
+
+class Scheduler:
+    """
+    Runs lists of joblib-style delayed jobs.
+
+    n_workers: Number of workers. Defaults to the number of available CPUs
+        (respecting affinity and cgroup CPU quotas).
+    backend: "loky" (processes), "threads" or "serial".
+    memory_per_worker: Estimated peak memory of one job in bytes. If given,
+        the number of concurrent workers is throttled so that their combined
+        estimate fits in the currently-available memory.
+    memory_fraction: Fraction of available memory that workers may use.
+    """
+
+    def __init__(
+        self,
+        n_workers: Optional[int] = None,
+        backend: str = "loky",
+        memory_per_worker: Optional[int] = None,
+        memory_fraction: float = 0.8,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend {backend}. Options are {list(BACKENDS)}"
+            )
+        self.n_workers = n_workers
+        self.backend = backend
+        self.memory_per_worker = memory_per_worker
+        self.memory_fraction = memory_fraction
+
+    @staticmethod
+    def from_env() -> "Scheduler":
+        n_workers = os.environ.get(N_WORKERS_ENV, None)
+        memory_per_worker = os.environ.get(MEMORY_PER_WORKER_ENV, None)
+        return Scheduler(
+            n_workers=int(n_workers) if n_workers else None,
+            backend=os.environ.get(BACKEND_ENV, "loky"),
+            memory_per_worker=int(memory_per_worker) if memory_per_worker else None,
+        )
+
+    def effective_n_workers(self, n_jobs: Optional[int] = None) -> int:
+        if BACKENDS[self.backend] is None:
+            return 1
+        n = self.n_workers if self.n_workers is not None else available_cpus()
+        if self.memory_per_worker:
+            memory = available_memory()
+            if memory is not None:
+                n = min(n, int(memory * self.memory_fraction // self.memory_per_worker))
+        if n_jobs is not None:
+            n = min(n, n_jobs)
+        return max(1, n)
+
+    def run(
+        self,
+        jobs: Iterable[tuple[Callable, tuple, dict]],
+        n_workers: Optional[int] = None,
+        pbar: Optional[str] = None,
+        return_as: Optional[str] = None,
+        costs: Optional[Sequence[float]] = None,
+    ) -> list[Any]:
+        """
+        Runs jobs and returns their results in order.
+
+        If costs are given (one estimate per job), jobs are packed into
+        roughly equal-cost chunks, largest first, so that many cheap jobs are
+        dispatched together and expensive jobs do not end up last.
+        """
+        if n_workers is not None and n_workers != self.n_workers:
+            return Scheduler(
+                n_workers, self.backend, self.memory_per_worker, self.memory_fraction
+            ).run(jobs, pbar=pbar, return_as=return_as, costs=costs)
+
+        jobs = list(jobs)
+        n = self.effective_n_workers(len(jobs))
+
+        if n == 1:
+            if pbar:
+                jobs = tqdm(jobs, total=len(jobs), desc=pbar, leave=True)
+            return [j[0](*j[1], **j[2]) for j in jobs]
+
+        args = dict(n_jobs=n, backend=BACKENDS[self.backend])
+        if self.memory_per_worker:
+            # Don't queue up more work than we can hold in memory
+            args["pre_dispatch"] = f"{n}"
+
+        if costs is None:
+            if return_as is not None:
+                args["return_as"] = return_as
+            if pbar:
+                jobs = tqdm(jobs, total=len(jobs), desc=pbar, leave=True)
+            return Parallel(**args)(jobs)
+
+        assert return_as is None, "return_as is not supported with costs"
+        assert len(costs) == len(jobs), "Need one cost per job"
+        chunks = chunk_by_cost(costs, n * CHUNKS_PER_WORKER)
+        chunk_jobs = [
+            (_run_chunk, ([jobs[i] for i in chunk],), {}) for chunk in chunks
+        ]
+        if pbar:
+            chunk_jobs = tqdm(chunk_jobs, total=len(chunk_jobs), desc=pbar, leave=True)
+        results = [None] * len(jobs)
+        for chunk, chunk_result in zip(chunks, Parallel(**args)(chunk_jobs)):
+            for i, r in zip(chunk, chunk_result):
+                results[i] = r
+        return results
+
+
+def chunk_by_cost(costs: Sequence[float], n_chunks: int) -> list[list[int]]:
+    """
+    Groups job indices into chunks of roughly equal total cost. Chunks are
+    returned most expensive first, and a job more expensive than the target
+    chunk cost gets a chunk of its own.
+    """
+    order = sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+    target = sum(costs) / max(1, n_chunks)
+    chunks, cur, cur_cost = [], [], 0
+    for i in order:
+        cur.append(i)
+        cur_cost += costs[i]
+        if cur_cost >= target:
+            chunks.append(cur)
+            cur, cur_cost = [], 0
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+_default_scheduler: Optional[Scheduler] = None
+
+
+def get_default_scheduler() -> Scheduler:
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = Scheduler.from_env()
+    return _default_scheduler
+
+
+def set_default_scheduler(scheduler: Scheduler):
+    global _default_scheduler
+    _default_scheduler = scheduler
@@ -8,7 +8,13 @@ from typing import Any, Iterable, Optional
 from joblib import delayed
 import pandas as pd
 
-from .pareto import Pareto, LOGSTRING, nameloop2col
+from .pareto import (
+    Pareto,
+    LOGSTRING,
+    nameloop2col,
+    merged_min_reservations,
+    exceeds_capacity,
+)
 from .util import expfmt, fzs, parallel
 
 # Abstractions:
@@ -239,12 +245,112 @@ class Tiling:
     def set_tags(self, *new_tags: Any) -> "Tiling":
         return Tiling(self.loops, self.tensors, fzs(new_tags))
 
+    def lookahead_key(self, tensors: set[str]) -> tuple:
+        """
+        For each of the given tensors, its storages and the loops above its
+        backing storage. Loops above a shared tensor are co-tiled, so any two
+        SIMs that can ever be fused together have the same key for the
+        tensors they share, however many Einsums apart they are.
+        """
+        backing_levels = self.get_backing_levels()
+        return tuple(
+            (
+                t,
+                fzs(s for s in self.tensors if s.tensor_id == t),
+                self.loops[: backing_levels[t]],
+            )
+            for t in sorted(tensors & self.tensor_names)
+        )
+
     def all_n_loops(self) -> set["Tiling"]:
         min_loops = max(t.above_loop_index for t in self.tensors)
         return set(Tiling(
             self.loops[:i+1], self.tensors, self.tags
         ) for i in range(min_loops, len(self.loops)))
 
+
+class TilingInterner:
+    """
+    Gives each distinct Tiling a small integer ID and memoizes, per (tiling
+    ID, live tensor set ID), the dead-tensor projections and loop prefixes
+    used to group SIMs. Grouping then hashes integers instead of building
+    and hashing a new Tiling for every SIM at every Einsum step.
+
+    Tilings are interned by their own __eq__ and __hash__, so two Tilings
+    get the same ID exactly when they would be the same dict key.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # IDs cached on Tilings are tagged with this token. A Tiling that was
+        # pickled (e.g., returned from a worker) or interned before a clear()
+        # carries a different token and is interned again.
+        self._token = object()
+        self._ids: dict[Tiling, int] = {}
+        self._tilings: list[Tiling] = []
+        self._sets: dict[frozenset[str], int] = {}
+        self._projections: dict[tuple[int, int, bool, int], int] = {}
+        self._n_loops: dict[int, frozenset[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._tilings)
+
+    def id(self, tiling: Tiling) -> int:
+        cached = tiling.__dict__.get("_interned", None)
+        if cached is not None and cached[0] is self._token:
+            return cached[1]
+        i = self._ids.get(tiling, None)
+        if i is None:
+            i = len(self._tilings)
+            self._tilings.append(tiling)
+            self._ids[tiling] = i
+        object.__setattr__(tiling, "_interned", (self._token, i))
+        return i
+
+    def tiling(self, i: int) -> Tiling:
+        return self._tilings[i]
+
+    def set_id(self, names: Optional[Iterable[str]]) -> int:
+        if names is None:
+            return -1
+        return self._sets.setdefault(frozenset(names), len(self._sets))
+
+    def clear_dead_tensors(
+        self,
+        tiling: Tiling,
+        live_tensors: set[str],
+        keep_loops: bool = False,
+        keep_tensors: set[str] = None,
+        live_id: int = None,
+        keep_id: int = None,
+    ) -> int:
+        """ID of tiling.clear_dead_tensors(...). Pass live_id and keep_id
+        (from set_id) when calling this for many Tilings."""
+        live_id = self.set_id(live_tensors) if live_id is None else live_id
+        keep_id = self.set_id(keep_tensors) if keep_id is None else keep_id
+        key = (self.id(tiling), live_id, keep_loops, keep_id)
+        projected = self._projections.get(key, None)
+        if projected is None:
+            projected = self.id(
+                tiling.clear_dead_tensors(live_tensors, keep_loops, keep_tensors)
+            )
+            self._projections[key] = projected
+        return projected
+
+    def all_n_loops(self, i: int) -> frozenset[int]:
+        """IDs of tiling(i).all_n_loops()."""
+        n_loops = self._n_loops.get(i, None)
+        if n_loops is None:
+            n_loops = frozenset(self.id(t) for t in self._tilings[i].all_n_loops())
+            self._n_loops[i] = n_loops
+        return n_loops
+
+
+INTERNED_TILINGS = TilingInterner()
+
+
 class SIM:
     def __init__(self, tiling: Tiling, mapping: Pareto):
         self.tiling: Tiling = tiling
@@ -285,6 +391,25 @@ class SIM:
         s.tensors.update(self.tensors)
         return s
 
+    def merge_exceeds_capacity(
+        self,
+        n: "SIM",
+        resource2capacity: dict[str, Optional[int]],
+        reservations: tuple[dict[str, float], dict[str, float]] = None,
+    ) -> bool:
+        """
+        True if every row of self.merge_next(n) is known to exceed a capacity
+        in resource2capacity, so the merge can be skipped. reservations are
+        the min_reservations of self and n if already computed.
+        """
+        if not resource2capacity:
+            return False
+        if reservations is None:
+            reservations = (self.mapping.min_reservations(), n.mapping.min_reservations())
+        shared_loop_index = self.tiling.shared_loop_index(n.tiling.tensor_names)
+        bounds = merged_min_reservations(*reservations, shared_loop_index)
+        return exceeds_capacity(bounds, resource2capacity)
+
     def get_shared_loop_index(self, live_tensors: set[str]) -> int:
         live_tensors = list(self.tiling.tensor_names) + [live_tensors]
         return self.tiling.shared_loop_index(live_tensors)
@@ -362,19 +487,33 @@ class SIM:
         return SIM(sims[0].tiling, Pareto.concat([s.mapping for s in sims]))
 
     @staticmethod
-    def _group(
-        sims: list["SIM"], 
-        live_tensors: set[str], 
+    def _group_ids(
+        sims: list["SIM"],
+        live_tensors: set[str],
         keep_loops: bool = False,
         keep_tensors: set[str] = None
-    ) -> dict[tuple[Tiling, ...], list["SIM"]]:
+    ) -> dict[int, list["SIM"]]:
+        interner = INTERNED_TILINGS
+        live_id, keep_id = interner.set_id(live_tensors), interner.set_id(keep_tensors)
         grouped = defaultdict(list)
         for s in sims:
             grouped[
-                s.tiling.clear_dead_tensors(live_tensors, keep_loops=keep_loops, keep_tensors=keep_tensors)
+                interner.clear_dead_tensors(
+                    s.tiling, live_tensors, keep_loops, keep_tensors, live_id, keep_id
+                )
             ].append(s)
         return grouped
 
+    @staticmethod
+    def _group(
+        sims: list["SIM"], 
+        live_tensors: set[str], 
+        keep_loops: bool = False,
+        keep_tensors: set[str] = None
+    ) -> dict[tuple[Tiling, ...], list["SIM"]]:
+        grouped = SIM._group_ids(sims, live_tensors, keep_loops, keep_tensors)
+        return {INTERNED_TILINGS.tiling(i): g for i, g in grouped.items()}
+
     @staticmethod
     def combine_combineable(sims: list["SIM"], live_tensors: set[str], allow_different_tilings: bool=False) -> list["SIM"]:
         groups = list(SIM._group(sims, live_tensors).values())
@@ -407,7 +546,7 @@ class SIM:
 
     def filter_by_mapping_hashes(self, hashes: set[str]) -> Optional["SIM"]:
         self = SIM(self.tiling, self.mapping.filter_by_mapping_hashes(hashes))
-        return self if len(self.mapping.data) > 0 else None
+        return self if self.mapping.num_rows() > 0 else None
 
     def group_left(sims: list["SIM"], live_tensors: set[str]) -> dict[tuple[Tiling, ...], list["SIM"]]:
         return SIM._group(sims, live_tensors, keep_loops=True)
@@ -431,9 +570,9 @@ class SIM:
     ):
         assert left and right, "Cannot check for compatibility with empty list"
         shared_tensors = left[0].tensor_names & right[0].tensor_names
-        left = SIM._group(left, right_live_tensors, keep_tensors=shared_tensors)
-        right = SIM._group(right, left_live_tensors, keep_tensors=shared_tensors)
-        left_keys = set().union(*(l.all_n_loops() for l in left))
+        left = SIM._group_ids(left, right_live_tensors, keep_tensors=shared_tensors)
+        right = SIM._group_ids(right, left_live_tensors, keep_tensors=shared_tensors)
+        left_keys = set().union(*(INTERNED_TILINGS.all_n_loops(l) for l in left))
         right_keys = set(right)
         left_list = [s for k in left for s in left[k] if k in right_keys]
         right_list = [s for k in right for s in right[k] if k in left_keys]
@@ -539,6 +678,75 @@ class TestSIM(unittest.TestCase):
         self.assertEqual(sims[0].mapping.data[colname].sum(), expected_util)
         self.assertEqual(sims2[0].mapping.data[colname].sum(), expected_util)
 
+    def test_merge_exceeds_capacity(self):
+        a = TensorStorage("A", 1, "GLB", 1)  # Above loop 1 --> share 0
+        loops = (Loop("M", 2, False),)
+
+        def make_sim(tensors, glb):
+            mapping = Pareto(
+                pd.DataFrame(
+                    {
+                        "Energy": list(range(len(glb), 0, -1)),
+                        nameloop2col("GLB", 0): glb,
+                        nameloop2col("GLB", 1): [1] * len(glb),
+                        LOGSTRING: [{}] * len(glb),
+                    }
+                )
+            )
+            return SIM(Tiling(loops, fzs(tensors)), mapping)
+
+        left = make_sim([a, TensorStorage("B", 1, "GLB", 1)], [3, 5])
+        right = make_sim([a, TensorStorage("C", 1, "GLB", 1)], [4, 6])
+        # Level 0 is shared, so the smallest merged reservation is 3 + 4
+        for capacity in range(5, 10):
+            r2c = {"GLB": capacity}
+            merged = left.copy().merge_next(right.copy(), {"A"})
+            merged.consolidate(None, r2c)
+            exceeds = left.merge_exceeds_capacity(right, r2c)
+            self.assertEqual(exceeds, capacity < 7)
+            if exceeds:
+                self.assertEqual(len(merged.mapping.data), 0)
+        self.assertFalse(left.merge_exceeds_capacity(right, None))
+        self.assertFalse(left.merge_exceeds_capacity(right, {"GLB": None}))
+
+
+class TestTilingInterner(unittest.TestCase):
+    def make_sims(self):
+        import random
+        rng = random.Random(0)
+        sims = []
+        for _ in range(200):
+            loops = tuple(Loop(rng.choice("MNK"), rng.choice([2, 4]), False) for _ in range(3))
+            tensors = fzs(
+                TensorStorage(t, rng.randint(0, 2), rng.choice(["GLB", "DRAM"]), 1)
+                for t in rng.sample("ABCD", 2)
+            )
+            sims.append(SIM(Tiling(loops, tensors), Pareto(pd.DataFrame({"Energy": [1]}))))
+        return sims
+
+    def test_group_matches_clear_dead_tensors(self):
+        sims = self.make_sims()
+        for keep_loops, keep_tensors in [(False, None), (True, None), (False, {"A"})]:
+            for _ in range(2):  # Second pass uses memoized projections
+                expected = defaultdict(list)
+                for s in sims:
+                    key = s.tiling.clear_dead_tensors({"A", "B"}, keep_loops, keep_tensors)
+                    expected[key].append(s)
+                grouped = SIM._group(sims, {"A", "B"}, keep_loops, keep_tensors)
+                self.assertEqual(grouped, dict(expected))
+
+    def test_pickled_tiling_is_reinterned(self):
+        import pickle
+        interner = TilingInterner()
+        a = Tiling((Loop("M", 2, False),), fzs([TensorStorage("A", 0, "GLB", 1)]))
+        b = Tiling((Loop("M", 4, False),), fzs([TensorStorage("A", 0, "GLB", 1)]))
+        self.assertEqual([interner.id(a), interner.id(b), interner.id(a)], [0, 1, 0])
+        interner2 = TilingInterner()
+        self.assertEqual(interner2.id(b), 0)
+        self.assertEqual(interner.id(pickle.loads(pickle.dumps(b))), 1)
+        interner.clear()
+        self.assertEqual(interner.id(b), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
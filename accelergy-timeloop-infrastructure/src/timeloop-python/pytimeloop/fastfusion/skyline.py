@@ -0,0 +1,125 @@
+"""
+NumPy Pareto (skyline) filtering. All objectives are minimized.
+
+- 1 objective: argmin.
+- 2 objectives: sort by the first objective and sweep the running minimum of
+  the second.
+- 3+ objectives: sort-filter skyline. Rows are visited in order of the sum of
+  their objectives, and each visited row drops every remaining row it
+  dominates in one vectorized pass. Rows that get visited early dominate the
+  most, so the candidate set shrinks quickly.
+
+epsilon_pareto_mask keeps an approximate front instead: objectives are
+binned on a logarithmic grid and one row is kept per non-dominated bin.
+"""
+
+import numpy as np
+
+
+def _sweep_2d(costs: np.ndarray) -> np.ndarray:
+    order = np.lexsort((costs[:, 1], costs[:, 0]))
+    second = costs[order, 1]
+    # A row is kept iff its second objective beats every row before it. Equal
+    # rows are adjacent and the sort is stable, so only the first is kept.
+    prev_min = np.minimum.accumulate(second)
+    keep = np.empty(len(costs), dtype=bool)
+    keep[0] = True
+    keep[1:] = second[1:] < prev_min[:-1]
+    return order[keep]
+
+
+def _sort_filter(costs: np.ndarray) -> np.ndarray:
+    # Rows with small sums dominate the most rows, so visiting them first
+    # empties the candidate set quickly. The sort is stable so that the first
+    # of several equal rows is the one kept.
+    idx = np.argsort(costs.sum(axis=1), kind="stable")
+    remaining = costs[idx]
+    i = 0
+    while i < len(idx):
+        # Keep rows that are not dominated by or equal to row i, and row i
+        keep = (remaining < remaining[i]).any(axis=1)
+        keep[i] = True
+        idx, remaining = idx[keep], remaining[keep]
+        i = np.count_nonzero(keep[:i]) + 1
+    return idx
+
+
+def pareto_mask(costs: np.ndarray, distinct: bool = True) -> np.ndarray:
+    """
+    Returns a boolean mask of the rows of costs (n_rows x n_objectives) that
+    are on the Pareto front. If distinct, only the first of several identical
+    rows is kept.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    if costs.ndim == 1:
+        costs = costs[:, None]
+    n, m = costs.shape
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    assert not np.isnan(costs).any(), "Pareto costs must not contain NaN"
+
+    if m == 0:
+        mask[0] = True
+    elif m == 1:
+        mask[np.argmin(costs[:, 0])] = True
+    elif m == 2:
+        mask[_sweep_2d(costs)] = True
+    else:
+        mask[_sort_filter(costs)] = True
+
+    if not distinct and m > 0:
+        _, inverse = np.unique(costs, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        mask = np.isin(inverse, inverse[mask])
+    elif not distinct:
+        mask[:] = True
+    return mask
+
+
+def pareto_indices(costs: np.ndarray, distinct: bool = True) -> np.ndarray:
+    """Row indices, in increasing order, of the Pareto front of costs."""
+    return np.flatnonzero(pareto_mask(costs, distinct=distinct))
+
+
+def epsilon_bins(costs: np.ndarray, epsilons: np.ndarray) -> np.ndarray:
+    """
+    Bins each objective j with epsilons[j] > 0 to floor(log_{1 + e}(cost)).
+    Zero costs go to bin -inf. Objectives with epsilon 0 are not binned.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    epsilons = np.asarray(epsilons, dtype=np.float64)
+    bins = costs.copy()
+    approx = epsilons > 0
+    if approx.any():
+        c = costs[:, approx]
+        assert (c >= 0).all(), "Approximated Pareto costs must be non-negative"
+        with np.errstate(divide="ignore"):
+            bins[:, approx] = np.floor(np.log(c) / np.log1p(epsilons[approx]))
+    return bins
+
+
+def epsilon_pareto_mask(
+    costs: np.ndarray, epsilons: np.ndarray, exact_mask: np.ndarray = None
+) -> np.ndarray:
+    """
+    Returns a mask of an epsilon-Pareto front of costs: for every row p of the
+    exact front there is a kept row q with q[j] <= (1 + epsilons[j]) * p[j] for
+    every objective j. Kept rows are a subset of the exact front. exact_mask,
+    if the caller already has it, is pareto_mask(costs).
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    mask = pareto_mask(costs) if exact_mask is None else exact_mask.copy()
+    idx = np.flatnonzero(mask)
+    if len(idx) <= 1 or not (np.asarray(epsilons) > 0).any():
+        return mask
+    front = costs[idx]
+    # Any row of a bin is within the bound, so prefer rows that are good on
+    # all objectives.
+    scale = np.abs(front).max(axis=0)
+    scale[scale == 0] = 1
+    order = np.argsort((front / scale).sum(axis=1), kind="stable")
+    keep = pareto_mask(epsilon_bins(front[order], epsilons))
+    mask[:] = False
+    mask[idx[order[keep]]] = True
+    return mask
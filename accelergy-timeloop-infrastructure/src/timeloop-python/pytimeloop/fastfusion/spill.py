@@ -0,0 +1,191 @@
+"""
+Memory-bounded storage for Pareto DataFrames.
+
+While a SpillStore is active, every Pareto registers its DataFrame with it.
+The store keeps the most recently used DataFrames resident. When their
+estimated size exceeds the memory budget, the least recently used ones are
+written to disk and dropped. A spilled DataFrame is read back when its data
+is next accessed. Spilling is lossless, so results are the same with or
+without a store.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from typing import Optional
+
+import joblib
+import pandas as pd
+
+# Rough per-cell cost of object columns (dicts, Tilings, etc.). Measuring
+# them exactly would take longer than spilling.
+OBJECT_CELL_BYTES = 512
+
+
+def estimate_nbytes(data: pd.DataFrame) -> int:
+    nbytes = 0
+    for c, dtype in data.dtypes.items():
+        if dtype == object:
+            nbytes += len(data) * OBJECT_CELL_BYTES
+        else:
+            nbytes += len(data) * dtype.itemsize
+    return nbytes
+
+
+class SpillStore:
+    """
+    memory_budget: Bytes of Pareto data to keep resident.
+    directory: Where spilled data is written. Defaults to a temporary
+        directory that is removed when the store is closed.
+    """
+
+    def __init__(self, memory_budget: int, directory: Optional[str] = None):
+        self.memory_budget = memory_budget
+        self._tmpdir = None
+        if directory is None:
+            directory = self._tmpdir = tempfile.mkdtemp(prefix="fastfusion_spill_")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._resident: OrderedDict[int, tuple[weakref.ref, int]] = OrderedDict()
+        self._resident_nbytes = 0
+        self._spilled = weakref.WeakSet()
+        self._ids = itertools.count()
+        self._lock = threading.RLock()
+        self.n_spilled = 0
+        self.n_loaded = 0
+
+    def track(self, pareto):
+        """Puts a Pareto created before the store was active under it."""
+        if pareto._store is None:
+            pareto._store = self
+            self.touch(pareto)
+
+    def touch(self, pareto, nbytes: Optional[int] = None):
+        """Marks pareto as most recently used, then spills others if needed."""
+        with self._lock:
+            self._touch(pareto, nbytes)
+
+    def _touch(self, pareto, nbytes: Optional[int]):
+        key = id(pareto)
+        if key in self._resident:
+            ref, old_nbytes = self._resident.pop(key)
+            if nbytes is None:
+                nbytes = old_nbytes
+            self._resident_nbytes -= old_nbytes
+        else:
+            ref = weakref.ref(pareto, self._forget(key))
+        if nbytes is None:
+            nbytes = estimate_nbytes(pareto._data)
+        self._resident[key] = (ref, nbytes)
+        self._resident_nbytes += nbytes
+        self._evict()
+
+    def _forget(self, key):
+        def callback(_):
+            entry = self._resident.pop(key, None)
+            if entry is not None:
+                self._resident_nbytes -= entry[1]
+        return callback
+
+    def _evict(self):
+        # Never evict the most recently used entry
+        while self._resident_nbytes > self.memory_budget and len(self._resident) > 1:
+            key, (ref, nbytes) = self._resident.popitem(last=False)
+            self._resident_nbytes -= nbytes
+            pareto = ref()
+            if pareto is not None:
+                self.spill(pareto)
+
+    def spill(self, pareto):
+        path = os.path.join(self.directory, f"{next(self._ids)}.joblib")
+        joblib.dump(pareto._data, path)
+        pareto._n_rows = len(pareto._data)
+        pareto._data = None
+        pareto._path = path
+        # Remove the file if the Pareto is dropped while spilled
+        pareto._path_finalizer = weakref.finalize(pareto, _remove, path)
+        self._spilled.add(pareto)
+        self.n_spilled += 1
+
+    def load(self, pareto) -> pd.DataFrame:
+        with self._lock:
+            data = joblib.load(pareto._path)
+            # The file is not kept in sync with later changes to the
+            # DataFrame, so it is removed and written again if the Pareto is
+            # spilled again.
+            self.discard(pareto)
+            self.n_loaded += 1
+        return data
+
+    def discard(self, pareto):
+        """Removes the spilled copy of pareto's data."""
+        pareto._path_finalizer()
+        pareto._path = None
+        pareto._path_finalizer = None
+        self._spilled.discard(pareto)
+
+    def close(self):
+        """Loads all spilled data back into memory and detaches all Paretos."""
+        for pareto in list(self._spilled):
+            pareto._data = self.load(pareto)
+            pareto._store = None
+        for ref, _ in self._resident.values():
+            pareto = ref()
+            if pareto is not None:
+                pareto._store = None
+        self._resident.clear()
+        self._resident_nbytes = 0
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+
+    def stats(self) -> dict:
+        return dict(
+            resident=len(self._resident),
+            resident_nbytes=self._resident_nbytes,
+            n_spilled=self.n_spilled,
+            n_loaded=self.n_loaded,
+        )
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_active_store: Optional[SpillStore] = None
+
+
+def get_spill_store() -> Optional[SpillStore]:
+    return _active_store
+
+
+def set_spill_store(store: Optional[SpillStore]):
+    global _active_store
+    _active_store = store
+
+
+@contextmanager
+def spilling(memory_budget: Optional[int], directory: Optional[str] = None):
+    """
+    Activates a SpillStore for the duration of the block. Does nothing if
+    memory_budget is None.
+    """
+    global _active_store
+    if memory_budget is None:
+        yield None
+        return
+    previous = _active_store
+    store = SpillStore(memory_budget, directory)
+    _active_store = store
+    try:
+        yield store
+    finally:
+        _active_store = previous
+        store.close()
@@ -0,0 +1,113 @@
+"""
+Per-stage timing and counters for the fusion pipeline.
+
+A Tracer records one event per pipeline stage and Einsum step, holding the
+wall time, the peak memory of the process so far, and any counters the stage
+reports (e.g., number of SIMs and rows before and after). Traces are written
+as JSON, or in the Chrome trace format (load in chrome://tracing or
+https://ui.perfetto.dev).
+"""
+from contextlib import contextmanager
+import json
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_FORMATS = ["json", "chrome"]
+
+
+def peak_memory() -> Optional[int]:
+    """Peak resident memory of this process and its finished children, in
+    bytes, or None if it cannot be determined."""
+    if resource is None:
+        return None
+    peak = 0
+    for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]:
+        peak = max(peak, resource.getrusage(who).ru_maxrss)
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Tracer:
+    def __init__(self):
+        self.events: list[dict] = []
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, step: Optional[str] = None, **counters):
+        """
+        Records the stage run in the block. Counters passed in and counters
+        set on the yielded event (event["rows_out"] = ...) are saved with it.
+        """
+        event = dict(name=name, step=step, **counters)
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event["start"] = start - self.start
+            event["duration"] = time.perf_counter() - start
+            event["peak_memory"] = peak_memory()
+            with self._lock:
+                self.events.append(event)
+
+    def total_time(self) -> dict[str, float]:
+        totals = {}
+        for e in self.events:
+            totals[e["name"]] = totals.get(e["name"], 0) + e["duration"]
+        return totals
+
+    def to_chrome_trace(self) -> dict:
+        pid = os.getpid()
+        trace_events = []
+        for e in self.events:
+            args = {
+                k: v for k, v in e.items() if k not in ("name", "start", "duration")
+            }
+            trace_events.append(
+                dict(
+                    name=e["name"],
+                    cat=e["step"] or "",
+                    ph="X",
+                    ts=e["start"] * 1e6,
+                    dur=e["duration"] * 1e6,
+                    pid=pid,
+                    tid=0,
+                    args=args,
+                )
+            )
+            counters = {
+                k: v
+                for k, v in args.items()
+                if isinstance(v, (int, float)) and k != "step"
+            }
+            if counters:
+                trace_events.append(
+                    dict(
+                        name=e["name"],
+                        ph="C",
+                        ts=(e["start"] + e["duration"]) * 1e6,
+                        pid=pid,
+                        args=counters,
+                    )
+                )
+        return dict(traceEvents=trace_events, displayTimeUnit="ms")
+
+    def save(self, path: str, trace_format: str = "json"):
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(
+                f"Unknown trace format {trace_format}. Options are {TRACE_FORMATS}"
+            )
+        if trace_format == "chrome":
+            contents = self.to_chrome_trace()
+        else:
+            contents = dict(events=self.events, total_time=self.total_time())
+        with open(path, "w") as f:
+            json.dump(contents, f, indent=1, default=str)
@@ -1,12 +1,10 @@
 from numbers import Number
 
-from joblib import Parallel
-
 import sys
 
-from tqdm import tqdm
-
-N_PARALLEL_THREADS = 64
+# None means the default scheduler picks the worker count (available CPUs,
+# or FASTFUSION_N_WORKERS). Kept for callers that set it directly.
+N_PARALLEL_THREADS = None
 
 
 class fzs(frozenset):
@@ -34,11 +32,21 @@ def expfmt(x):
     return x
 
 
-def parallel(jobs, n_jobs: int = None, one_job_if_debugging: bool = True, pbar: str = None, return_as: str = None):
-    args = {}
-    if return_as is not None:
-        args["return_as"] = return_as
-        
+def parallel(
+    jobs,
+    n_jobs: int = None,
+    one_job_if_debugging: bool = True,
+    pbar: str = None,
+    return_as: str = None,
+    costs: list[float] = None,
+):
+    """
+    Runs joblib-style delayed jobs with the default scheduler. n_jobs
+    overrides the scheduler's worker count; costs are optional per-job cost
+    estimates used to chunk jobs. See scheduler.Scheduler.
+    """
+    from pytimeloop.fastfusion.scheduler import get_default_scheduler
+
     if n_jobs is None:
         n_jobs = N_PARALLEL_THREADS
 
@@ -47,14 +55,18 @@ def parallel(jobs, n_jobs: int = None, one_job_if_debugging: bool = True, pbar:
 
     if isinstance(jobs, dict):
         assert return_as == None, "return_as is not supported for dict jobs"
-        r = zip(jobs.keys(), parallel(jobs.values(), pbar=pbar, one_job_if_debugging=one_job_if_debugging))
+        r = zip(
+            jobs.keys(),
+            parallel(
+                list(jobs.values()),
+                n_jobs=n_jobs,
+                pbar=pbar,
+                one_job_if_debugging=one_job_if_debugging,
+                costs=costs,
+            ),
+        )
         return {k: v for k, v in r}
 
-    if n_jobs == 1:
-        if pbar:
-            jobs = tqdm(jobs, total=len(jobs), desc=pbar, leave=True)
-        return [j[0](*j[1], **j[2]) for j in jobs]
-
-    if pbar:
-        return Parallel(n_jobs=n_jobs, **args)(tqdm(jobs, total=len(jobs), desc=pbar, leave=True))
-    return Parallel(n_jobs=n_jobs, **args)(jobs)
+    return get_default_scheduler().run(
+        jobs, n_workers=n_jobs, pbar=pbar, return_as=return_as, costs=costs
+    )
@@ -1,5 +1,5 @@
 import bindings
-from bindings.search import SearchStatus
+from bindings.search import SearchStatus, EvalMemo, mapping_fingerprint
 from .mapspace import MapSpace
 
 
@@ -1,16 +1,26 @@
 #include "pytimeloop/mapper/coupled-mapper.h"
 
+#include <stdexcept>
+
 #include "pytimeloop/model/util.h"
 
 namespace pytimeloop::pymapper {
 
+EvalMemo::Scope CoupledMapper::MemoScope(const ArchSpecs& arch_spec,
+                                         const Workload& workload,
+                                         const SparseOptInfo& sparse_opts) {
+  return EvalMemo::Scope{.workload = &workload,
+                         .arch_specs = &arch_spec,
+                         .sparse_opts = &sparse_opts};
+}
+
 CoupledMapper::CoupledMapper(
     const ArchSpecs& arch_spec, Workload& workload,
     std::vector<std::pair<MapSpace*, SearchAlgorithm*>>&
         mapspace_search_alg_pairs,
     SparseOptInfo& sparse_opts, const std::vector<std::string>& metrics,
     uint64_t search_size, unsigned timeout, unsigned victory_condition,
-    bool penalize_consecutive_bypass_fails)
+    bool penalize_consecutive_bypass_fails, EvalMemo::ShPtr memo)
     : arch_spec_(arch_spec),
       workload_(workload),
       mapspace_search_alg_pairs_(mapspace_search_alg_pairs),
@@ -20,12 +30,18 @@ CoupledMapper::CoupledMapper(
       timeout_(timeout),
       victory_cond_(victory_condition),
       penalize_cons_bypass_fails_(penalize_consecutive_bypass_fails),
+      memo_(memo),
       submapper_pool_() {
+  if (memo_ && !memo_->Bind(MemoScope(arch_spec_, workload_, sparse_opts_))) {
+    throw std::invalid_argument(
+        "EvalMemo is already used with another workload, architecture or "
+        "sparse optimizations");
+  }
   submapper_pool_ = std::make_unique<WorkerPool<SubMapSpaceMapper>>(
       mapspace_search_alg_pairs_.size(), [&]() {
         return SubMapSpaceMapper(arch_spec_, workload_, sparse_opts_, metrics_,
                                  search_size, timeout, victory_condition,
-                                 penalize_consecutive_bypass_fails);
+                                 penalize_consecutive_bypass_fails, memo_);
       });
 }
 
@@ -55,7 +71,7 @@ CoupledMapper::SubMapSpaceMapper::SubMapSpaceMapper(
     const ArchSpecs& arch_spec, Workload& workload, SparseOptInfo& sparse_opts,
     const std::vector<std::string>& metrics, uint128_t search_size,
     unsigned timeout, unsigned victory_condition,
-    bool penalize_consecutive_bypass_fails)
+    bool penalize_consecutive_bypass_fails, EvalMemo::ShPtr memo)
     : arch_spec(arch_spec),
       workload(workload),
       sparse_opts(sparse_opts),
@@ -63,7 +79,9 @@ CoupledMapper::SubMapSpaceMapper::SubMapSpaceMapper(
       search_size(search_size),
       timeout(timeout),
       victory_condition(victory_condition),
-      penalize_consecutive_bypass_fails(penalize_consecutive_bypass_fails) {}
+      penalize_consecutive_bypass_fails(penalize_consecutive_bypass_fails),
+      memo(memo),
+      memo_scope(MemoScope(arch_spec, workload, sparse_opts)) {}
 
 CoupledMapper::SubMapSpaceResult CoupledMapper::SubMapSpaceMapper::operator()(
     Task& task) {
@@ -135,8 +153,23 @@ CoupledMapper::SubMapSpaceResult CoupledMapper::SubMapSpaceMapper::operator()(
       continue;
     }
 
-    // Stage 2 & 3
-    auto result = acc.Evaluate(mapping, workload, sparse_opts);
+    // Stage 2 & 3. Equivalent mappings (possibly visited by another thread)
+    // are served from the shared memo instead of being re-evaluated.
+    std::optional<EvaluationResult> memoized;
+    MappingKey key;
+    uint64_t id = static_cast<uint64_t>(mapping.id);
+    if (memo) {
+      key = MakeMappingKey(mapping);
+      memoized = memo->Lookup(memo_scope, key, id);
+    }
+    auto result = memoized ? memoized.value()
+                           : acc.Evaluate(mapping, workload, sparse_opts);
+    if (memo && !memoized) {
+      // Hits carry the id of the mapping they were looked up for, so misses
+      // do too.
+      result.id = id;
+      memo->Insert(memo_scope, key, result);
+    }
 
     success &= result.eval_status.has_value();
     if (!success) {
@@ -1,7 +1,46 @@
 #include "pytimeloop/model/accelerator.h"
 
+// Timeloop headers
+#include <model/buffer.hpp>
+
 namespace pytimeloop::pymodel {
 
+namespace {
+
+std::shared_ptr<LevelStats> GatherLevelStats(const model::Topology& topology,
+                                             const problem::Workload& workload) {
+  auto shape = workload.GetShape();
+  auto num_levels = topology.NumStorageLevels();
+  auto num_data_spaces = shape->NumDataSpaces;
+  auto stats = std::make_shared<LevelStats>(num_levels, num_data_spaces);
+
+  for (unsigned pvi = 0; pvi < num_data_spaces; ++pvi) {
+    stats->data_space_names[pvi] = shape->DataSpaceIDToName.at(pvi);
+  }
+
+  for (unsigned level_id = 0; level_id < num_levels; ++level_id) {
+    // BufferLevel only has a non-const stats accessor.
+    auto level = std::const_pointer_cast<model::BufferLevel>(
+        topology.ViewStorageLevel(level_id));
+    auto& level_stats = level->GetStats();
+
+    stats->level_names[level_id] = level->Name();
+    stats->utilization[level_id] = level->CapacityUtilization();
+    for (unsigned pvi = 0; pvi < num_data_spaces; ++pvi) {
+      auto pv = problem::Shape::DataSpaceID(pvi);
+      auto idx = level_id * num_data_spaces + pvi;
+      stats->accesses[idx] = level->Accesses(pv);
+      stats->fills[idx] = level_stats.fills.at(pv);
+      stats->utilized_capacity[idx] = level->UtilizedCapacity(pv);
+      stats->energy[idx] = level->Energy(pv);
+    }
+  }
+
+  return stats;
+}
+
+}  // namespace
+
 Accelerator::Accelerator(const model::Engine::Specs& arch_specs)
     : arch_specs_(arch_specs) {
   engine_.Spec(arch_specs_);
@@ -37,7 +76,8 @@ EvaluationResult Accelerator::Evaluate(
                             engine_.Cycles(),
                             topology.AlgorithmicComputes(),
                             topology.ActualComputes(),
-                            topology.LastLevelAccesses()};
+                            topology.LastLevelAccesses(),
+                            GatherLevelStats(topology, workload)};
   } else {
     return EvaluationResult::FailedEvaluation(pre_eval_status);
   }
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+import unittest
+
+import pytimeloop.fastfusion.mapper.einsum_cache as einsum_cache
+from pytimeloop.fastfusion.mapper.einsum_cache import (
+    MappedEinsumCache,
+    architecture_subtree,
+    hash_tree,
+)
+
+
+class MappedEinsumCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_load_store(self):
+        cache = MappedEinsumCache(self.directory.name)
+        self.assertIsNone(cache.load("a", "ctx"))
+        cache.store("a", "ctx", {"data": 1})
+        self.assertEqual(cache.load("a", "ctx"), {"data": 1})
+        # Another context is another entry
+        self.assertIsNone(cache.load("a", "ctx2"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_corrupt_entry_is_removed(self):
+        cache = MappedEinsumCache(self.directory.name)
+        cache.store("a", "ctx", 1)
+        with open(cache.path("a", "ctx"), "wb") as f:
+            f.write(b"not a joblib file")
+        self.assertIsNone(cache.load("a", "ctx"))
+        self.assertFalse(os.path.exists(cache.path("a", "ctx")))
+
+    def test_other_versions_are_removed(self):
+        MappedEinsumCache(self.directory.name).store("a", "ctx", 1)
+        version = einsum_cache.CACHE_VERSION
+        einsum_cache.CACHE_VERSION = version + 1
+        try:
+            cache = MappedEinsumCache(self.directory.name)
+            self.assertEqual(cache.evicted, 1)
+            self.assertEqual(os.listdir(self.directory.name), [])
+        finally:
+            einsum_cache.CACHE_VERSION = version
+
+    def test_least_recently_used_are_pruned(self):
+        cache = MappedEinsumCache(self.directory.name)
+        for digest in "abc":
+            cache.store(digest, "ctx", list(range(1000)))
+            time.sleep(0.01)
+        size = os.path.getsize(cache.path("a", "ctx"))
+        cache.load("a", "ctx")
+        cache.max_bytes = 2 * size + size // 2
+        cache.prune()
+        self.assertTrue(os.path.exists(cache.path("a", "ctx")))
+        self.assertFalse(os.path.exists(cache.path("b", "ctx")))
+        self.assertTrue(os.path.exists(cache.path("c", "ctx")))
+
+    def test_hash_tree(self):
+        self.assertEqual(hash_tree({"a": 1, "b": [2, 3]}), hash_tree({"b": [2, 3], "a": 1}))
+        self.assertNotEqual(hash_tree({"a": 1}), hash_tree({"a": 2}))
+
+    def test_architecture_subtree(self):
+        arch = {
+            "nodes": [
+                {"name": "DRAM", "spatial": {"meshX": 1}, "attributes": {"depth": None}},
+                {"name": "GLB", "spatial": {"meshX": 4}, "attributes": {"depth": 1024}},
+            ]
+        }
+        before = hash_tree(architecture_subtree(arch))
+        arch["nodes"][1]["attributes"]["depth"] = 2048
+        self.assertNotEqual(hash_tree(architecture_subtree(arch)), before)
@@ -3,7 +3,9 @@ import unittest
 from bindings.looptree import LooptreeWorkload, LooptreeWorkloadDependencyAnalyzer
 
 from pytimeloop.looptree.energy import gather_actions
-from pytimeloop.fastfusion.fastmodel import compile_mapping
+from pytimeloop.fastfusion.fastmodel import (
+    compile_mapping, CompiledMappingCache, mapping_signature
+)
 from pytimeloop.looptree.mapping_utilities import get_paths
 
 from tests.load_config_mixin import LoadConfigMixin
@@ -35,3 +37,37 @@ class TestLooptreeFastModel(LoadConfigMixin, unittest.TestCase):
 
         result = compile_mapping(mapping, workload, analyzer)
         print(result)
+
+    def test_structural_cache(self):
+        config, spec = self.load_config([
+            'looptree-test-fused.yaml',
+            'cascaded_mm.workload.yaml',
+            'three_level.arch.yaml'
+        ])
+
+        workload = LooptreeWorkload.parse_cfg(config.root['problem'])
+        analyzer = LooptreeWorkloadDependencyAnalyzer(workload)
+
+        for path in get_paths(spec.mapping['nodes']):
+            if path[-1]['einsum'] == 'Fc1':
+                mapping = path
+                break
+
+        cache = CompiledMappingCache()
+        first = compile_mapping(mapping, workload, analyzer, cache=cache)
+
+        # Same structure, different constraints and a freshly parsed workload
+        constrained = [dict(node) for node in mapping]
+        for node in constrained:
+            if node['type'] == 'temporal':
+                node['factor_constraint'] = '>1'
+        self.assertEqual(mapping_signature(mapping),
+                         mapping_signature(constrained))
+        workload = LooptreeWorkload.parse_cfg(config.root['problem'])
+        analyzer = LooptreeWorkloadDependencyAnalyzer(workload)
+        second = compile_mapping(constrained, workload, analyzer, cache=cache)
+
+        self.assertIs(first, second)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hit_rate'], 0.5)
@@ -1,6 +1,6 @@
 import unittest
 
-from pytimeloop.fastfusion.layerdeduplication import is_equivalent
+from pytimeloop.fastfusion.layerdeduplication import is_equivalent, group_similar_einsums
 from bindings.looptree import LooptreeWorkload, LooptreeWorkloadDependencyAnalyzer
 
 from tests.load_config_mixin import LoadConfigMixin
@@ -51,4 +51,29 @@ class TestLayerDeduplication(LoadConfigMixin, unittest.TestCase):
         rank_renaming, tensor_renaming = \
             is_equivalent(1, 2, workload, analyzer)
         self.assertEqual(rank_renaming, {9: 16, 10: 17, 11: 18})
-        self.assertEqual(tensor_renaming, {2: 4, 3: 5, 4: 6})
\ No newline at end of file
+        self.assertEqual(tensor_renaming, {2: 4, 3: 5, 4: 6})
+    def test_group_similar_einsums(self):
+        config, spec = self.load_config([
+            'four_level.arch.yaml',
+            'cascaded_mm_multi_32.workload.yaml'
+        ])
+        workload = LooptreeWorkload.parse_cfg(config.root['problem'])
+        analyzer = LooptreeWorkloadDependencyAnalyzer(workload)
+
+        groups = group_similar_einsums(workload, analyzer)
+        self.assertEqual(
+            sum(1 + len(others) for others in groups.values()),
+            len(workload.einsum_id_to_name())
+        )
+        for ref, others in groups.items():
+            for other, renaming in others.items():
+                self.assertIsNotNone(
+                    is_equivalent(ref, other, workload, analyzer)[0]
+                )
+        for ref1 in groups:
+            for ref2 in groups:
+                if ref1 != ref2:
+                    self.assertIsNone(
+                        is_equivalent(ref1, ref2, workload, analyzer)[0]
+                    )
+        self.assertEqual(groups[1][2], ({9: 16, 10: 17, 11: 18}, {2: 4, 3: 5, 4: 6}))
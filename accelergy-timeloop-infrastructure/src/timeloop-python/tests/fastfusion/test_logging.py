@@ -0,0 +1,72 @@
+import logging
+import os
+import queue
+import tempfile
+import unittest
+
+from pytimeloop.fastfusion.mapper.logging import (
+    WorkerLogConfig,
+    WorkerLogListener,
+    log_worker,
+)
+
+
+@log_worker("test_logging.worker")
+def job(n_messages, log_queue=None):
+    for i in range(n_messages):
+        log_queue.debug(f"debug {i}")
+        log_queue.info(f"info {i}")
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LogWorkerTest(unittest.TestCase):
+    def test_level_is_filtered_in_worker(self):
+        config = WorkerLogConfig(level=logging.INFO, queue=queue.Queue())
+        job(3, log_queue=config)
+        records = [r for batch in config.queue.queue for r in batch]
+        self.assertEqual([r.getMessage() for r in records], ["info 0", "info 1", "info 2"])
+        WorkerLogListener(config, []).stop()
+
+    def test_records_are_batched(self):
+        config = WorkerLogConfig(queue=queue.Queue(), batch_size=4)
+        job(5, log_queue=config)
+        # 10 records, flushed in batches of 4 and at the end of the job
+        self.assertEqual([len(b) for b in config.queue.queue], [4, 4, 2])
+        WorkerLogListener(config, []).stop()
+
+    def test_no_config_is_passthrough(self):
+        @log_worker("test_logging.worker")
+        def f(log_queue=None):
+            return log_queue
+
+        self.assertIsNone(f(log_queue=None))
+
+    def test_listener_forwards_records(self):
+        handler = ListHandler()
+        config = WorkerLogConfig(level=logging.INFO, queue=queue.Queue())
+        listener = WorkerLogListener(config, [handler])
+        listener.start()
+        job(2, log_queue=config)
+        listener.stop()
+        self.assertEqual([r.getMessage() for r in handler.records], ["info 0", "info 1"])
+
+    def test_log_dir_is_merged_on_stop(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            handler = ListHandler()
+            config = WorkerLogConfig(level=logging.INFO, log_dir=log_dir)
+            listener = WorkerLogListener(config, [handler])
+            listener.start()
+            job(3, log_queue=config)
+            self.assertEqual(len(os.listdir(log_dir)), 1)
+            listener.stop()
+            messages = [r.getMessage() for r in handler.records]
+            self.assertEqual(messages, ["info 0", "info 1", "info 2"])
+            self.assertEqual(os.listdir(log_dir), [])
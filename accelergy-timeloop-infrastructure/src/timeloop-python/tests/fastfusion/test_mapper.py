@@ -194,6 +194,143 @@ class TestSnowcatMapper(LoadConfigMixin, unittest.TestCase):
         print(s_final)
 
 
+class TestConvertStats(unittest.TestCase):
+    def test_does_not_modify_source(self):
+        from pytimeloop.fastfusion.mapper.mapper import _convert_stats
+        from pytimeloop.fastfusion.pareto import MAPPING, STATS
+        from pytimeloop.fastfusion.sim import Tiling, Loop, TensorStorage
+
+        tiling = Tiling(
+            loops=(Loop("M1", 4, False),),
+            tensors=frozenset({TensorStorage("Fmap1", 1, 1, 8)}),
+        )
+        stats = [{"Energy": 1, MAPPING: {"Fc1": tiling}, STATS: {"Fc1": {"Energy": 1}}}]
+        converted = _convert_stats("Fc1", "Fc2", stats, {"M1": "M2"}, {"Fmap1": "Fmap2"})
+
+        self.assertEqual(stats[0][MAPPING], {"Fc1": tiling})
+        self.assertEqual(set(converted[0][MAPPING]), {"Fc2"})
+        self.assertEqual(converted[0][MAPPING]["Fc2"].loops[0].rank_id, "M2")
+        self.assertIs(converted[0][STATS]["Fc2"], stats[0][STATS]["Fc1"])
+
+
+
+class TestMapspaceEstimate(LoadConfigMixin, unittest.TestCase):
+    def setUp(self):
+        from pytimeloop.fastfusion.mapper.per_einsum_mapper import get_top_loop_jobs
+        from pytimeloop.fastfusion.mapper.shared_workload import register_workload, get_workload
+        from pytimeloop.fastfusion.mapper.templates import FourLevelTemplate
+
+        config, spec = self.load_config([
+            'cascaded_mm.workload.yaml',
+            'four_level.arch.yaml'
+        ])
+        self.workload_key = register_workload(config)
+        self.shared = get_workload(self.workload_key, config)
+        self.mac_constraint = MacArrayConstraint(
+            4,
+            2,
+            {'Fc1': 'Filter1', 'Fc2': 'Filter2'},
+            {'Fc1': 'M1', 'Fc2': 'M2'},
+            {'Fc1': 'C1', 'Fc2': 'C2'},
+        )
+        self.template = FourLevelTemplate(
+            PeArrayConstraint(4), self.mac_constraint, True, False
+        )
+        self.jobs = get_top_loop_jobs(
+            config=config,
+            template=self.template,
+            spec=spec,
+            einsums_to_explore=list(self.shared.einsum_id_to_name),
+            energy_dict={},
+            log_queue=None,
+            workload_key=self.workload_key,
+        )
+
+    def tearDown(self):
+        from pytimeloop.fastfusion.mapper.shared_workload import release_workload
+        release_workload(self.workload_key)
+
+    def test_estimate_counts_tile_shapes(self):
+        from pytimeloop.fastfusion.mapper.per_einsum_mapper import EinsumMapspace, estimate_job_size
+        from pytimeloop.fastfusion.mapper.per_einsum_subspaces.subspaces import explore_tile_shape
+
+        job = self.jobs[0]
+        mapspace = EinsumMapspace(self.shared, job['einsum_id'])
+        n_shapes = 0
+        mappings = self.template.mappings(
+            self.shared, job['einsum_id'], job['partial_mapping']
+        )
+        for mapping in mappings:
+            explorer = explore_tile_shape(
+                mapping, mapspace.einsum_shape, None, {}, {}, mapspace.tensors,
+                only_count=True,
+            )
+            next(explorer)
+            try:
+                while True:
+                    next(explorer)
+            except StopIteration as e:
+                n_shapes += e.value[0]
+        self.assertGreater(n_shapes, 0)
+        self.assertEqual(estimate_job_size(**job), n_shapes)
+
+    def test_budget_jobs(self):
+        from pytimeloop.fastfusion.mapper.mapper import budget_jobs
+
+        costs, is_capped = budget_jobs(
+            self.jobs, self.shared.einsum_id_to_name, max_candidates_per_einsum=10
+        )
+        self.assertEqual(is_capped, set(self.shared.einsum_id_to_name))
+        for einsum_id in self.shared.einsum_id_to_name:
+            jobs = [i for i, j in enumerate(self.jobs) if j['einsum_id'] == einsum_id]
+            self.assertLessEqual(sum(costs[i] for i in jobs), 10 + len(jobs))
+        for job, cost in zip(self.jobs, costs):
+            self.assertEqual(job.get('max_candidates', cost), cost)
+
+
+class TestSnowcatTemplate(LoadConfigMixin, unittest.TestCase):
+    def test_jobs_cover_mapspace(self):
+        from combinatorics.dependent_product import dependent_product
+        from pytimeloop.fastfusion.mapper.per_einsum_mapper import EinsumMapspace
+        from pytimeloop.fastfusion.mapper.per_einsum_subspaces.snowcat import make_subspaces
+        from pytimeloop.fastfusion.mapper.shared_workload import (
+            get_workload, register_workload, release_workload
+        )
+        from pytimeloop.fastfusion.mapper.templates import SnowcatTemplate
+
+        config, spec = self.load_config([
+            'cascaded_mm_multi_32.workload.yaml',
+            'snowcat.arch.yaml'
+        ])
+        workload_key = register_workload(config)
+        try:
+            shared = get_workload(workload_key, config)
+            template = SnowcatTemplate(True, n_split_min=8)
+            template.prepare(shared, spec)
+
+            einsum_id = 0
+            mapped = [
+                mapping
+                for partial_mapping in template.partial_mappings(shared, einsum_id)
+                for mapping in template.mappings(shared, einsum_id, partial_mapping)
+            ]
+            mapspace = EinsumMapspace(shared, einsum_id)
+            unsplit = dependent_product(make_subspaces(
+                mapspace.tensors,
+                mapspace.intermediate_tensors,
+                mapspace.tensor_to_relevant_ranks,
+                einsum_id,
+                shared.workload,
+                template.dataflow_constraint[einsum_id],
+            ))
+            self.assertEqual(
+                sorted(repr(m) for m in mapped),
+                sorted(repr(m) for m in unsplit),
+            )
+        finally:
+            release_workload(workload_key)
+
+
 if __name__ == '__main__':
     unittest.main(failfast=True)
 
@@ -1,8 +1,15 @@
+from concurrent.futures import ProcessPoolExecutor
+import pickle
 import unittest
 
 from pytimeloop.fastfusion.pareto import *
 
 
+def _set_e(row):
+    row["E"] = 5
+    return row
+
+
 class ParetoTest(unittest.TestCase):
     def test_pareto(self):
         od1 = OpData(fzs(["A"]))
@@ -143,5 +150,98 @@ class ParetoTest(unittest.TestCase):
         self.assertEqual(d[NUM_ELEMS("T1")].tolist(), [3, 2])
 
 
+class ParetoCapacityTest(unittest.TestCase):
+    def test_free_to_loop_index_limits_capacity(self):
+        # Freeing level 1 sums it into level 0, which changes the data. The
+        # capacity of level 0 must still be checked.
+        data = pd.DataFrame({
+            "Energy": [1, 2],
+            "Latency": [2, 1],
+            "RESOURCE_GLB_LEVEL_0": [4, 2],
+            "RESOURCE_GLB_LEVEL_1": [5, 3],
+        })
+        p = Pareto(data, skip_pareto=True)
+        self.assertTrue(p.free_to_loop_index(-1, {"GLB": 8}))
+        self.assertEqual(p.data["Energy"].tolist(), [2])
+
+
+class ParetoRowsTest(unittest.TestCase):
+    def test_same_as_makepareto(self):
+        rows = [
+            {"Energy": 3, "Latency": 1, "RESOURCE_GLB_LEVEL_0": 1, "Offchip": 0},
+            {"Energy": 1, "Latency": 3, "RESOURCE_GLB_LEVEL_0": 1, "Offchip": 0},
+            {"Energy": 3, "Latency": 3, "RESOURCE_GLB_LEVEL_0": 1, "Offchip": 0},
+            {"Energy": 2, "Latency": 2, "RESOURCE_GLB_LEVEL_0": 0, "Offchip": 0},
+        ]
+        kept = pareto_rows(rows)
+        self.assertEqual([rows.index(r) for r in kept], [0, 1, 3])
+        expected = makepareto(pd.DataFrame(rows))
+        self.assertEqual(
+            pd.DataFrame(kept)[expected.columns].to_dict("records"),
+            expected.to_dict("records"),
+        )
+
+
+class MergedDictTest(unittest.TestCase):
+    def test_right_precedence(self):
+        a, b = {"A": 1, "B": 2, "C": 3}, {"C": 4, "B": 5, "D": 6}
+        merged = MergedDict(a, b)
+        self.assertEqual(dict(merged), {**a, **b})
+        self.assertEqual(list(merged), list({**a, **b}))
+        self.assertEqual(dict(MergedDict(b, a)), {**b, **a})
+
+    def test_long_chains(self):
+        # Deeper than the recursion limit on either side
+        left, right, expected_left, expected_right = {}, {}, {}, {}
+        for i in range(10000):
+            left = MergedDict(left, {i % 7: i})
+            right = MergedDict({i % 7: i}, right)
+            expected_left = {**expected_left, i % 7: i}
+            expected_right = {i % 7: i, **expected_right}
+        self.assertEqual(dict(left), expected_left)
+        self.assertEqual(dict(right), expected_right)
+
+        # Pickling does not recurse either
+        chain = {}
+        for i in range(10000):
+            chain = MergedDict(chain, {i % 7: i})
+        self.assertEqual(dict(pickle.loads(pickle.dumps(chain))), expected_left)
+
+    def test_pickle_to_worker(self):
+        row = MergedDict(MergedDict({"A": 1}, {"B": 2}), {"C": 3, "A": 4})
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            returned = pool.submit(_set_e, row).result()
+        self.assertIsInstance(returned, MergedDict)
+        self.assertEqual(dict(returned), {"A": 4, "B": 2, "C": 3, "E": 5})
+        self.assertNotIn("E", row)
+
+    def test_writes_do_not_leak_to_siblings(self):
+        parent = MergedDict({"A": 1}, {"B": 2})
+        rows = [MergedDict(parent, {"C": i}) for i in range(3)]
+        rows[0]["A"] = 10
+        del rows[1]["B"]
+        self.assertEqual(dict(rows[0]), {"A": 10, "B": 2, "C": 0})
+        self.assertEqual(dict(rows[1]), {"A": 1, "C": 1})
+        self.assertEqual(dict(rows[2]), {"A": 1, "B": 2, "C": 2})
+        self.assertEqual(dict(parent), {"A": 1, "B": 2})
+
+    def test_merge_in_progress_stats(self):
+        left_stats = {"E0": {"Energy": 1}}
+        right_stats = {"E1": {"Energy": 2}}
+        left = pd.DataFrame({"Energy": [1, 2], "Latency": [2, 1], IN_PROGRESS_STATS: [left_stats] * 2})
+        right = pd.DataFrame({"Energy": [2], "Latency": [2], IN_PROGRESS_STATS: [right_stats]})
+        d = merge_cross(left, right, 0, set())
+        self.assertEqual(
+            [dict(s) for s in d[IN_PROGRESS_STATS]],
+            [
+                {"E0": {"Energy": 1}, "E1": {"Energy": 3, "Latency": 4}},
+                {"E0": {"Energy": 1}, "E1": {"Energy": 4, "Latency": 3}},
+            ],
+        )
+        # The parents' rows are shared and must not be written
+        self.assertEqual(left_stats, {"E0": {"Energy": 1}})
+        self.assertEqual(right_stats, {"E1": {"Energy": 2}})
+
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from pytimeloop.fastfusion.pareto import LOGSTRING, MAPPING, Pareto, nameloop2col
+from pytimeloop.fastfusion.sim import SIM, Loop, TensorStorage, Tiling
+from pytimeloop.fastfusion.util import fzs
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+if pyarrow is not None:
+    from pytimeloop.fastfusion.parquet import (
+        ParetoFile,
+        load_pareto,
+        load_sims,
+        save_pareto,
+        save_sims,
+    )
+
+
+def make_tiling(size: int) -> Tiling:
+    return Tiling((Loop("M", size, False),), fzs([TensorStorage("A", 1, "GLB", size)]))
+
+
+def make_data(n: int) -> pd.DataFrame:
+    tilings = [make_tiling(2), make_tiling(4)]
+    data = pd.DataFrame(
+        {
+            "Energy": [float(i) for i in range(n)],
+            "Latency": [n - i for i in range(n)],
+            LOGSTRING: [{"E0": f"{i % 3}", "E1": f"{i % 2}"} for i in range(n)],
+            MAPPING: [{"E0": tilings[i % 2], "E1": tilings[0]} for i in range(n)],
+        }
+    )
+    data.attrs["error_bound"] = 0.1
+    return data
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class ParquetTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "data.parquet")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        data = make_data(100)
+        save_pareto(data, self.path)
+        loaded = load_pareto(self.path)
+        pd.testing.assert_frame_equal(loaded, data)
+        self.assertEqual(loaded.attrs, {"error_bound": 0.1})
+
+    def test_dictionary_encoded(self):
+        save_pareto(make_data(1000), self.path, row_group_size=1000)
+        schema = pyarrow.parquet.read_schema(self.path)
+        self.assertTrue(pyarrow.types.is_dictionary(schema.field(f"{MAPPING}/E0").type))
+        column = pyarrow.parquet.read_table(self.path).column(f"{MAPPING}/E0")
+        self.assertEqual(len(column.chunks[0].dictionary), 2)
+
+    def test_columns_and_filters(self):
+        data = make_data(1000)
+        save_pareto(data, self.path, row_group_size=100)
+        loaded = load_pareto(
+            self.path, columns=["Energy", LOGSTRING], filters=[("Energy", "<", 250)]
+        )
+        self.assertEqual(loaded.columns.tolist(), ["Energy", LOGSTRING])
+        pd.testing.assert_frame_equal(loaded, data[["Energy", LOGSTRING]].iloc[:250])
+
+    def test_iter_batches(self):
+        data = make_data(1000)
+        save_pareto(Pareto(data, skip_pareto=True), self.path)
+        file = ParetoFile(self.path)
+        self.assertEqual(file.num_rows, 1000)
+        self.assertEqual(file.columns, data.columns.tolist())
+        batches = list(file.iter_batches(batch_size=300, columns=[MAPPING]))
+        self.assertEqual([len(b) for b in batches], [300, 300, 300, 100])
+        loaded = pd.concat(batches, ignore_index=True)
+        self.assertEqual(loaded[MAPPING].tolist(), data[MAPPING].tolist())
+
+    def test_sims(self):
+        occupancy = nameloop2col("GLB", 0)
+        sims = {
+            "E0": [
+                SIM(make_tiling(2), Pareto(make_data(5), skip_pareto=True)),
+                SIM(make_tiling(4), Pareto(make_data(3).assign(**{occupancy: 7}), skip_pareto=True)),
+            ],
+            "E1": [SIM(make_tiling(4), Pareto(make_data(4), skip_pareto=True))],
+        }
+        save_sims(sims, self.path)
+        self.assertEqual(pyarrow.parquet.ParquetFile(self.path).num_row_groups, 3)
+
+        loaded = load_sims(self.path)
+        self.assertEqual(list(loaded), ["E0", "E1"])
+        for einsum_id in sims:
+            for a, b in zip(sims[einsum_id], loaded[einsum_id]):
+                self.assertEqual(a.tiling, b.tiling)
+                pd.testing.assert_frame_equal(a.mapping.data, b.mapping.data, check_like=True)
+
+        loaded = load_sims(self.path, einsums=["E1"])
+        self.assertEqual(list(loaded), ["E1"])
+        loaded = load_sims(self.path, einsums=["E0"], filters=[("Energy", ">=", 4)])
+        self.assertEqual([len(s.mapping.data) for s in loaded["E0"]], [1])
@@ -0,0 +1,37 @@
+import unittest
+
+from joblib import delayed
+
+from pytimeloop.fastfusion.scheduler import Scheduler, chunk_by_cost, available_cpus
+
+
+def square(x):
+    return x * x
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_available_cpus(self):
+        self.assertGreaterEqual(available_cpus(), 1)
+
+    def test_backends_preserve_order(self):
+        jobs = [delayed(square)(i) for i in range(20)]
+        expected = [i * i for i in range(20)]
+        for backend in ["serial", "threads", "loky"]:
+            scheduler = Scheduler(n_workers=2, backend=backend)
+            self.assertEqual(scheduler.run(jobs), expected)
+
+    def test_costs_preserve_order(self):
+        jobs = [delayed(square)(i) for i in range(20)]
+        costs = [(i * 7) % 5 + 1 for i in range(20)]
+        scheduler = Scheduler(n_workers=2, backend="threads")
+        self.assertEqual(scheduler.run(jobs, costs=costs), [i * i for i in range(20)])
+
+    def test_chunk_by_cost(self):
+        costs = [10, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+        chunks = chunk_by_cost(costs, 2)
+        self.assertEqual(chunks[0], [0])
+        self.assertEqual(sorted(i for c in chunks for i in c), list(range(len(costs))))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            Scheduler(backend="mpi")
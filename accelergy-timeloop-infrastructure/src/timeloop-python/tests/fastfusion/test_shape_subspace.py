@@ -18,6 +18,10 @@ class TestShapeSubspace(LoadConfigMixin, unittest.TestCase):
     def test_iterate_all(self):
         self.assertEqual(36, self.count_iterations(self.subspace_it))
 
+    def test_count(self):
+        shape_subspace = ShapeSubspace({0: 4, 1: 2, 2: 2}, [0, 1, 0, 2, 2])
+        self.assertEqual(36, shape_subspace.count())
+
     def test_skip_first_iteration(self):
         # Simulates first choice not being valid
         first_choice = next(self.subspace_it)
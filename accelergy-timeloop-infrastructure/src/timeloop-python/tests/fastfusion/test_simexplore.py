@@ -0,0 +1,177 @@
+import contextlib
+import copy
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+from pytimeloop.fastfusion.mapper.simexplore import (
+    fuse_sims,
+    save_checkpoint,
+    load_checkpoint,
+    lookahead_filter,
+    step_tensors,
+)
+from pytimeloop.fastfusion.pareto import Pareto
+from pytimeloop.fastfusion.sim import SIM, Tiling, Loop, TensorStorage
+from pytimeloop.fastfusion.util import fzs
+
+
+def make_sim(loops, *tensors):
+    tiling = Tiling(tuple(Loop(r, b, False) for r, b in loops), fzs(tensors))
+    return SIM(tiling, Pareto(pd.DataFrame({"Energy": [1]})))
+
+
+def make_frozenset_sims():
+    """
+    PrepareAheadTest.make_sims with plain frozensets in the tilings, as
+    process_results makes them. Their order changes with PYTHONHASHSEED.
+    """
+    return {
+        e: [
+            SIM(Tiling(sim.tiling.loops, frozenset(sim.tiling.tensors)), sim.mapping)
+            for sim in s
+        ]
+        for e, s in PrepareAheadTest().make_sims().items()
+    }
+
+
+class CheckpointTest(unittest.TestCase):
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.assertEqual(load_checkpoint(d, "abc"), (0, None))
+
+            save_checkpoint(d, "abc", 1, {"left": [1]})
+            save_checkpoint(d, "abc", 2, {"left": [1, 2]})
+            save_checkpoint(d, "def", 5, {"left": [3]})
+
+            self.assertEqual(load_checkpoint(d, "abc"), (2, {"left": [1, 2]}))
+            self.assertEqual(load_checkpoint(d, "def"), (5, {"left": [3]}))
+            # Only the latest checkpoint of each run is kept
+            self.assertEqual(len(os.listdir(d)), 2)
+
+    def test_resume_with_other_options(self):
+        sims = PrepareAheadTest().make_sims()
+        with tempfile.TemporaryDirectory() as d:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fuse_sims(copy.deepcopy(sims), checkpoint_dir=d, lookahead=0)
+            self.assertEqual(len(os.listdir(d)), 1)
+
+            for options in [
+                dict(lookahead=1),
+                dict(lookahead=0, prepare_ahead=False),
+                dict(lookahead=0, epsilon=0.1),
+            ]:
+                stdout = io.StringIO()
+                with contextlib.redirect_stdout(stdout):
+                    fuse_sims(copy.deepcopy(sims), checkpoint_dir=d, resume=True, **options)
+                self.assertNotIn("Resuming", stdout.getvalue())
+
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                fuse_sims(copy.deepcopy(sims), checkpoint_dir=d, resume=True, lookahead=0)
+            self.assertIn("Resuming", stdout.getvalue())
+
+    def test_resume_in_other_process(self):
+        seed = "1" if os.environ.get("PYTHONHASHSEED") == "0" else "0"
+        with tempfile.TemporaryDirectory() as d:
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    "import contextlib, io, sys\n"
+                    "sys.path.insert(0, sys.argv[1])\n"
+                    "from test_simexplore import make_frozenset_sims, fuse_sims\n"
+                    "with contextlib.redirect_stdout(io.StringIO()):\n"
+                    "    fuse_sims(make_frozenset_sims(), checkpoint_dir=sys.argv[2], lookahead=0)\n",
+                    os.path.dirname(os.path.abspath(__file__)),
+                    d,
+                ],
+                env={**os.environ, "PYTHONHASHSEED": seed},
+                check=True,
+            )
+            self.assertEqual(len(os.listdir(d)), 1)
+
+            stdout = io.StringIO()
+            with contextlib.redirect_stdout(stdout):
+                fuse_sims(make_frozenset_sims(), checkpoint_dir=d, resume=True, lookahead=0)
+            self.assertIn("Resuming", stdout.getvalue())
+
+
+class LookaheadTest(unittest.TestCase):
+    def test_lookahead_filter(self):
+        a = TensorStorage("A", 0, "DRAM", 1)
+        b1 = TensorStorage("B", 1, "GLB", 1)
+        b2 = TensorStorage("B", 2, "GLB", 1)
+        c = TensorStorage("C", 1, "GLB", 1)
+        sims = [
+            ("E0", [make_sim([("M", 4)], a, b1), make_sim([("M", 2), ("N", 2)], a, b2)]),
+            ("E1", [make_sim([("M", 4)], b1, c), make_sim([("M", 8)], b1, c)]),
+            ("E2", [make_sim([("M", 4)], c), make_sim([("K", 4)], c)]),
+        ]
+        filtered = dict(lookahead_filter(sims, depth=1))
+        # E0 storing B above two loops has no partner in E1
+        self.assertEqual(len(filtered["E0"]), 1)
+        # Loops above C must match between E1 and E2
+        self.assertEqual(len(filtered["E1"]), 1)
+        self.assertEqual(len(filtered["E2"]), 1)
+        self.assertEqual(filtered["E2"][0].tiling.loops, (Loop("M", 4, False),))
+
+    def test_lookahead_does_not_prune_everything(self):
+        b1 = TensorStorage("B", 1, "GLB", 1)
+        b2 = TensorStorage("B", 2, "GLB", 1)
+        sims = [
+            ("E0", [make_sim([("M", 4)], b1)]),
+            ("E1", [make_sim([("M", 4), ("N", 2)], b2)]),
+        ]
+        filtered = dict(lookahead_filter(sims))
+        self.assertEqual(len(filtered["E0"]), 1)
+        self.assertEqual(len(filtered["E1"]), 1)
+
+
+class PrepareAheadTest(unittest.TestCase):
+    def make_sims(self):
+        x = TensorStorage("X", 0, "DRAM", 4)
+        sims = {}
+        for e, tensors in [("E0", "A"), ("E1", "AB"), ("E2", "B")]:
+            sims[e] = []
+            for i, bound in enumerate([2, 4]):
+                storages = [TensorStorage(t, 1, "GLB", bound) for t in tensors]
+                sim = make_sim([("M", bound)], x, *storages)
+                sim.mapping = Pareto(pd.DataFrame({
+                    "Energy": [i + 1, 3 - i],
+                    "Latency": [3 - i, i + 1],
+                    "__Mappings": [{e: f"{bound}-0"}, {e: f"{bound}-1"}],
+                }))
+                sims[e].append(sim)
+        return sims
+
+    def test_step_tensors(self):
+        sims = list(self.make_sims().items())
+        steps = step_tensors(sims)
+        self.assertEqual(steps[0], ({"X", "B"}, {"X", "A"}, {"X", "A"}))
+        self.assertEqual(steps[1], (set(), {"X", "B"}, {"X", "B"}))
+
+    def test_all_pairs_over_capacity(self):
+        sims = self.make_sims()
+        for s in sims.values():
+            for sim in s:
+                sim.mapping.data["RESOURCE_GLB_LEVEL_0"] = 5
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaisesRegex(ValueError, "exceed capacity"):
+                fuse_sims(sims, resource2capacity={"GLB": 8}, lookahead=0)
+
+    def test_same_result(self):
+        sims = self.make_sims()
+        results = []
+        for prepare_ahead in [False, True]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                data = fuse_sims(copy.deepcopy(sims), prepare_ahead=prepare_ahead)
+            data = data.assign(__Mappings=data["__Mappings"].map(lambda m: str(dict(m))))
+            results.append(data.sort_values("__Mappings").reset_index(drop=True))
+        self.assertGreater(len(results[0]), 1)
+        pd.testing.assert_frame_equal(results[0], results[1], check_like=True)
@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from pytimeloop.fastfusion.skyline import pareto_mask, epsilon_pareto_mask
+
+
+def brute_force_pareto(costs, distinct=True):
+    mask = np.ones(len(costs), dtype=bool)
+    for i, a in enumerate(costs):
+        for j, b in enumerate(costs):
+            dominates = (b <= a).all() and (b < a).any()
+            duplicate = distinct and j < i and (b == a).all()
+            if dominates or duplicate:
+                mask[i] = False
+                break
+    return mask
+
+
+class SkylineTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        for n_objectives in range(1, 7):
+            for _ in range(10):
+                costs = rng.integers(0, 5, size=(rng.integers(1, 80), n_objectives))
+                for distinct in [True, False]:
+                    np.testing.assert_array_equal(
+                        pareto_mask(costs, distinct=distinct),
+                        brute_force_pareto(costs, distinct=distinct),
+                    )
+
+    def test_keeps_first_duplicate(self):
+        costs = np.array([[2, 0], [1, 1], [1, 1], [0, 2], [3, 3]])
+        self.assertEqual(pareto_mask(costs).tolist(), [True, True, False, True, False])
+
+    def test_empty(self):
+        self.assertEqual(len(pareto_mask(np.zeros((0, 3)))), 0)
+        self.assertEqual(pareto_mask(np.zeros((3, 0))).tolist(), [True, False, False])
+
+    def test_epsilon_bound(self):
+        rng = np.random.default_rng(0)
+        for n_objectives in range(2, 5):
+            costs = rng.uniform(1, 100, size=(2000, n_objectives))
+            exact = costs[pareto_mask(costs)]
+            for epsilon in [0.01, 0.1, 0.5]:
+                epsilons = np.full(n_objectives, epsilon)
+                epsilons[0] = 0
+                mask = epsilon_pareto_mask(costs, epsilons)
+                kept = costs[mask]
+                # Kept rows are on the exact front
+                self.assertTrue((mask <= pareto_mask(costs)).all())
+                # Every exact row is within the bound of some kept row
+                for p in exact:
+                    self.assertTrue((kept <= p * (1 + epsilons)).all(axis=1).any())
+
+    def test_epsilon_zero_is_exact(self):
+        costs = np.random.default_rng(0).uniform(0, 10, size=(300, 3))
+        np.testing.assert_array_equal(
+            epsilon_pareto_mask(costs, np.zeros(3)), pareto_mask(costs)
+        )
@@ -0,0 +1,63 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from pytimeloop.fastfusion.pareto import Pareto
+from pytimeloop.fastfusion.spill import estimate_nbytes, spilling
+
+
+def make_data(seed, n_rows=100):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "Energy": rng.integers(0, 1000, n_rows),
+            "Latency": rng.random(n_rows),
+            "__Mappings": [{"E0": i} for i in range(n_rows)],
+        }
+    )
+
+
+class SpillTest(unittest.TestCase):
+    def test_spill_and_load(self):
+        expected = [make_data(i) for i in range(5)]
+        with tempfile.TemporaryDirectory() as d:
+            with spilling(estimate_nbytes(expected[0]), d) as store:
+                paretos = [Pareto(e.copy(), skip_pareto=True) for e in expected]
+                # Only the most recent Pareto fits in the budget
+                self.assertEqual(store.n_spilled, 4)
+                self.assertEqual(len(os.listdir(d)), 4)
+                self.assertEqual(paretos[0].num_rows(), 100)
+                for p, e in zip(paretos, expected):
+                    pd.testing.assert_frame_equal(p.data, e)
+                # Each load evicts the previously loaded Pareto, including the
+                # last one created
+                self.assertEqual(store.n_loaded, 5)
+
+                # Pickling loads the data
+                p = pickle.loads(pickle.dumps(paretos[1]))
+                pd.testing.assert_frame_equal(p.data, expected[1])
+
+            # Closing the store brings everything back into memory
+            self.assertEqual(os.listdir(d), [])
+            for p, e in zip(paretos, expected):
+                self.assertIsNone(p._store)
+                pd.testing.assert_frame_equal(p.data, e)
+
+    def test_dropped_pareto_removes_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            with spilling(1, d):
+                p = Pareto(make_data(0), skip_pareto=True)
+                Pareto(make_data(1), skip_pareto=True)
+                self.assertEqual(len(os.listdir(d)), 1)
+                del p
+                self.assertEqual(os.listdir(d), [])
+
+    def test_no_budget(self):
+        with spilling(None) as store:
+            self.assertIsNone(store)
+            p = Pareto(make_data(0), skip_pareto=True)
+        self.assertIsNone(p._store)
@@ -0,0 +1,136 @@
+import unittest
+
+import sympy
+
+from pytimeloop.fastfusion.mapper.per_einsum_subspaces.subspaces.tile_shape import explore_tile_shape
+from pytimeloop.fastfusion.mapper.per_einsum_subspaces.subspaces.tile_shape.tile_shape import (
+    count_tile_shapes,
+    sample_shapes,
+)
+from pytimeloop.fastfusion.mapper.per_einsum_subspaces.subspaces.tile_shape.shape_subspace import ShapeSubspace
+from pytimeloop.looptree.des import LooptreeOutput
+
+
+def make_compiled_result():
+    # Two temporal loops over rank 0 (shape 12) and one spatial loop over
+    # rank 1 (shape 8). Two tensors are stored in level 1 below the first
+    # loop and one in level 2 below all loops.
+    t0, t1, t2 = tile_shapes = sympy.symbols("tileshape0:3")
+    f0 = sympy.ceiling(12 / t0)
+    f1 = sympy.ceiling(t0 / t1)
+    f2 = sympy.ceiling(8 / t2)
+
+    def lambdify(d):
+        return {
+            k: (v[0], sympy.lambdify(tile_shapes, v[1])) if isinstance(v, tuple)
+            else sympy.lambdify(tile_shapes, v)
+            for k, v in d.items()
+        }
+
+    result = LooptreeOutput()
+    result.ops = lambdify({0: (None, 96)})
+    result.temporal_steps = lambdify({0: f0 * f1})
+    result.fanout = lambdify({1: [f2]})
+    result.occupancy = lambdify({(1, 0): 2 * t0, (1, 1): t0, (2, 0): t1 * t2})
+    result.fills = lambdify({(1, 0, 0): (None, 96 * f0 / f1), (1, 1, 0): (None, 12 + f1)})
+    result.reads_to_parent = lambdify({(1, 0, 0): (None, 96 * f0 / f1)})
+    result.op_intensity = lambdify({1: t0 / 12})
+    return result
+
+
+MAPPING = [
+    {"type": "storage", "target": 0, "dspace": [0, 1]},
+    {"type": "temporal", "rank": 0},
+    {"type": "storage", "target": 1, "dspace": [0, 1]},
+    {"type": "temporal", "rank": 0},
+    {"type": "spatial", "rank": 1},
+    {"type": "storage", "target": 2, "dspace": [0]},
+    {"type": "compute", "target": 3, "einsum": 0},
+]
+
+
+class TestExploreTileShape(unittest.TestCase):
+    def explore(self, vectorized, max_capacity={1: 40, 2: 16}, max_shapes=None):
+        explorer = explore_tile_shape(
+            MAPPING,
+            {0: 12, 1: 8},
+            make_compiled_result(),
+            max_capacity=max_capacity,
+            max_fanout={1: [4]},
+            tensors={0, 1},
+            vectorized=vectorized,
+            block_size=5,
+            max_shapes=max_shapes,
+        )
+        self.shape_subspace = next(explorer)
+        return {tuple(shape): result for shape, result in explorer}
+
+    def test_capacity_pruning(self):
+        compiled = make_compiled_result()
+        max_capacity = {1: 20, 2: 8}
+        expected = set()
+        for shape in ShapeSubspace({0: 12, 1: 8}, [0, 0, 1]):
+            fits = all(
+                sum(f(*shape) for (l, _), f in compiled.occupancy.items() if l == level) <= limit
+                for level, limit in max_capacity.items()
+            )
+            if fits and compiled.fanout[1](*shape)[0] <= 4:
+                expected.add(tuple(shape))
+        self.assertTrue(expected)
+
+        explored = self.explore(vectorized=False, max_capacity=max_capacity)
+        self.assertEqual(set(explored), expected)
+        self.assertGreater(self.shape_subspace.n_pruned, 0)
+
+    def test_vectorized_matches_scalar(self):
+        scalar = self.explore(vectorized=False)
+        vectorized = self.explore(vectorized=True)
+        self.assertTrue(vectorized)
+        self.assertTrue(set(vectorized) < set(scalar))
+        for shape, result in vectorized.items():
+            self.assertEqual(result.occupancy, scalar[shape].occupancy)
+            self.assertEqual(result.fills, scalar[shape].fills)
+            self.assertEqual(result.fanout, scalar[shape].fanout)
+
+        # Shapes dropped by the vectorized explorer are dominated by a kept
+        # shape with the same fusion-relevant loop
+        def values(r):
+            return [v[1] if isinstance(v, tuple) else v
+                    for d in [r.temporal_steps, r.occupancy, r.fills, r.reads_to_parent, r.op_intensity]
+                    for v in d.values()]
+
+        for shape in set(scalar) - set(vectorized):
+            self.assertTrue(any(
+                other[0] == shape[0]
+                and all(a <= b for a, b in zip(values(vectorized[other]), values(scalar[shape])))
+                for other in vectorized
+            ))
+
+    def test_count_tile_shapes(self):
+        shapes = list(ShapeSubspace({0: 12, 1: 8}, [0, 0, 1]))
+        self.assertEqual(count_tile_shapes(MAPPING, {0: 12, 1: 8}, {0, 1}), len(shapes))
+
+    def test_max_shapes(self):
+        every = [tuple(s) for s in ShapeSubspace({0: 12, 1: 8}, [0, 0, 1])]
+        sampled = list(sample_shapes(iter(every), len(every), 7))
+        for vectorized in [False, True]:
+            explored = self.explore(vectorized=vectorized, max_capacity={}, max_shapes=7)
+            self.assertTrue(explored)
+            self.assertTrue(set(explored) <= set(sampled))
+        # Not a prefix: more than one outer tile shape is explored
+        explored = self.explore(vectorized=False, max_capacity={}, max_shapes=7)
+        self.assertGreater(len({shape[0] for shape in explored}), 1)
+
+    def test_sample_shapes(self):
+        sample = list(sample_shapes(iter(range(100)), 100, 7, seed=3))
+        self.assertEqual(len(sample), 7)
+        for i, shape in enumerate(sample):
+            self.assertTrue(int(i * 100 / 7) <= shape < (i + 1) * 100 / 7)
+        self.assertEqual(sample, list(sample_shapes(iter(range(100)), 100, 7, seed=3)))
+
+        self.assertEqual(list(sample_shapes(iter(range(5)), 5, 7)), list(range(5)))
+
+        # Overestimated counts yield fewer shapes
+        sample = list(sample_shapes(iter(range(50)), 100, 10))
+        self.assertEqual(len(sample), 5)
+        self.assertGreaterEqual(sample[-1], 40)
@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pytimeloop.fastfusion.trace import Tracer
+
+
+class TracerTest(unittest.TestCase):
+    def make_tracer(self):
+        tracer = Tracer()
+        for step in ["E1", "E2"]:
+            with tracer.stage("Grouping", step, sims_in=4) as event:
+                event["sims_out"] = 2
+        with tracer.stage("Lookahead"):
+            pass
+        return tracer
+
+    def test_events(self):
+        tracer = self.make_tracer()
+        self.assertEqual([e["name"] for e in tracer.events], ["Grouping"] * 2 + ["Lookahead"])
+        self.assertEqual(tracer.events[1]["step"], "E2")
+        self.assertEqual(tracer.events[1]["sims_in"], 4)
+        self.assertEqual(tracer.events[1]["sims_out"], 2)
+        self.assertGreaterEqual(tracer.events[1]["start"], tracer.events[0]["start"])
+        self.assertEqual(set(tracer.total_time()), {"Grouping", "Lookahead"})
+
+    def test_event_recorded_on_error(self):
+        tracer = Tracer()
+        with self.assertRaises(KeyError):
+            with tracer.stage("Merging"):
+                raise KeyError()
+        self.assertEqual(len(tracer.events), 1)
+
+    def test_save(self):
+        tracer = self.make_tracer()
+        with tempfile.TemporaryDirectory() as d:
+            tracer.save(os.path.join(d, "trace.json"))
+            with open(os.path.join(d, "trace.json")) as f:
+                self.assertEqual(len(json.load(f)["events"]), 3)
+
+            tracer.save(os.path.join(d, "chrome.json"), "chrome")
+            with open(os.path.join(d, "chrome.json")) as f:
+                events = json.load(f)["traceEvents"]
+            spans = [e for e in events if e["ph"] == "X"]
+            counters = [e for e in events if e["ph"] == "C"]
+            self.assertEqual(len(spans), 3)
+            self.assertEqual(counters[0]["args"]["sims_out"], 2)
+
+            with self.assertRaises(ValueError):
+                tracer.save(os.path.join(d, "trace.txt"), "txt")
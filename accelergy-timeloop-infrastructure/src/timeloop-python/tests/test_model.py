@@ -16,6 +16,22 @@ class ModelAppTest(unittest.TestCase):
             TEST_TMP_DIR,
         )
 
+    def test_level_stats_views(self):
+        model = self.make_model_app(
+            Path(__file__).parent / 'test_configs',
+            ['two_level.arch.yaml', 'mapping.yaml', 'mm.workload.yaml'],
+            TEST_TMP_DIR,
+        )
+        stats = model.run().level_stats
+
+        shape = (stats.num_levels, stats.num_data_spaces)
+        self.assertEqual(stats.accesses.shape, shape)
+        self.assertEqual(stats.fills.shape, shape)
+        self.assertEqual(stats.energy.shape, shape)
+        self.assertEqual(stats.utilization.shape, (stats.num_levels,))
+        self.assertFalse(stats.accesses.flags.writeable)
+        self.assertEqual(len(stats.level_names), stats.num_levels)
+
     @staticmethod
     def make_model_app(config_dir, paths, tmp_path):
         yaml_str = gather_yaml_configs(config_dir, paths)